@@ -5,16 +5,22 @@ import os
 import re
 import time
 import shutil
-import requests
+import logging
 from flask import Blueprint, jsonify, request, current_app
-from models import db, Post, Channel
-from telegram_client import connect_to_telegram
-from message_processing.channel_info import get_channel_info
+from sqlalchemy import delete, or_, select
+from models import db, Post, Channel, DownloadStatus, Edit, Layout, Page, PageBlock, PageGridState, MediaVariant
+from utils.download_status import set_download_status
+from utils.html_export import PAGE_SIZE, PAGINATE_MODES, export_channel_pages, write_channel_html
+from utils.image_variants import start_variants_job
+from utils.jobs import JobAlreadyRunning, list_jobs, running_job, start_job, update_job_progress
+from utils.pdf_export import export_channel_pdf_job
 
 channels_bp = Blueprint('channels', __name__)
 
 # Константы
 DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'downloads')
+TRASH_DIR = os.path.join(DOWNLOADS_DIR, '.trash')  # Папки удалённых каналов до фоновой очистки
+PDF_CSS_SOURCE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tg-offliner-frontend', 'public', 'styles-pdf.css')
 
 @channels_bp.route('/channels', methods=['GET'])
 def get_channels():
@@ -76,7 +82,8 @@ def run_channel_import():
         return jsonify({"error": "channel_username обязателен"}), 400
 
     try:
-        # Импорт функций для работы с каналами
+        # Импорт функций для работы с каналами (Telethon загружается только здесь)
+        from telegram_client import connect_to_telegram
         from utils.entity_validation import get_entity_by_username_or_id
         from telegram_export import import_channel_direct
         
@@ -90,11 +97,8 @@ def run_channel_import():
         # Определяем реальный ID для проверки в базе
         real_id = entity.username or str(entity.id)
         
-        # Импорт функций для статуса загрузки
-        import app
-        
         # Устанавливаем статус начала загрузки
-        app.set_download_status(real_id, 'downloading', {
+        set_download_status(real_id, 'downloading', {
             'channel_name': channel_username,
             'started_at': time.time(),
             'processed_posts': 0,
@@ -118,7 +122,7 @@ def run_channel_import():
                 message += f" и {comments_count} комментариев"
             
             # Устанавливаем статус завершения
-            app.set_download_status(real_id, 'completed', {
+            set_download_status(real_id, 'completed', {
                 'channel_name': channel_username,
                 'completed_at': time.time(),
                 'processed_posts': processed_count,
@@ -127,10 +131,17 @@ def run_channel_import():
             })
             
             current_app.logger.info(message)
+            # Адаптивные копии фото готовим сразу после импорта, в том числе для дискуссионной группы
+            channel = db.session.get(Channel, real_id)
+            scope_ids = [real_id]
+            if channel and channel.discussion_group_id:
+                scope_ids.append(str(channel.discussion_group_id))
+            for scope_id in scope_ids:
+                start_variants_job(scope_id, DOWNLOADS_DIR, app=current_app._get_current_object())
             return jsonify({"message": message}), 200
         else:
             # Устанавливаем статус ошибки
-            app.set_download_status(real_id, 'error', {
+            set_download_status(real_id, 'error', {
                 'channel_name': channel_username,
                 'error_at': time.time(),
                 'error': result['error']
@@ -142,7 +153,7 @@ def run_channel_import():
     except Exception as e:
         # Устанавливаем статус ошибки, если real_id определен
         if 'real_id' in locals():
-            app.set_download_status(real_id, 'error', {
+            set_download_status(real_id, 'error', {
                 'channel_name': channel_username,
                 'error_at': time.time(),
                 'error': str(e)
@@ -169,9 +180,105 @@ def get_channel(channel_id):
         "changes": channel.changes if hasattr(channel, 'changes') else {}
     })
 
+def _channel_folder_name(channel_id):
+    """Имя папки канала в downloads (числовые ID хранятся с префиксом channel_)."""
+    channel_id = str(channel_id)
+    return f"channel_{channel_id}" if channel_id.isdigit() else channel_id
+
+def _move_to_trash(folder):
+    """
+    Мгновенно убирает папку канала из downloads, переименовывая её в downloads/.trash.
+    Возвращает путь в корзине или None, если папки нет.
+    """
+    if not os.path.exists(folder):
+        return None
+    os.makedirs(TRASH_DIR, exist_ok=True)
+    trash_path = os.path.join(TRASH_DIR, f"{os.path.basename(folder)}-{time.time_ns()}")
+    os.rename(folder, trash_path)
+    return trash_path
+
+def _leftover_trash():
+    """
+    Папки в корзине, которые не очищает ни одна выполняющаяся задача удаления:
+    остались после упавшей задачи или перезапуска сервера.
+    """
+    if not os.path.isdir(TRASH_DIR):
+        return []
+    claimed = {path for job in list_jobs('delete_channel') if job['status'] == 'running'
+               for path in job['details'].get('trash_paths', [])}
+    paths = (os.path.join(TRASH_DIR, name) for name in sorted(os.listdir(TRASH_DIR)))
+    return [path for path in paths if path not in claimed]
+
+def _delete_channel_rows(channel_ids):
+    """Удаляет канал и все связанные строки множественными DELETE в одной транзакции."""
+    deleted = {}
+    try:
+        # Индекс страниц: блоки с постами канала и все блоки его страниц
+        result = db.session.execute(delete(PageBlock).where(or_(
+            PageBlock.channel_id.in_(channel_ids),
+            PageBlock.page_id.in_(select(Page.id).where(Page.channel_id.in_(channel_ids)))
+        )))
+        deleted[PageBlock.__tablename__] = result.rowcount
+        for model in (Post, Edit, Layout, Page, PageGridState, MediaVariant, DownloadStatus):
+            result = db.session.execute(delete(model).where(model.channel_id.in_(channel_ids)))
+            deleted[model.__tablename__] = result.rowcount
+        result = db.session.execute(delete(Channel).where(Channel.id.in_(channel_ids)))
+        deleted[Channel.__tablename__] = result.rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return deleted
+
+def _reclaim_trash(job_id, trash_paths):
+    """Удаляет содержимое папок из корзины, сообщая прогресс по файлам."""
+    total_files = sum(len(files) for path in trash_paths for _, _, files in os.walk(path))
+    files_removed = 0
+    update_job_progress(job_id, stage='files', files_removed=0, total_files=total_files)
+
+    for path in trash_paths:
+        for root, dirs, files in os.walk(path, topdown=False):
+            for name in files:
+                try:
+                    os.remove(os.path.join(root, name))
+                except OSError as e:
+                    logging.warning(f"Не удалось удалить файл {name} в {root}: {e}")
+                files_removed += 1
+                if files_removed % 500 == 0:
+                    update_job_progress(job_id, files_removed=files_removed)
+            for name in dirs:
+                try:
+                    os.rmdir(os.path.join(root, name))
+                except OSError:
+                    pass
+        shutil.rmtree(path, ignore_errors=True)
+
+    update_job_progress(job_id, files_removed=files_removed)
+    return files_removed
+
+def _delete_channel_job(job_id, channel_ids, trash_paths):
+    """Фоновая задача удаления канала: строки БД, затем файлы из корзины."""
+    update_job_progress(job_id, stage='database')
+    deleted = _delete_channel_rows(channel_ids)
+    logging.info(f"Удалены строки каналов {channel_ids}: {deleted}")
+    update_job_progress(job_id, deleted_rows=deleted)
+
+    files_removed = _reclaim_trash(job_id, trash_paths)
+    logging.info(f"Удалено {files_removed} файлов каналов {channel_ids}")
+    update_job_progress(job_id, stage='done')
+
+    return {"deleted_rows": deleted, "files_removed": files_removed}
+
 @channels_bp.route('/channels/<channel_id>', methods=['DELETE'])
 def delete_channel(channel_id):
-    """Удаляет канал и связанные с ним данные."""
+    """
+    Удаляет канал и связанные с ним данные в фоне.
+
+    Папки канала сразу переносятся в корзину, строки БД (посты, правки, layouts,
+    страницы, статус загрузки, дискуссионная группа) и файлы удаляются фоновой задачей.
+    Возвращает 202 и job_id для отслеживания через /api/jobs/<job_id>;
+    если канал уже удаляется — 409 и job_id идущей задачи.
+    """
     try:
         # Получаем информацию о канале
         channel = Channel.query.filter_by(id=channel_id).first()
@@ -179,49 +286,48 @@ def delete_channel(channel_id):
             current_app.logger.warning(f"Канал с ID {channel_id} не найден.")
             return jsonify({"error": "Канал не найден"}), 404
 
-        discussion_group_id = channel.discussion_group_id
-        
-        # Удаляем канал из таблицы channels
-        db.session.delete(channel)
-        current_app.logger.info(f"Канал с ID {channel_id} удалён из таблицы channels.")
-
-        # Удаляем все посты, связанные с этим каналом
-        posts_deleted = Post.query.filter_by(channel_id=channel_id).delete()
-        current_app.logger.info(f"Удалено {posts_deleted} постов, связанных с каналом {channel_id}.")
-
-        # Если у канала есть дискуссионная группа, удаляем и её
-        if discussion_group_id:
-            # Удаляем дискуссионную группу из таблицы channels
-            discussion_group = Channel.query.filter_by(id=str(discussion_group_id)).first()
-            if discussion_group:
-                db.session.delete(discussion_group)
-                current_app.logger.info(f"Дискуссионная группа с ID {discussion_group_id} удалена из таблицы channels.")
-            
-            # Удаляем все посты из дискуссионной группы
-            discussion_posts_deleted = Post.query.filter_by(channel_id=str(discussion_group_id)).delete()
-            current_app.logger.info(f"Удалено {discussion_posts_deleted} постов из дискуссионной группы {discussion_group_id}.")
-            
-            # Удаляем папку дискуссионной группы
-            discussion_folder_name = f"channel_{discussion_group_id}" if str(discussion_group_id).isdigit() else str(discussion_group_id)
-            discussion_folder = os.path.join(DOWNLOADS_DIR, discussion_folder_name)
-            if os.path.exists(discussion_folder):
-                shutil.rmtree(discussion_folder)
-                current_app.logger.info(f"Папка дискуссионной группы {discussion_folder} удалена.")
-
-        # Удаляем папку из /downloads
-        channel_folder_name = f"channel_{channel_id}" if channel_id.isdigit() else channel_id
-        channel_folder = os.path.join(DOWNLOADS_DIR, channel_folder_name)
-        if os.path.exists(channel_folder):
-            shutil.rmtree(channel_folder)
-            current_app.logger.info(f"Папка {channel_folder} удалена.")
-
-        # Применяем изменения
-        db.session.commit()
+        # Повторный DELETE, пока идёт удаление, не трогает папки и не запускает вторую задачу
+        running = running_job('delete_channel', channel_id)
+        if running:
+            return jsonify({"error": "Удаление канала уже идёт", "job_id": running['id']}), 409
+
+        channel_ids = [channel_id]
+        if channel.discussion_group_id:
+            channel_ids.append(str(channel.discussion_group_id))
+
+        # Заодно дочищаем корзину, оставшуюся от прерванных удалений
+        trash_paths = _leftover_trash()
+        if trash_paths:
+            current_app.logger.info(f"В корзине остались папки прошлых удалений: {len(trash_paths)}")
 
-        return jsonify({"message": f"Канал {channel_id} и все связанные данные успешно удалены."}), 200
+        # Переименование папок мгновенное, поэтому делаем его прямо в запросе
+        for cid in channel_ids:
+            trash_path = _move_to_trash(os.path.join(DOWNLOADS_DIR, _channel_folder_name(cid)))
+            if trash_path:
+                trash_paths.append(trash_path)
+                current_app.logger.info(f"Папка канала {cid} перенесена в корзину: {trash_path}")
+
+        try:
+            job_id = start_job(
+                'delete_channel',
+                _delete_channel_job,
+                channel_ids,
+                trash_paths,
+                app=current_app._get_current_object(),
+                details={'channel_id': channel_id, 'channel_ids': channel_ids, 'trash_paths': trash_paths},
+                key=channel_id
+            )
+        except JobAlreadyRunning as e:
+            # Параллельный запрос успел запустить удаление; перенесённое в корзину дочистит следующее удаление
+            return jsonify({"error": "Удаление канала уже идёт", "job_id": e.job_id}), 409
+        current_app.logger.info(f"Запущено фоновое удаление канала {channel_id} (job {job_id})")
+
+        return jsonify({
+            "message": f"Удаление канала {channel_id} запущено.",
+            "job_id": job_id
+        }), 202
 
     except Exception as e:
-        db.session.rollback()
         current_app.logger.error(f"Ошибка при удалении канала {channel_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
@@ -293,6 +399,9 @@ def channel_preview():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
         
+        from telegram_client import connect_to_telegram
+        from message_processing.channel_info import get_channel_info
+
         client = connect_to_telegram()
         current_app.logger.info("Успешно подключились к Telegram")
         
@@ -334,91 +443,38 @@ def channel_preview():
         if client:
             current_app.logger.info("Запрос к Telegram завершен")
 
-def clean_css_for_pdf(css_content):
-    """
-    Очищает CSS от проблемных правил для WeasyPrint
-    """
-    # Удаляем пустые CSS custom properties, которые вызывают warnings
-    # Например: --tw-gradient-via-position: ;
-    css_content = re.sub(r'--tw-[^:]*:\s*;', '', css_content)
-    css_content = re.sub(r'--[^:]*:\s*;', '', css_content)
-    
-    return css_content
-
-def process_html_for_standalone(html_content):
-    """
-    Обрабатывает HTML для автономного использования:
-    - Встраивает CSS стили inline
-    - Удаляет ссылки на внешние стили
-    - Добавляет meta-теги для корректного отображения
-    """
-    from bs4 import BeautifulSoup
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Удаляем все ссылки на CSS файлы
-    for link in soup.find_all('link', rel='stylesheet'):
-        link.decompose()
-    
-    # Добавляем ссылку на локальный CSS файл
-    head = soup.find('head')
-    if head:
-        css_link = soup.new_tag('link')
-        css_link['rel'] = 'stylesheet'
-        css_link['href'] = './styles.css'
-        head.append(css_link)
-    
-    # Удаляем скрипты (для статичного HTML они не нужны)
-    for script in soup.find_all('script'):
-        script.decompose()
-    
-    # Добавляем базовые meta-теги если их нет
-    head = soup.find('head')
-    if head:
-        if not soup.find('meta', charset=True):
-            meta_charset = soup.new_tag('meta')
-            meta_charset['charset'] = 'utf-8'
-            head.insert(0, meta_charset)
-        
-        if not soup.find('meta', attrs={'name': 'viewport'}):
-            meta_viewport = soup.new_tag('meta')
-            meta_viewport['name'] = 'viewport'
-            meta_viewport['content'] = 'width=device-width, initial-scale=1.0'
-            head.append(meta_viewport)
-    
-    # Обновляем пути к медиа файлам на относительные
-    # (они уже должны быть в папке downloads/channel_id/media/)
-    for img in soup.find_all('img'):
-        src = img.get('src')
-        if src and src.startswith('/api/media/'):
-            # Заменяем /api/media/channel_id/filename на ./media/filename
-            filename = src.split('/')[-1]
-            img['src'] = f'./media/{filename}'
-    
-    return str(soup)
-
 @channels_bp.route('/channels/<channel_id>/export-html', methods=['GET'])
 def export_channel_to_html(channel_id):
-    """Экспортирует канал в HTML формат для автономного использования."""
+    """Экспортирует канал в HTML формат для автономного использования.
+
+    Параметры:
+    - paginate=count|month|none: разбить ленту на страницы по per_page элементов,
+      по месяцам или выгрузить одним index.html (по умолчанию count)
+    - per_page: элементов ленты на страницу (по умолчанию PAGE_SIZE)
+    - force=1: перерисовать все страницы (по умолчанию перерисовываются только
+      страницы, входные данные которых изменились с прошлого экспорта)
+    """
+    paginate = request.args.get('paginate', 'count')
+    force = request.args.get('force', '').lower() in ('1', 'true')
+    if paginate not in PAGINATE_MODES + ('none',):
+        return jsonify({"error": "paginate должен быть count, month или none"}), 400
     try:
-        # Получаем HTML от SSR с параметром export=1 для включения режима экспорта
-        ssr_url = f'http://ssr:3000/{channel_id}/posts?export=1'
-        current_app.logger.info(f"🔍 [BACKEND] Making SSR request to: {ssr_url}")
-        
-        response = requests.get(ssr_url)
-        current_app.logger.info(f"🔍 [BACKEND] SSR response status: {response.status_code}")
-        
-        if response.status_code != 200:
-            current_app.logger.error(f"SSR-сервер вернул ошибку: {response.status_code}")
-            return jsonify({"error": "Ошибка SSR-рендеринга"}), 500
+        per_page = int(request.args.get('per_page', PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "per_page должен быть числом"}), 400
+    if per_page < 1:
+        return jsonify({"error": "per_page должен быть больше 0"}), 400
+
+    try:
+        channel = db.session.get(Channel, channel_id)
+        if not channel:
+            return jsonify({"error": "Канал не найден"}), 404
 
-        html_content = response.text
-        
         # Создаем папку для канала в downloads
         channel_dir = os.path.join(DOWNLOADS_DIR, channel_id)
         os.makedirs(channel_dir, exist_ok=True)
         
-        # Копируем CSS файл из tg-offliner-frontend/public/styles.css
+        # Копируем CSS файл из tg-offliner-frontend/public/styles.css (общий для всех страниц)
         css_source = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tg-offliner-frontend', 'public', 'styles.css')
         css_dest = os.path.join(channel_dir, 'styles.css')
         
@@ -431,159 +487,102 @@ def export_channel_to_html(channel_id):
         except Exception as css_error:
             current_app.logger.error(f"Ошибка при копировании CSS: {css_error}")
         
-        # Обрабатываем HTML для автономного использования
-        processed_html = process_html_for_standalone(html_content)
-        
-        # Сохраняем HTML файл
+        # Рендерим ленту прямо из БД в файлы (без SSR и повторного разбора HTML)
         html_path = os.path.join(channel_dir, 'index.html')
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(processed_html)
+        started = time.perf_counter()
+        pages = []
+        if paginate == 'none':
+            write_channel_html(channel_id, html_path, mode='html')
+        else:
+            pages = export_channel_pages(channel, channel_dir, paginate=paginate, per_page=per_page, force=force)
 
         if not os.path.exists(html_path):
             current_app.logger.error(f"HTML-файл не найден после создания: {html_path}")
             return jsonify({"error": "HTML-файл не был создан"}), 500
 
-        current_app.logger.info(f"HTML для канала {channel_id} успешно создан: {html_path}")
-        return jsonify({"success": True, "message": f"HTML файл создан в {html_path}"}), 200
+        rendered = sum(1 for page in pages if page['rendered'])
+        current_app.logger.info(
+            f"HTML для канала {channel_id} успешно создан за {time.perf_counter() - started:.2f}s "
+            f"({len(pages)} страниц, перерисовано {rendered}): {html_path}"
+        )
+        return jsonify({
+            "success": True,
+            "message": f"HTML файл создан в {html_path}",
+            "pages": len(pages),
+            "rendered": rendered
+        }), 200
         
     except Exception as e:
         current_app.logger.error(f"Ошибка при экспорте HTML для канала {channel_id}: {str(e)}")
         return jsonify({"error": "Ошибка при экспорте HTML"}), 500
 
-def create_pdf_html(channel_id):
-    """Создает HTML специально для PDF с минимальным CSS."""
-    try:
-        # Получаем HTML от SSR
-        ssr_url = f'http://ssr:3000/{channel_id}/posts'
-        response = requests.get(ssr_url)
-        if response.status_code != 200:
-            current_app.logger.error(f"SSR-сервер вернул ошибку: {response.status_code}")
-            return None
-
-        html_content = response.text
-        
-        # Создаем папку для канала
-        channel_dir = os.path.join(DOWNLOADS_DIR, channel_id)
-        os.makedirs(channel_dir, exist_ok=True)
-        
-        # Копируем PDF CSS файл 
-        pdf_css_source = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tg-offliner-frontend', 'public', 'styles-pdf.css')
-        pdf_css_dest = os.path.join(channel_dir, 'styles-pdf.css')
-        
-        if os.path.exists(pdf_css_source):
-            # Читаем CSS файл
-            with open(pdf_css_source, 'r', encoding='utf-8') as f:
-                css_content = f.read()
-            
-            # Очищаем CSS от проблемных конструкций
-            cleaned_css = clean_css_for_pdf(css_content)
-            
-            # Сохраняем очищенный CSS
-            with open(pdf_css_dest, 'w', encoding='utf-8') as f:
-                f.write(cleaned_css)
-            
-            current_app.logger.info(f"PDF CSS файл скопирован и очищен: {pdf_css_source} -> {pdf_css_dest}")
-        else:
-            current_app.logger.warning(f"PDF CSS файл не найден: {pdf_css_source}")
-            return None
-        
-        # Обрабатываем HTML для PDF
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Удаляем все существующие CSS ссылки
-        for link in soup.find_all('link', rel='stylesheet'):
-            link.decompose()
-        
-        # Добавляем ссылку на PDF CSS
-        head = soup.find('head')
-        if head:
-            css_link = soup.new_tag('link')
-            css_link['rel'] = 'stylesheet'
-            css_link['href'] = './styles-pdf.css'
-            head.append(css_link)
-        
-        # Удаляем скрипты
-        for script in soup.find_all('script'):
-            script.decompose()
-        
-        # Добавляем базовые meta-теги
-        if head:
-            if not soup.find('meta', charset=True):
-                meta_charset = soup.new_tag('meta')
-                meta_charset['charset'] = 'utf-8'
-                head.insert(0, meta_charset)
-        
-        # Обновляем пути к медиа файлам
-        for img in soup.find_all('img'):
-            src = img.get('src')
-            if src and src.startswith('/api/media/'):
-                filename = src.split('/')[-1]
-                img['src'] = f'./media/{filename}'
-        
-        # Сохраняем PDF HTML
-        pdf_html_path = os.path.join(channel_dir, 'index-pdf.html')
-        with open(pdf_html_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-        
-        current_app.logger.info(f"PDF HTML создан: {pdf_html_path}")
-        return pdf_html_path
-        
-    except Exception as e:
-        current_app.logger.error(f"Ошибка при создании PDF HTML: {str(e)}")
-        return None
-
 @channels_bp.route('/channels/<channel_id>/print', methods=['GET'])
 def print_channel_to_pdf(channel_id):
-    """Экспортирует канал в PDF формат с минимальным CSS."""
-    # Повышаем лимит рекурсии в самом начале
-    import sys
-    old_limit = sys.getrecursionlimit()
-    sys.setrecursionlimit(50000)
-    
+    """
+    Экспортирует канал в PDF в фоне.
+
+    Лента рендерится кусками в пуле процессов и склеивается в
+    downloads/<channel_id>/<channel_id>.pdf (см. utils/pdf_export.py).
+    Возвращает 202 и job_id для отслеживания через /api/jobs/<job_id>;
+    прогресс задачи: stage (html, render, merge, done), chunks_done/chunks_total,
+    по завершении — timings (секунды по стадиям).
+
+    Готовые PDF кусков кэшируются: перерисовываются только куски с изменёнными
+    постами, правками или layouts. force=1 — перерисовать всё.
+
+    Если PDF канала уже генерируется — 409 и job_id идущей задачи.
+    """
     try:
-        current_app.logger.info(f"=== НАЧАЛО PDF ГЕНЕРАЦИИ для канала {channel_id} ===")
-        current_app.logger.info(f"Лимит рекурсии изменен с {old_limit} на 50000")
-        
-        # Создаем специальный HTML для PDF
-        current_app.logger.info("Создание PDF HTML с минимальным CSS...")
-        pdf_html_path = create_pdf_html(channel_id)
-        
-        if not pdf_html_path or not os.path.exists(pdf_html_path):
-            current_app.logger.error("PDF HTML не был создан")
-            return jsonify({"error": "Ошибка при создании PDF HTML"}), 500
-        
-        current_app.logger.info(f"PDF HTML создан: {pdf_html_path}")
-        
-        # Генерируем PDF из локального HTML файла
-        current_app.logger.info("Импорт weasyprint...")
-        from weasyprint import HTML
-        
+        if not db.session.get(Channel, channel_id):
+            return jsonify({"error": "Канал не найден"}), 404
+
+        if not os.path.exists(PDF_CSS_SOURCE):
+            current_app.logger.error(f"PDF CSS файл не найден: {PDF_CSS_SOURCE}")
+            return jsonify({"error": "PDF CSS файл не найден, соберите его: npm run build:pdf-css"}), 500
+
         channel_dir = os.path.join(DOWNLOADS_DIR, channel_id)
-        pdf_path = os.path.join(channel_dir, f"{channel_id}.pdf")
-        current_app.logger.info(f"Начинаем генерацию PDF: {pdf_path}")
-        
-        HTML(filename=pdf_html_path).write_pdf(pdf_path)
-        current_app.logger.info("PDF успешно сгенерирован")
+        os.makedirs(channel_dir, exist_ok=True)
 
-        if not os.path.exists(pdf_path):
-            current_app.logger.error(f"PDF-файл не найден после генерации: {pdf_path}")
-            return jsonify({"error": "PDF-файл не был создан"}), 500
+        try:
+            # Одна задача на канал: куски и итоговый PDF пишутся в общие для канала файлы
+            job_id = start_job(
+                'export_pdf',
+                export_channel_pdf_job,
+                channel_id,
+                channel_dir,
+                PDF_CSS_SOURCE,
+                force=request.args.get('force', '').lower() in ('1', 'true'),
+                app=current_app._get_current_object(),
+                details={'channel_id': channel_id},
+                key=channel_id
+            )
+        except JobAlreadyRunning as e:
+            return jsonify({"error": "Генерация PDF для канала уже идёт", "job_id": e.job_id}), 409
+        current_app.logger.info(f"Запущена генерация PDF для канала {channel_id} (job {job_id})")
 
-        current_app.logger.info(f"PDF для канала {channel_id} успешно создан: {pdf_path}")
-        
         return jsonify({
-            "success": True, 
-            "message": f"PDF файл создан и сохранен в папку downloads/{channel_id}/",
-            "path": pdf_path
-        }), 200
-        
+            "message": f"Генерация PDF запущена, файл появится в папке downloads/{channel_id}/",
+            "job_id": job_id
+        }), 202
+
     except Exception as e:
-        current_app.logger.exception(f"ОШИБКА при генерации PDF для канала {channel_id}")
+        current_app.logger.exception(f"ОШИБКА при запуске генерации PDF для канала {channel_id}")
         return jsonify({"error": f"Ошибка при генерации PDF: {str(e)}"}), 500
-        
-    finally:
-        # Восстанавливаем лимит рекурсии в любом случае
-        sys.setrecursionlimit(old_limit)
-        current_app.logger.info(f"Лимит рекурсии восстановлен до {old_limit}")
-        current_app.logger.info("=== КОНЕЦ PDF ГЕНЕРАЦИИ ===")
+
+@channels_bp.route('/channels/<channel_id>/variants', methods=['POST'])
+def generate_channel_variants(channel_id):
+    """
+    Запускает фоновую генерацию адаптивных копий фото канала (AVIF/WebP/JPEG
+    нескольких ширин для srcset) в пуле процессов.
+
+    Возвращает 202 и job_id; прогресс — GET /api/jobs/<job_id>. Если все фото
+    уже обработаны или задача уже идёт, возвращает 200 без job_id.
+    """
+    if not db.session.get(Channel, channel_id):
+        return jsonify({"error": "Канал не найден"}), 404
+
+    job_id = start_variants_job(channel_id, DOWNLOADS_DIR, app=current_app._get_current_object(), retry=True)
+    if job_id is None:
+        return jsonify({"message": "Нет фото без адаптивных копий или генерация уже идёт", "job_id": None}), 200
+    current_app.logger.info(f"Запущена генерация адаптивных копий для канала {channel_id} (job {job_id})")
+    return jsonify({"message": "Генерация адаптивных копий запущена", "job_id": job_id}), 202
@@ -3,26 +3,24 @@ API endpoints для управления загрузками
 """
 import time
 from flask import Blueprint, jsonify, request, current_app
+from utils.download_status import (
+    clear_download_status as clear_status,
+    get_all_download_statuses,
+    get_download_status,
+    set_download_status,
+    update_download_progress,
+)
 
 downloads_bp = Blueprint('downloads', __name__)
 
-# Импорт функций для работы со статусами загрузки
-def get_download_globals():
-    """Получает глобальные переменные для загрузки из основного приложения"""
-    import app
-    return app.download_status, app.download_lock, app.get_download_status, app.set_download_status, app.update_download_progress
-
 @downloads_bp.route('/download/status', methods=['GET'])
 def get_download_statuses():
     """Возвращает статусы всех загрузок."""
-    download_status, download_lock, _, _, _ = get_download_globals()
-    with download_lock:
-        return jsonify(download_status), 200
+    return jsonify(get_all_download_statuses()), 200
 
 @downloads_bp.route('/download/status/<channel_id>', methods=['GET'])
 def get_download_status_api(channel_id):
     """Возвращает статус загрузки канала."""
-    _, _, get_download_status, _, _ = get_download_globals()
     status = get_download_status(channel_id)
     if status:
         return jsonify(status), 200
@@ -33,8 +31,6 @@ def get_download_status_api(channel_id):
 def update_progress(channel_id):
     """Обновляет прогресс загрузки канала"""
     try:
-        _, _, _, _, update_download_progress = get_download_globals()
-        
         data = request.get_json()
         posts_processed = data.get('posts_processed', 0)
         total_posts = data.get('total_posts', 0)
@@ -48,8 +44,6 @@ def update_progress(channel_id):
 @downloads_bp.route('/download/stop/<channel_id>', methods=['POST'])
 def stop_download(channel_id):
     """Останавливает загрузку канала."""
-    _, _, get_download_status, set_download_status, _ = get_download_globals()
-    
     current_status = get_download_status(channel_id)
     
     if not current_status:
@@ -68,23 +62,15 @@ def stop_download(channel_id):
 @downloads_bp.route('/download/cancel/<channel_id>', methods=['POST'])
 def cancel_download(channel_id):
     """Отменяет и очищает статус загрузки канала."""
-    download_status, download_lock, _, _, _ = get_download_globals()
-    
-    with download_lock:
-        if channel_id in download_status:
-            del download_status[channel_id]
-            return jsonify({"message": f"Статус загрузки канала {channel_id} очищен"}), 200
-        else:
-            return jsonify({"error": "Загрузка не найдена"}), 404
+    if clear_status(channel_id):
+        return jsonify({"message": f"Статус загрузки канала {channel_id} очищен"}), 200
+    else:
+        return jsonify({"error": "Загрузка не найдена"}), 404
 
 @downloads_bp.route('/download/clear/<channel_id>', methods=['POST'])
 def clear_download_status(channel_id):
     """Очищает статус загрузки канала."""
-    download_status, download_lock, _, _, _ = get_download_globals()
-    
-    with download_lock:
-        if channel_id in download_status:
-            del download_status[channel_id]
-            return jsonify({"message": f"Статус загрузки канала {channel_id} очищен"}), 200
-        else:
-            return jsonify({"error": "Статус загрузки не найден"}), 404
+    if clear_status(channel_id):
+        return jsonify({"message": f"Статус загрузки канала {channel_id} очищен"}), 200
+    else:
+        return jsonify({"error": "Статус загрузки не найден"}), 404
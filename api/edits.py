@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from models import db, Edit
 from datetime import datetime
 import json
 
 edits_bp = Blueprint('edits', __name__)
 
+# Сколько строк отправлять в одном INSERT (ограничение SQLite на число параметров)
+BULK_CHUNK_SIZE = 500
+
 @edits_bp.route('/api/edits', methods=['POST'])
 def create_or_update_edit():
     """Создание новой записи о правке поста или обновление существующей"""
@@ -86,9 +90,24 @@ def get_edit_for_post(telegram_id, channel_id):
 
 @edits_bp.route('/api/edits', methods=['GET'])
 def get_all_edits():
-    """Получение всех правок"""
+    """Получение правок: всех или только канала (channel_id), с пагинацией limit/offset"""
     try:
-        edits = Edit.query.all()
+        channel_id = request.args.get('channel_id')
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+
+        if (limit is not None and limit <= 0) or offset < 0:
+            return jsonify({'error': 'limit must be positive and offset non-negative'}), 400
+
+        query = Edit.query
+        if channel_id:
+            query = query.filter_by(channel_id=channel_id)
+        total = query.count()
+
+        query = query.order_by(Edit.id.asc())
+        if limit is not None:
+            query = query.limit(limit).offset(offset)
+        edits = query.all()
         
         edits_data = []
         for edit in edits:
@@ -102,12 +121,68 @@ def get_all_edits():
         
         return jsonify({
             'success': True,
-            'edits': edits_data
+            'edits': edits_data,
+            'total': total,
+            'limit': limit,
+            'offset': offset
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@edits_bp.route('/api/edits/bulk', methods=['POST'])
+def bulk_upsert_edits():
+    """Массовое создание/обновление правок одной транзакцией (upsert по channel_id + telegram_id)
+
+    Тело запроса: {"channel_id": "...", "edits": [{"telegram_id": 1, "changes": {...}}, ...]}
+    channel_id верхнего уровня используется для элементов, где он не указан.
+    """
+    try:
+        data = request.get_json(silent=True)
+        items = data.get('edits') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Missing required field: edits'}), 400
+
+        default_channel_id = data.get('channel_id')
+        now = datetime.now().isoformat()
+
+        # Последняя правка для одного поста в запросе побеждает
+        rows = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                return jsonify({'error': f'Invalid edit: expected an object (item {index})'}), 400
+            channel_id = item.get('channel_id', default_channel_id)
+            for field, value in (('telegram_id', item.get('telegram_id')), ('channel_id', channel_id), ('changes', item.get('changes'))):
+                if value is None:
+                    return jsonify({'error': f'Missing required field: {field} (item {index})'}), 400
+            rows[(channel_id, item['telegram_id'])] = {
+                'telegram_id': item['telegram_id'],
+                'channel_id': channel_id,
+                'date': now,
+                'changes': item['changes']
+            }
+
+        values = list(rows.values())
+        for start in range(0, len(values), BULK_CHUNK_SIZE):
+            stmt = sqlite_insert(Edit).values(values[start:start + BULK_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['channel_id', 'telegram_id'],
+                set_={'date': stmt.excluded.date, 'changes': stmt.excluded.changes}
+            )
+            db.session.execute(stmt)
+
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'count': len(values),
+            'message': f'{len(values)} edits saved successfully'
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @edits_bp.route('/api/edits/<channel_id>', methods=['GET'])
 def get_edits_for_channel(channel_id):
     """Получение всех правок для канала"""
@@ -136,9 +211,8 @@ def get_edits_for_channel(channel_id):
 def delete_edits_for_channel(channel_id):
     """Удаление всех правок для канала"""
     try:
-        # Находим все правки для канала
-        edits = Edit.query.filter_by(channel_id=channel_id).all()
-        count = len(edits)
+        # Удаляем все правки канала одним запросом
+        count = Edit.query.filter_by(channel_id=channel_id).delete(synchronize_session=False)
         
         if count == 0:
             return jsonify({
@@ -147,10 +221,6 @@ def delete_edits_for_channel(channel_id):
                 'deleted_count': 0
             }), 200
         
-        # Удаляем все правки
-        for edit in edits:
-            db.session.delete(edit)
-        
         db.session.commit()
         
         return jsonify({
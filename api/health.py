@@ -0,0 +1,35 @@
+"""
+API endpoints для проверок liveness/readiness (балансировщик, docker healthcheck)
+"""
+import os
+from flask import Blueprint, jsonify
+from sqlalchemy import text
+from models import db
+
+health_bp = Blueprint('health', __name__)
+
+DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'downloads')
+
+@health_bp.route('/health/live', methods=['GET'])
+def liveness():
+    """Процесс жив и обрабатывает запросы."""
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+@health_bp.route('/health/ready', methods=['GET'])
+def readiness():
+    """Приложение готово принимать трафик: доступна БД и папка downloads."""
+    checks = {}
+
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = f'error: {e}'
+
+    if os.path.isdir(DOWNLOADS_DIR) and os.access(DOWNLOADS_DIR, os.W_OK):
+        checks['downloads'] = 'ok'
+    else:
+        checks['downloads'] = 'error: downloads directory is missing or not writable'
+
+    ready = all(value == 'ok' for value in checks.values())
+    return jsonify({"status": "ok" if ready else "unavailable", "checks": checks}), 200 if ready else 503
@@ -0,0 +1,21 @@
+"""
+API endpoints для отслеживания фоновых задач
+"""
+from flask import Blueprint, jsonify, request
+from utils.jobs import get_job, list_jobs
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def get_jobs():
+    """Возвращает статусы фоновых задач (опционально фильтр по kind)."""
+    kind = request.args.get('kind')
+    return jsonify(list_jobs(kind)), 200
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Возвращает статус и прогресс фоновой задачи."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Задача не найдена"}), 404
+    return jsonify(job), 200
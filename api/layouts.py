@@ -5,8 +5,11 @@ import os
 
 from flask import Blueprint, jsonify, request, current_app
 
-from models import db, Layout, Post
-from utils.gallery_layout import generate_gallery_layout
+from models import db, Channel, Layout, Post
+from utils.channel_layouts import RELOAD_JOB_KIND, regenerate_layouts_job
+from utils.gallery_layout import DEFAULT_LAYOUT_ENGINE, LAYOUT_ENGINES, post_image_sizes
+from utils.jobs import JobAlreadyRunning, start_job
+from utils.layout_cache import cached_gallery_layout
 
 layouts_bp = Blueprint('layouts', __name__)
 
@@ -14,29 +17,6 @@ BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DOWNLOADS_DIR = os.path.join(BASE_DIR, 'downloads')
 
 
-def _resolve_image_path(post):
-    """Return absolute path for a post thumbnail or media file if present."""
-
-    candidates = []
-
-    if post.thumb_url:
-        candidates.append(os.path.join(DOWNLOADS_DIR, post.thumb_url.lstrip('/')))
-
-    if post.media_url:
-        media_relative = post.media_url.lstrip('/')
-        candidates.append(os.path.join(DOWNLOADS_DIR, media_relative))
-        candidates.append(os.path.join(
-            DOWNLOADS_DIR,
-            media_relative.replace('/media/', '/thumbs/')
-        ))
-
-    for candidate in candidates:
-        if candidate and os.path.exists(candidate):
-            return candidate
-
-    return None
-
-
 @layouts_bp.route('/layouts/<grouped_id>', methods=['GET'])
 def get_layout(grouped_id):
     """Возвращает layout для указанного grouped_id."""
@@ -51,6 +31,57 @@ def get_layout(grouped_id):
     else:
         return jsonify({"error": "Layout not found"}), 404
 
+@layouts_bp.route('/layouts/reload', methods=['POST'])
+def reload_channel_layouts():
+    """
+    Перегенерирует layouts всех подходящих альбомов канала фоновой задачей.
+
+    Параметры генерации в теле: columns, no_crop, engine, border_width (если не
+    задан, рамка прежнего layout сохраняется). Фильтры: grouped_ids,
+    min_images, max_images, only_missing. Возвращает 202 и job_id; прогресс —
+    GET /api/jobs/<job_id>. Если перегенерация канала уже идёт — 409.
+    """
+    payload = request.get_json(silent=True) or {}
+    channel_id = payload.get('channel_id') or request.args.get('channel_id')
+    engine = payload.get('engine') or DEFAULT_LAYOUT_ENGINE
+    grouped_ids = payload.get('grouped_ids')
+
+    if not channel_id:
+        return jsonify({"error": "channel_id parameter is required"}), 400
+    if engine not in LAYOUT_ENGINES:
+        return jsonify({"error": f"engine must be one of: {', '.join(LAYOUT_ENGINES)}"}), 400
+    if grouped_ids is not None and not isinstance(grouped_ids, list):
+        return jsonify({"error": "grouped_ids must be a list"}), 400
+    try:
+        grouped_ids = None if grouped_ids is None else [int(grouped_id) for grouped_id in grouped_ids]
+        min_images = None if payload.get('min_images') is None else int(payload['min_images'])
+        max_images = None if payload.get('max_images') is None else int(payload['max_images'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "grouped_ids, min_images and max_images must be integers"}), 400
+    if not db.session.get(Channel, channel_id):
+        return jsonify({"error": "Channel not found"}), 404
+
+    options = {'columns': payload.get('columns'), 'no_crop': bool(payload.get('no_crop', False)), 'engine': engine}
+    try:
+        # Задача захватывается по ключу канала атомарно: параллельный запрос получит 409
+        job_id = start_job(
+            RELOAD_JOB_KIND, regenerate_layouts_job, channel_id, DOWNLOADS_DIR,
+            app=current_app._get_current_object(),
+            details={'channel_id': channel_id, 'options': options},
+            key=channel_id,
+            options=options,
+            border_width=payload.get('border_width'),
+            grouped_ids=grouped_ids,
+            min_images=min_images,
+            max_images=max_images,
+            only_missing=bool(payload.get('only_missing', False))
+        )
+    except JobAlreadyRunning as e:
+        return jsonify({"error": "Layouts regeneration is already running", "job_id": e.job_id}), 409
+    current_app.logger.info(f"Запущена перегенерация layouts канала {channel_id} (job {job_id})")
+    return jsonify({"message": "Layouts regeneration started", "job_id": job_id}), 202
+
+
 @layouts_bp.route('/layouts/<grouped_id>/reload', methods=['POST'])
 def reload_layout(grouped_id):
     """Перегенерирует layout для указанной медиа-группы и сохраняет его."""
@@ -60,9 +91,12 @@ def reload_layout(grouped_id):
     columns = payload.get('columns')
     no_crop = payload.get('no_crop', False)
     border_width = payload.get('border_width', '0')
+    engine = payload.get('engine') or DEFAULT_LAYOUT_ENGINE
 
     if not channel_id:
         return jsonify({"error": "channel_id parameter is required"}), 400
+    if engine not in LAYOUT_ENGINES:
+        return jsonify({"error": f"engine must be one of: {', '.join(LAYOUT_ENGINES)}"}), 400
 
     try:
         photo_posts = (
@@ -75,16 +109,14 @@ def reload_layout(grouped_id):
         if not photo_posts:
             return jsonify({"error": "No photo posts found for the requested group"}), 404
 
-        image_paths = []
-        for post in photo_posts:
-            path = _resolve_image_path(post)
-            if path:
-                image_paths.append(path)
+        # Размеры фото берутся из БД; файлы читаются только для постов старого импорта
+        sizes = [size for _, size in post_image_sizes(photo_posts, DOWNLOADS_DIR)]
 
-        if len(image_paths) < 2:
+        if len(sizes) < 2:
             return jsonify({"error": "At least two images are required to generate layout"}), 400
 
-        layout_data = generate_gallery_layout(image_paths, columns=columns, no_crop=no_crop)
+        # Кнопка перегенерации должна давать новую раскладку: кэш не читаем, а обновляем
+        layout_data = cached_gallery_layout(sizes, columns=columns, no_crop=no_crop, engine=engine, refresh=True)
 
         if not layout_data:
             return jsonify({"error": "Layout generation failed"}), 500
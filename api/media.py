@@ -1,8 +1,12 @@
 """
 API endpoints для раздачи медиафайлов
 """
+import mimetypes
 import os
-from flask import Blueprint, send_from_directory
+from urllib.parse import quote
+from flask import Blueprint, abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from config import MEDIA_OFFLOAD, MEDIA_ACCEL_PREFIX
 
 media_bp = Blueprint('media', __name__)
 
@@ -10,12 +14,85 @@ media_bp = Blueprint('media', __name__)
 MEDIA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'media')
 DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'downloads')
 
+# Папки каналов, файлы в которых после записи не меняются (медиа сообщений, превью и их адаптивные копии)
+IMMUTABLE_DIRS = ('media', 'thumbs', 'variants')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Год
+
+# Заголовок, которым фронт-прокси помечает запросы, которые он готов дообслужить сам.
+# Прямые запросы к app:5000 (SSR, WeasyPrint) по-прежнему получают байты от Flask.
+OFFLOAD_REQUEST_HEADER = 'X-Media-Offload'
+
+
+def _is_immutable(filename):
+    """Проверяет, что файл лежит в неизменяемой папке канала (<channel>/media/...)."""
+    parts = filename.replace('\\', '/').split('/')
+    return len(parts) >= 3 and parts[-2] in IMMUTABLE_DIRS
+
+
+def _set_cache_headers(response, immutable):
+    """Выставляет Cache-Control для неизменяемых и перепроверяемых файлов."""
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _offload_mode():
+    """Режим отдачи через прокси для текущего запроса ('' — отдаёт Flask)."""
+    if MEDIA_OFFLOAD in ('x-accel-redirect', 'x-sendfile') and request.headers.get(OFFLOAD_REQUEST_HEADER):
+        return MEDIA_OFFLOAD
+    return ''
+
+
+def _offload(directory, location, filename, immutable, mode):
+    """
+    Проверяет путь и передаёт отдачу файла прокси через X-Accel-Redirect / X-Sendfile.
+    Python не читает байты файла: ETag, Range и 304 обслуживает прокси.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    response = current_app.response_class(status=200)
+    response.headers['Content-Type'] = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mode == 'x-accel-redirect':
+        # nginx раскодирует URI internal-редиректа: кириллица, %, ? и # в именах файлов экранируются
+        relative = quote(os.path.relpath(path, directory).replace(os.sep, '/'))
+        response.headers['X-Accel-Redirect'] = f"{MEDIA_ACCEL_PREFIX}/{location}/{relative}"
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    return _set_cache_headers(response, immutable)
+
+
+def _send_cached(directory, filename, immutable=False):
+    """
+    Отдаёт файл с заголовками кеширования.
+
+    ETag, Last-Modified, If-None-Match/If-Modified-Since (304) и Range (206)
+    обрабатывает send_from_directory (conditional=True). Неизменяемые файлы
+    кешируются на год с immutable, остальные браузер перепроверяет по ETag.
+    """
+    max_age = IMMUTABLE_MAX_AGE if immutable else 0
+    response = send_from_directory(directory, filename, max_age=max_age, conditional=True, etag=True)
+    return _set_cache_headers(response, immutable)
+
+
 @media_bp.route('/media/<path:filename>')
 def serve_media(filename):
     """Раздаёт медиафайлы из папки media."""
-    return send_from_directory(MEDIA_DIR, filename)
+    mode = _offload_mode()
+    if mode:
+        return _offload(MEDIA_DIR, 'media', filename, False, mode)
+    return _send_cached(MEDIA_DIR, filename)
 
 @media_bp.route('/downloads/<path:filename>')
 def serve_downloads(filename):
     """Раздаёт файлы из папки downloads (media, thumbs, layouts, avatars и т.д.)."""
-    return send_from_directory(DOWNLOADS_DIR, filename)
+    immutable = _is_immutable(filename)
+    mode = _offload_mode()
+    if mode:
+        return _offload(DOWNLOADS_DIR, 'downloads', filename, immutable, mode)
+    return _send_cached(DOWNLOADS_DIR, filename, immutable=immutable)
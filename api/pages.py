@@ -1,51 +1,160 @@
 """
 API endpoints для работы со страницами
 
-Автогенерация страниц:
-- При запросе страниц канала, если их нет, автоматически создаются ВСЕ страницы
+Автогенерация страниц (utils/page_grid.py):
 - Посты разбиваются на группы по 4 поста
 - Каждая группа становится отдельной страницей с сеткой 2×2 (блоки 6×6)
-- Все страницы создаются за один раз и сохраняются в одной транзакции
+- Страницы создаются фоновой задачей page_grid окнами, каждое окно сохраняется
+  отдельно; новые посты дописываются в конец без перестройки готовых страниц
+- GET /api/pages?channel_id= только читает сохранённые страницы и лениво
+  запускает задачу, если есть неразмещённые посты; id идущей задачи —
+  в заголовке X-Pages-Job (прогресс — GET /api/jobs/<job_id>)
+
+Посты на страницах индексируются в page_blocks при каждом изменении страницы;
+GET /api/pages/by-post находит страницу поста по этому индексу.
+
+Для больших каналов: GET /api/pages/summary — лёгкий список страниц с
+пагинацией, полная страница — GET /api/pages/<id> с ETag (304 без изменений).
 """
-from flask import Blueprint, jsonify, request
-from models import db, Page, Post
+import hashlib
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import func
+from models import db, Page
 from datetime import datetime
+from utils.page_grid import find_post_page, index_pages, start_pages_job, unindex_pages
 
 pages_bp = Blueprint('pages', __name__)
+PAGES_JOB_HEADER = 'X-Pages-Job'  # id идущей задачи page_grid в ответе GET /api/pages
+
+
+def _pagination_args():
+    """limit/offset из запроса: (limit, offset, ошибка)."""
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if (limit is not None and limit <= 0) or offset < 0:
+        return None, None, (jsonify({"error": "limit must be positive and offset non-negative"}), 400)
+    return limit, offset, None
+
+
+def _page_etag(page):
+    """ETag страницы: меняется вместе с updated_at, который обновляет каждое сохранение."""
+    updated_at = (page.json_data or {}).get('updated_at') or ''
+    return hashlib.sha1(f"{page.id}|{page.channel_id}|{updated_at}".encode('utf-8')).hexdigest()
+
+
+def _page_response(page, status=200):
+    response = jsonify({
+        "id": page.id,
+        "channel_id": page.channel_id,
+        "json_data": page.json_data
+    })
+    response.status_code = status
+    response.set_etag(_page_etag(page))
+    # Браузер перепроверяет страницу по ETag и получает 304, если она не менялась
+    response.cache_control.no_cache = True
+    return response
+
 
 @pages_bp.route('/pages', methods=['GET'])
 def get_pages():
-    """Возвращает список всех страниц или страниц из конкретного канала.
-    Если для канала нет страниц, автоматически создает страницы по 4 поста на каждой."""
+    """Возвращает список всех страниц или страниц из конкретного канала
+    (опционально окно limit/offset в порядке id).
+    Если у канала есть посты, ещё не размещённые на страницах, запускает их
+    фоновую раскладку по 4 поста на страницу; id задачи — в заголовке
+    X-Pages-Job (статус — GET /api/jobs/<job_id>)."""
     channel_id = request.args.get('channel_id')  # Получаем ID канала из параметров запроса
+    limit, offset, error = _pagination_args()
+    if error:
+        return error
+
+    query = Page.query
+    job_id = None
     if channel_id:
-        pages = Page.query.filter_by(channel_id=channel_id).all()
-        
-        # Если страниц нет, создаем автоматически все страницы для всех постов канала
-        if not pages:
-            pages = _auto_generate_pages(channel_id)
-    else:
-        pages = Page.query.all()  # Возвращаем все страницы
-
-    return jsonify([{
+        query = query.filter_by(channel_id=channel_id)
+        job_id = start_pages_job(channel_id, app=current_app._get_current_object())
+    query = query.order_by(Page.id)
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    pages = query.all()
+
+    response = jsonify([{
         "id": page.id,
         "channel_id": page.channel_id,
         "json_data": page.json_data
     } for page in pages])
+    if job_id:
+        response.headers[PAGES_JOB_HEADER] = job_id
+    return response
+
+
+@pages_bp.route('/pages/summary', methods=['GET'])
+def get_pages_summary():
+    """Лёгкий список страниц без json_data: id, порядковый номер (index, с 0),
+    число блоков и updated_at; с пагинацией limit/offset. Блоки и дата
+    достаются из JSON средствами SQLite, страницы в Python не разбираются.
+    job_id — идущая задача раскладки постов канала или null."""
+    channel_id = request.args.get('channel_id')
+    limit, offset, error = _pagination_args()
+    if error:
+        return error
+
+    job_id = None
+    query = db.session.query(
+        Page.id,
+        func.coalesce(func.json_array_length(Page.json_data, '$.blocks'), 0),
+        func.json_extract(Page.json_data, '$.updated_at')
+    )
+    if channel_id:
+        query = query.filter(Page.channel_id == channel_id)
+        job_id = start_pages_job(channel_id, app=current_app._get_current_object())
+    total = query.count()
+
+    query = query.order_by(Page.id)
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+
+    return jsonify({
+        "pages": [{
+            "id": page_id,
+            "index": offset + i,
+            "blocks": blocks,
+            "updated_at": updated_at
+        } for i, (page_id, blocks, updated_at) in enumerate(query)],
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "job_id": job_id
+    })
+
+
+@pages_bp.route('/pages/by-post', methods=['GET'])
+def get_post_page():
+    """Возвращает страницу, на которой стоит пост (по индексу page_blocks)."""
+    channel_id = request.args.get('channel_id')
+    telegram_id = request.args.get('telegram_id', type=int)
+    if not channel_id or telegram_id is None:
+        return jsonify({"error": "channel_id and telegram_id are required"}), 400
+
+    found = find_post_page(channel_id, telegram_id)
+    if not found:
+        return jsonify({"error": "Post is not placed on any page"}), 404
+    page_id, position = found
+    return jsonify({"page_id": page_id, "position": position})
 
 
 @pages_bp.route('/pages/<int:page_id>', methods=['GET'])
 def get_page(page_id):
     """Возвращает конкретную страницу по ID."""
-    page = Page.query.get(page_id)
+    page = db.session.get(Page, page_id)
     if not page:
         return jsonify({"error": "Page not found"}), 404
-    
-    return jsonify({
-        "id": page.id,
-        "channel_id": page.channel_id,
-        "json_data": page.json_data
-    })
+
+    if _page_etag(page) in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(_page_etag(page))
+        return response
+    return _page_response(page)
 
 
 @pages_bp.route('/pages', methods=['POST'])
@@ -81,19 +190,17 @@ def create_page():
     )
     
     db.session.add(new_page)
+    db.session.flush()
+    index_pages([new_page])
     db.session.commit()
     
-    return jsonify({
-        "id": new_page.id,
-        "channel_id": new_page.channel_id,
-        "json_data": new_page.json_data
-    }), 201
+    return _page_response(new_page, 201)
 
 
 @pages_bp.route('/pages/<int:page_id>', methods=['PUT'])
 def update_page(page_id):
     """Обновляет существующую страницу."""
-    page = Page.query.get(page_id)
+    page = db.session.get(Page, page_id)
     if not page:
         return jsonify({"error": "Page not found"}), 404
     
@@ -112,97 +219,21 @@ def update_page(page_id):
     if 'channel_id' in data:
         page.channel_id = data['channel_id']
     
+    index_pages([page])
     db.session.commit()
     
-    return jsonify({
-        "id": page.id,
-        "channel_id": page.channel_id,
-        "json_data": page.json_data
-    })
+    return _page_response(page)
 
 
 @pages_bp.route('/pages/<int:page_id>', methods=['DELETE'])
 def delete_page(page_id):
     """Удаляет страницу."""
-    page = Page.query.get(page_id)
+    page = db.session.get(Page, page_id)
     if not page:
         return jsonify({"error": "Page not found"}), 404
     
+    unindex_pages([page.id])
     db.session.delete(page)
     db.session.commit()
     
     return jsonify({"message": "Page deleted successfully"}), 200
-
-
-def _auto_generate_pages(channel_id):
-    """
-    Автоматически генерирует все страницы для канала.
-    Создает страницы по 4 поста на каждой в сетке 2x2 (блоки размером 6x6).
-    
-    Args:
-        channel_id: ID канала
-        
-    Returns:
-        list[Page]: Список созданных страниц
-    """
-    # Получаем все посты канала
-    all_posts = Post.query.filter_by(channel_id=channel_id).order_by(Post.telegram_id.asc()).all()
-    
-    if not all_posts:
-        return []
-    
-    # Позиции блоков в сетке 2x2 (каждый блок 6x6)
-    positions = [
-        {"x": 0, "y": 0, "w": 6, "h": 6},  # Верхний левый
-        {"x": 6, "y": 0, "w": 6, "h": 6},  # Верхний правый
-        {"x": 0, "y": 6, "w": 6, "h": 6},  # Нижний левый
-        {"x": 6, "y": 6, "w": 6, "h": 6},  # Нижний правый
-    ]
-    
-    created_pages = []
-    
-    # Разбиваем посты на группы по 4
-    for page_num in range(0, len(all_posts), 4):
-        posts_chunk = all_posts[page_num:page_num + 4]
-        
-        # Создаем блоки для постов текущей страницы
-        blocks = []
-        for i, post in enumerate(posts_chunk):
-            block = {
-                "id": f"block-{page_num + i + 1}",
-                "x": positions[i]["x"],
-                "y": positions[i]["y"],
-                "w": positions[i]["w"],
-                "h": positions[i]["h"],
-                "content": {
-                    "channel_id": channel_id,
-                    "telegram_id": post.telegram_id
-                }
-            }
-            blocks.append(block)
-        
-        # Создаем JSON данные для страницы
-        json_data = {
-            "version": 1,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat(),
-            "grid": {
-                "cellHeight": 100,
-                "columns": 12
-            },
-            "blocks": blocks
-        }
-        
-        # Создаем и сохраняем страницу
-        new_page = Page(
-            channel_id=channel_id,
-            json_data=json_data
-        )
-        
-        db.session.add(new_page)
-        created_pages.append(new_page)
-    
-    # Сохраняем все страницы одной транзакцией
-    db.session.commit()
-    
-    return created_pages
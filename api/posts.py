@@ -1,29 +1,58 @@
 """
 API endpoints для работы с постами
 """
-from flask import Blueprint, jsonify, request
-from models import db, Post, Channel
+import hashlib
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import and_, func, or_
+from models import db, Post, Channel, Edit
+from utils.image_variants import variants_by_post, variants_signature
+from utils.page_grid import remove_post_blocks
 
 posts_bp = Blueprint('posts', __name__)
 
-@posts_bp.route('/posts', methods=['GET'])
-def get_posts():
-    """Возвращает список всех постов или постов из конкретного канала."""
-    channel_id = request.args.get('channel_id')  # Получаем ID канала из параметров запроса
-    if channel_id:
-        # Получаем основные посты канала
-        posts = Post.query.filter_by(channel_id=channel_id).all()
-        
-        # Получаем информацию о канале, чтобы найти связанную дискуссионную группу
-        channel = Channel.query.filter_by(id=channel_id).first()
-        if channel and channel.discussion_group_id:
-            # Добавляем комментарии из дискуссионной группы
-            discussion_posts = Post.query.filter_by(channel_id=str(channel.discussion_group_id)).all()
-            posts.extend(discussion_posts)
-    else:
-        posts = Post.query.all()  # Возвращаем все посты
+# Значения changes.hidden, которые считаются "скрыт" (фронтенд пишет строку 'true')
+HIDDEN_VALUES = ('true', '1')
+
+
+def _is_truthy_flag(value):
+    """Проверяет, что значение из args или changes означает True."""
+    return str(value).lower() in HIDDEN_VALUES
+
+
+def _channel_scope(channel_id):
+    """Возвращает список ID: сам канал и его дискуссионная группа (если есть)."""
+    channel_ids = [channel_id]
+    channel = Channel.query.filter_by(id=channel_id).first()
+    if channel and channel.discussion_group_id:
+        channel_ids.append(str(channel.discussion_group_id))
+    return channel_ids
+
+
+def _posts_etag(channel_ids):
+    """
+    Считает ETag для постов каналов с учётом правок.
+
+    Меняется при добавлении/удалении постов, при любом создании, обновлении
+    или удалении правки в этих каналах и при появлении адаптивных копий фото.
+    """
+    posts_sig = db.session.query(func.count(Post.id), func.max(Post.id)).filter(
+        Post.channel_id.in_(channel_ids)
+    ).one()
+    edits_sig = db.session.query(func.count(Edit.id), func.max(Edit.id), func.max(Edit.date)).filter(
+        Edit.channel_id.in_(channel_ids)
+    ).one()
+    raw = f"{','.join(channel_ids)}|{tuple(posts_sig)}|{tuple(edits_sig)}|{variants_signature(channel_ids)}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _serialize_post(post, changes=None, variants=None):
+    """
+    Преобразует пост в словарь для API, накладывая правки (если переданы).
 
-    return jsonify([{
+    variants — адаптивные копии фото для srcset (см. utils/image_variants.py).
+    """
+    data = {
         "id": post.id,
         "telegram_id": post.telegram_id,
         "channel_id": post.channel_id,
@@ -33,6 +62,8 @@ def get_posts():
         "thumb_url": post.thumb_url,
         "media_type": post.media_type,
         "mime_type": post.mime_type,
+        "media_width": post.media_width,
+        "media_height": post.media_height,
         "author_name": post.author_name,
         "author_avatar": post.author_avatar,
         "author_link": post.author_link,
@@ -41,8 +72,79 @@ def get_posts():
         "repost_author_link": post.repost_author_link,
         "reactions": post.reactions,
         "grouped_id": post.grouped_id,
-        "reply_to": post.reply_to
-    } for post in posts])
+        "reply_to": post.reply_to,
+        "variants": variants or []
+    }
+    if changes is not None:
+        changes = changes or {}
+        if 'message' in changes:
+            data['message'] = changes['message']
+        if 'reactions' in changes:
+            data['reactions'] = changes['reactions']
+        data['hidden'] = _is_truthy_flag(changes.get('hidden', False))
+    return data
+
+
+def _query_posts_with_edits(channel_id, include_hidden):
+    """Один LEFT JOIN постов канала с правками; скрытые посты отсекаются в SQL."""
+    query = (
+        db.session.query(Post, Edit.changes)
+        .outerjoin(Edit, and_(
+            Edit.channel_id == Post.channel_id,
+            Edit.telegram_id == Post.telegram_id
+        ))
+        .filter(Post.channel_id == channel_id)
+    )
+    if not include_hidden:
+        hidden = func.lower(func.json_extract(Edit.changes, '$.hidden'))
+        query = query.filter(or_(hidden.is_(None), hidden.notin_(HIDDEN_VALUES)))
+    return query.order_by(Post.id.asc()).all()
+
+
+@posts_bp.route('/posts', methods=['GET'])
+def get_posts():
+    """Возвращает список всех постов или постов из конкретного канала.
+
+    Параметры:
+    - apply_edits=1: наложить правки (message, reactions, hidden) на сервере
+    - include_hidden=0: вместе с apply_edits исключить скрытые посты
+    """
+    channel_id = request.args.get('channel_id')  # Получаем ID канала из параметров запроса
+    apply_edits = _is_truthy_flag(request.args.get('apply_edits', '0'))
+    include_hidden = _is_truthy_flag(request.args.get('include_hidden', '1'))
+
+    if not channel_id:
+        posts = Post.query.all()  # Возвращаем все посты
+        return jsonify([_serialize_post(post) for post in posts])
+
+    # Основной канал и связанная дискуссионная группа
+    channel_ids = _channel_scope(channel_id)
+
+    etag = _posts_etag(channel_ids)
+    etag += '-e' if apply_edits else ''
+    etag += '' if include_hidden else '-v'
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    result = []
+    variants = variants_by_post(channel_ids)
+    for scope_id in channel_ids:
+        if apply_edits:
+            result.extend(
+                _serialize_post(post, changes or {}, variants.get((post.channel_id, post.telegram_id)))
+                for post, changes in _query_posts_with_edits(scope_id, include_hidden)
+            )
+        else:
+            result.extend(
+                _serialize_post(post, variants=variants.get((post.channel_id, post.telegram_id)))
+                for post in Post.query.filter_by(channel_id=scope_id).all()
+            )
+
+    response = jsonify(result)
+    response.set_etag(etag)
+    return response
 
 @posts_bp.route('/posts/check', methods=['GET'])
 def check_post_exists():
@@ -68,6 +170,8 @@ def add_post():
         thumb_url=data.get('thumb_url'),  # Сохраняем ссылку на миниатюру
         media_type=data.get('media_type'),  # Сохраняем тип медиа
         mime_type=data.get('mime_type'),  # Сохраняем MIME-тип
+        media_width=data.get('media_width'),  # Ширина медиа из Telegram
+        media_height=data.get('media_height'),  # Высота медиа из Telegram
         author_name=data.get('author_name'),  # Имя автора
         author_avatar=data.get('author_avatar'),  # Ссылка на аватар автора
         author_link=data.get('author_link'),  # Ссылка на профиль автора
@@ -93,6 +197,8 @@ def delete_post():
 
     post = Post.query.filter_by(telegram_id=telegram_id, channel_id=channel_id).first()
     if post:
+        # Блоки поста убираются со страниц, найденных по индексу page_blocks
+        remove_post_blocks(channel_id, post.telegram_id)
         db.session.delete(post)
         db.session.commit()
         return jsonify({"message": f"Пост с ID {telegram_id} успешно удалён."}), 200
@@ -2,17 +2,12 @@ import multiprocessing
 multiprocessing.set_start_method("fork", force=True)
 
 import logging
-import time
-import threading
 import os
-import requests
-from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
-from weasyprint import HTML
-from models import db, Post, Channel, Page
 from database import create_app, init_db
-from message_processing.channel_info import get_channel_info
-from telegram_client import connect_to_telegram
+
+# Тяжёлые подсистемы (WeasyPrint, Telethon, BeautifulSoup, photocollage) импортируются
+# лениво внутри обработчиков, которым они нужны: старт API и тестов их не загружает.
 
 MEDIA_DIR = os.path.join(os.path.dirname(__file__), 'media')
 DOWNLOADS_DIR = os.path.join(os.path.dirname(__file__), 'downloads')
@@ -25,8 +20,10 @@ logging.basicConfig(
 )
 
 app = create_app()
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})  # Разрешаем CORS для фронтенда
+# Разрешаем CORS для фронтенда; X-Pages-Job — id задачи раскладки страниц в GET /api/pages
+CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, expose_headers=['X-Pages-Job'])
 init_db(app)
+os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
 # Регистрация blueprints
 from api.posts import posts_bp
@@ -36,6 +33,8 @@ from api.media import media_bp
 from api.edits import edits_bp
 from api.layouts import layouts_bp
 from api.pages import pages_bp
+from api.jobs import jobs_bp
+from api.health import health_bp
 
 app.register_blueprint(posts_bp, url_prefix='/api')
 app.register_blueprint(channels_bp, url_prefix='/api')
@@ -44,39 +43,17 @@ app.register_blueprint(media_bp)  # Без префикса, так как пу
 app.register_blueprint(edits_bp)  # Без префикса, так как пути уже начинаются с /api
 app.register_blueprint(layouts_bp, url_prefix='/api')
 app.register_blueprint(pages_bp, url_prefix='/api')
-
-# Глобальные переменные для управления загрузкой
-download_status = {}  # Статус загрузки для каждого канала
-download_lock = threading.Lock()  # Блокировка для thread-safe операций
-
-def set_download_status(channel_id, status, details=None):
-    """Устанавливает статус загрузки канала"""
-    with download_lock:
-        download_status[channel_id] = {
-            'status': status,  # 'downloading', 'stopped', 'completed', 'error'
-            'details': details or {},
-            'timestamp': time.time()
-        }
-
-def update_download_progress(channel_id, posts_processed=0, total_posts=0, comments_processed=0):
-    """Обновляет прогресс загрузки канала"""
-    with download_lock:
-        if channel_id in download_status:
-            download_status[channel_id]['details'].update({
-                'posts_processed': posts_processed,
-                'total_posts': total_posts,
-                'comments_processed': comments_processed
-            })
-
-def get_download_status(channel_id):
-    """Получает статус загрузки канала"""
-    with download_lock:
-        return download_status.get(channel_id)
-
-def should_stop_download(channel_id):
-    """Проверяет, нужно ли остановить загрузку"""
-    status = get_download_status(channel_id)
-    return status and status.get('status') == 'stopped'
+app.register_blueprint(jobs_bp, url_prefix='/api')
+app.register_blueprint(health_bp, url_prefix='/api')
+
+# Статусы загрузки хранятся в БД (общие для всех воркеров); реэкспорт для обратной совместимости
+from utils.download_status import (
+    set_download_status,
+    update_download_progress,
+    get_download_status,
+    should_stop_download,
+)
 
 if __name__ == '__main__':
-    app.run(debug=False, host='0.0.0.0')
+    # Dev-сервер Werkzeug; в production приложение запускается через gunicorn (см. gunicorn.conf.py)
+    app.run(debug=False, host='0.0.0.0', threaded=True)
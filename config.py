@@ -11,6 +11,32 @@ PHONE = os.getenv("PHONE")
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "telegram_export")
 DOWNLOADS_DIR = "downloads"
 
+# Отдача медиа фронт-прокси: "" (Flask сам), "x-accel-redirect" (nginx) или "x-sendfile" (Apache/lighttpd)
+MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "").strip().lower()
+# Префикс internal-локаций nginx для X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/_protected").rstrip("/")
+
+# Генерация PDF: число процессов WeasyPrint и элементов ленты в одном куске
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+PDF_CHUNK_ITEMS = int(os.getenv("PDF_CHUNK_ITEMS", "200"))
+# Печатные копии изображений для PDF: разрешение (точек на дюйм) и качество JPEG
+PDF_IMAGE_DPI = int(os.getenv("PDF_IMAGE_DPI", "150"))
+PDF_IMAGE_QUALITY = int(os.getenv("PDF_IMAGE_QUALITY", "80"))
+
+# Адаптивные копии фото для srcset: ширины в пикселях и форматы (неподдерживаемые Pillow пропускаются)
+IMAGE_VARIANT_WIDTHS = tuple(int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(","))
+IMAGE_VARIANT_FORMATS = tuple(f.strip() for f in os.getenv("IMAGE_VARIANT_FORMATS", "avif,webp,jpeg").split(","))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", os.cpu_count() or 1))
+
+# Генерация layouts альбомов канала: число процессов и альбомов в одном задании пула
+LAYOUT_WORKERS = int(os.getenv("LAYOUT_WORKERS", os.cpu_count() or 1))
+LAYOUT_BATCH_ALBUMS = int(os.getenv("LAYOUT_BATCH_ALBUMS", "500"))
+# Кэш layouts по пропорциям фото: максимум записей (LRU) и знаков после запятой в пропорциях
+LAYOUT_CACHE_SIZE = int(os.getenv("LAYOUT_CACHE_SIZE", "20000"))
+LAYOUT_CACHE_RATIO_PRECISION = int(os.getenv("LAYOUT_CACHE_RATIO_PRECISION", "3"))
+# Автогенерация страниц редактора: страниц, создаваемых и сохраняемых за один шаг фоновой задачи
+PAGE_GRID_WINDOW = int(os.getenv("PAGE_GRID_WINDOW", "50"))
+
 EXPORT_SETTINGS = {
     "include_system_messages": False,
     "include_reposts": True,
@@ -1,17 +1,86 @@
+import os
 from flask import Flask
+from sqlalchemy import text
 from models import db
 import multiprocessing
 
 # Устанавливаем метод запуска процессов "fork"
 multiprocessing.set_start_method("fork", force=True)
 
+DEFAULT_DATABASE_URI = 'sqlite:///posts.db?check_same_thread=False'
+
 def create_app():
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///posts.db?check_same_thread=False'
+    # Относительный путь sqlite Flask-SQLAlchemy кладёт в instance/; окружение может указать другую базу
+    # (пустое значение из .env, скопированного с example.env, тоже означает базу по умолчанию)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI') or DEFAULT_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Несколько воркеров gunicorn пишут в один файл SQLite: ждём блокировку, а не падаем сразу
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
     db.init_app(app)
     return app
 
 def init_db(app):
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        db.create_all()
+        upgrade_schema()
+        # Потоки задач не переживают перезапуск: их running-записи больше не блокируют новые задачи
+        from utils.jobs import interrupt_running_jobs
+        interrupt_running_jobs()
+        if schema_version() < PAGE_BLOCKS_VERSION:
+            # Индекс постов на страницах для баз, созданных до появления page_blocks
+            from utils.page_grid import rebuild_page_blocks
+            rebuild_page_blocks()
+            set_schema_version(PAGE_BLOCKS_VERSION)
+        if schema_version() < PAGE_GRID_STATE_VERSION:
+            # Граница разложенных постов для каналов, страницы которых созданы до page_grid_state
+            from utils.page_grid import seed_page_grid_state
+            seed_page_grid_state()
+            set_schema_version(PAGE_GRID_STATE_VERSION)
+
+# Версия данных базы в PRAGMA user_version: одноразовые перестроения выполняются,
+# пока версия ниже нужной, и не повторяются при следующих запусках
+PAGE_BLOCKS_VERSION = 1  # page_blocks заполнен по json_data всех страниц
+PAGE_GRID_STATE_VERSION = 2  # page_grid_state заполнен по page_blocks
+
+# Колонки, добавленные в существующие таблицы после их создания: (таблица, колонка, тип)
+ADDED_COLUMNS = (
+    ('posts', 'media_width', 'INTEGER'),
+    ('posts', 'media_height', 'INTEGER'),
+    ('jobs', 'key', 'VARCHAR'),
+)
+
+def upgrade_schema():
+    """Донастраивает базу: WAL-журнал, новые колонки и индексы, появившиеся после создания таблиц."""
+    with db.engine.begin() as connection:
+        # WAL: читатели из других воркеров не блокируются на время записи
+        connection.execute(text("PRAGMA journal_mode=WAL"))
+        # create_all не меняет существующие таблицы: добавляем недостающие колонки сами
+        for table, column, column_type in ADDED_COLUMNS:
+            existing = {row[1] for row in connection.execute(text(f"PRAGMA table_info({table})"))}
+            if column not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        # Уникальный индекс правок: сначала убираем дубликаты, оставляя последнюю запись
+        connection.execute(text(
+            "DELETE FROM edits WHERE id NOT IN "
+            "(SELECT MAX(id) FROM edits GROUP BY channel_id, telegram_id)"
+        ))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_edits_channel_telegram "
+            "ON edits (channel_id, telegram_id)"
+        ))
+        # Одна выполняющаяся задача на (тип, ключ): у старых записей key пуст и не мешает индексу
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_jobs_running_key "
+            "ON jobs (kind, key) WHERE status = 'running'"
+        ))
+
+def schema_version():
+    """Версия данных базы из PRAGMA user_version (0 у новых и старых баз)."""
+    with db.engine.connect() as connection:
+        return connection.execute(text("PRAGMA user_version")).scalar()
+
+def set_schema_version(version):
+    """Записывает версию данных базы в PRAGMA user_version."""
+    with db.engine.begin() as connection:
+        connection.execute(text(f"PRAGMA user_version = {int(version)}"))
@@ -0,0 +1,32 @@
+"""
+Конфигурация gunicorn для production-запуска: gunicorn -c gunicorn.conf.py app:app
+
+Параметры переопределяются переменными окружения GUNICORN_*.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# gthread: долгие запросы (импорт канала, PDF) не блокируют воркер целиком,
+# а импорт может обращаться к собственному API (localhost:5000) без взаимоблокировки
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Схема БД создаётся один раз в мастере до fork
+preload_app = True
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    """Соединения SQLite, открытые мастером при preload, не должны переходить в воркеры."""
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose()
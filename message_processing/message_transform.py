@@ -13,7 +13,9 @@ from message_processing import author as author_module
 from utils.text_format import parse_entities_to_html
 from telethon.tl.types import (
 	Document,
+	DocumentAttributeImageSize,
 	DocumentAttributeSticker,
+	DocumentAttributeVideo,
 	MessageMediaDocument,
 	MessageMediaPhoto,
 	MessageMediaWebPage,
@@ -42,6 +44,8 @@ class ProcessedMessage(TypedDict, total=False):
 	thumb_url: Optional[str]
 	media_type: Optional[str]
 	mime_type: Optional[str]
+	media_width: Optional[int]
+	media_height: Optional[int]
 	author_name: Optional[str]
 	author_avatar: Optional[str]
 	author_link: Optional[str]
@@ -61,6 +65,8 @@ class MediaInfo:
 	thumb_url: Optional[str] = None
 	media_type: Optional[str] = None
 	mime_type: Optional[str] = None
+	width: Optional[int] = None
+	height: Optional[int] = None
 	sticker_emoji: Optional[str] = None
 
 
@@ -101,6 +107,32 @@ def extract_sticker_emoji(media) -> Optional[str]:
 	return None
 
 
+def extract_media_size(media) -> Optional[tuple]:
+	"""Return (width, height) of a photo or image/video document from Telegram metadata."""
+
+	if isinstance(media, MessageMediaPhoto):
+		photo = getattr(media, "photo", None)
+		# Stripped and path sizes carry no dimensions; the largest size is the downloaded original.
+		sizes = [
+			(size.w, size.h)
+			for size in getattr(photo, "sizes", None) or []
+			if getattr(size, "w", None) and getattr(size, "h", None)
+		]
+		if sizes:
+			return max(sizes, key=lambda size: size[0] * size[1])
+		return None
+
+	if isinstance(media, MessageMediaDocument):
+		document = getattr(media, "document", None)
+		if not isinstance(document, Document):
+			return None
+		for attr in getattr(document, "attributes", []):
+			if isinstance(attr, (DocumentAttributeImageSize, DocumentAttributeVideo)) and attr.w and attr.h:
+				return attr.w, attr.h
+
+	return None
+
+
 def download_media_with_thumbnail(post, client, channel_folder: str) -> MediaInfo:
 	"""Download media files and generate thumbnails when applicable."""
 
@@ -133,6 +165,10 @@ def download_media_with_thumbnail(post, client, channel_folder: str) -> MediaInf
 	if isinstance(post.media, MessageMediaDocument) and isinstance(getattr(post.media, "document", None), Document):
 		info.mime_type = getattr(post.media.document, "mime_type", None)
 
+	size = extract_media_size(post.media)
+	if size:
+		info.width, info.height = size
+
 	if info.media_url and isinstance(post.media, MessageMediaPhoto):
 		full_media_path = os.path.join(DOWNLOADS_DIR, info.media_url)
 		thumbs_dir = os.path.join(channel_folder, "thumbs")
@@ -143,6 +179,9 @@ def download_media_with_thumbnail(post, client, channel_folder: str) -> MediaInf
 			from PIL import Image
 
 			with Image.open(full_media_path) as img:
+				if not size:
+					# No dimensions in the message: take them from the downloaded file.
+					info.width, info.height = img.size
 				img.thumbnail((300, 300), Image.Resampling.LANCZOS)
 				img.save(thumb_path, quality=85, optimize=True)
 				logging.info("Created thumbnail %s with size %s", thumb_path, img.size)
@@ -291,6 +330,8 @@ def process_message_for_api(post, channel_id: str, client, folder_name: Optional
 			"thumb_url": media_info.thumb_url,
 			"media_type": media_info.media_type,
 			"mime_type": media_info.mime_type,
+			"media_width": media_info.width,
+			"media_height": media_info.height,
 			"author_name": author_info.get("author_name"),
 			"author_avatar": author_info.get("author_avatar"),
 			"author_link": author_info.get("author_link"),
@@ -317,6 +358,7 @@ __all__ = [
 	"build_message_text",
 	"build_reactions",
 	"download_media_with_thumbnail",
+	"extract_media_size",
 	"extract_sticker_emoji",
 	"get_channel_folder",
 	"process_message_for_api",
@@ -15,6 +15,8 @@ class Post(db.Model):
     thumb_url = db.Column(db.String, nullable=True)  # Путь к миниатюре
     media_type = db.Column(db.String, nullable=True)
     mime_type = db.Column(db.String, nullable=True)
+    media_width = db.Column(db.Integer, nullable=True)  # Ширина фото/видео в пикселях (из Telegram)
+    media_height = db.Column(db.Integer, nullable=True)  # Высота фото/видео в пикселях (из Telegram)
     author_name = db.Column(db.String, nullable=True)  # Имя автора
     author_avatar = db.Column(db.String, nullable=True)  # Ссылка на аватар автора
     author_link = db.Column(db.String, nullable=True)  # Ссылка на профиль автора
@@ -47,6 +49,10 @@ class Channel(db.Model):
 
 class Edit(db.Model):
     __tablename__ = 'edits'
+    __table_args__ = (
+        # Одна актуальная правка на пост; нужен для upsert по (channel_id, telegram_id)
+        db.Index('ix_edits_channel_telegram', 'channel_id', 'telegram_id', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     telegram_id = db.Column(db.Integer, nullable=False)  # ID телеграм сообщения
@@ -68,6 +74,16 @@ class Layout(db.Model):
     def __repr__(self):
         return f"<Layout for grouped_id {self.grouped_id} in channel {self.channel_id}>"
 
+class LayoutCache(db.Model):
+    __tablename__ = 'layout_cache'
+
+    key = db.Column(db.String, primary_key=True)  # sha1 сигнатуры: пропорции фото и параметры генерации
+    json_data = db.Column(JSON, nullable=False)  # JSON с данными layout
+    last_used = db.Column(db.Float, nullable=False, index=True)  # Время последнего обращения (для LRU)
+
+    def __repr__(self):
+        return f"<LayoutCache {self.key}>"
+
 class Page(db.Model):
     __tablename__ = 'pages'
 
@@ -76,4 +92,79 @@ class Page(db.Model):
     json_data = db.Column(JSON, nullable=False)  # JSON с данными сетки и содержимого
 
     def __repr__(self):
-        return f"<Page {self.id} for channel {self.channel_id}>"
\ No newline at end of file
+        return f"<Page {self.id} for channel {self.channel_id}>"
+
+class PageBlock(db.Model):
+    __tablename__ = 'page_blocks'
+    __table_args__ = (
+        db.Index('ix_page_blocks_post', 'channel_id', 'telegram_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    page_id = db.Column(db.Integer, nullable=False, index=True)  # ID страницы
+    channel_id = db.Column(db.String, nullable=False)  # ID канала поста в блоке
+    telegram_id = db.Column(db.Integer, nullable=False)  # ID телеграм сообщения в блоке
+    position = db.Column(db.Integer, nullable=False)  # Индекс блока в json_data.blocks страницы
+
+    def __repr__(self):
+        return f"<PageBlock page {self.page_id} #{self.position}: message {self.telegram_id} in channel {self.channel_id}>"
+
+class PageGridState(db.Model):
+    __tablename__ = 'page_grid_state'
+
+    channel_id = db.Column(db.String, primary_key=True)  # ID канала
+    placed_until = db.Column(db.Integer, nullable=False)  # Наибольший telegram_id, уже разложенный по страницам
+
+    def __repr__(self):
+        return f"<PageGridState {self.channel_id}: placed until {self.placed_until}>"
+
+class MediaVariant(db.Model):
+    __tablename__ = 'media_variants'
+    __table_args__ = (
+        db.Index('ix_media_variants_post', 'channel_id', 'telegram_id', 'width', 'format', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    channel_id = db.Column(db.String, nullable=False)  # ID канала
+    telegram_id = db.Column(db.Integer, nullable=False)  # ID телеграм сообщения с фото
+    width = db.Column(db.Integer, nullable=False)  # Ширина копии в пикселях
+    height = db.Column(db.Integer, nullable=False)  # Высота копии в пикселях
+    format = db.Column(db.String, nullable=False)  # 'avif', 'webp', 'jpeg'
+    path = db.Column(db.String, nullable=False)  # Путь относительно downloads
+    size = db.Column(db.Integer, nullable=False)  # Размер файла в байтах
+
+    def __repr__(self):
+        return f"<MediaVariant {self.width}w {self.format} for message {self.telegram_id} in channel {self.channel_id}>"
+
+class DownloadStatus(db.Model):
+    __tablename__ = 'download_statuses'
+
+    channel_id = db.Column(db.String, primary_key=True)  # ID канала
+    status = db.Column(db.String, nullable=False)  # 'downloading', 'stopped', 'completed', 'error'
+    details = db.Column(JSON, nullable=False, default=dict)  # Прогресс и сообщения загрузки
+    timestamp = db.Column(db.Float, nullable=False)  # Время последнего изменения статуса
+
+    def __repr__(self):
+        return f"<DownloadStatus {self.channel_id}: {self.status}>"
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String, primary_key=True)  # job_id (uuid hex)
+    kind = db.Column(db.String, nullable=False, index=True)  # Тип задачи: 'delete_channel', ...
+    key = db.Column(db.String, nullable=True)  # Ключ исключительности (id канала и т.п.)
+    status = db.Column(db.String, nullable=False)  # 'running', 'completed', 'error'
+    details = db.Column(JSON, nullable=False, default=dict)  # Параметры задачи
+    progress = db.Column(JSON, nullable=False, default=dict)  # Текущая стадия и счётчики
+    result = db.Column(JSON, nullable=True)  # Итог выполнения
+    error = db.Column(db.Text, nullable=True)  # Текст ошибки
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # Не больше одной выполняющейся задачи каждого типа на ключ; задачи без ключа не ограничены
+        db.Index('ux_jobs_running_key', 'kind', 'key', unique=True, sqlite_where=db.text("status = 'running'")),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id} ({self.kind}): {self.status}>"
@@ -1,6 +1,7 @@
 #!/bin/bash
 # Стартовый скрипт для контейнера.
 # Проверяет авторизацию в Telegram перед запуском Flask приложения.
+# SERVER_MODE=development запускает dev-сервер Werkzeug вместо gunicorn.
 
 echo "🔄 Инициализация приложения..."
 
@@ -9,8 +10,13 @@ python check_auth.py
 AUTH_STATUS=$?
 
 if [ $AUTH_STATUS -eq 0 ]; then
-    echo "✅ Авторизация успешна! Запуск Flask приложения..."
-    python app.py
+    if [ "${SERVER_MODE:-production}" = "development" ]; then
+        echo "✅ Авторизация успешна! Запуск Flask dev-сервера..."
+        python app.py
+    else
+        echo "✅ Авторизация успешна! Запуск gunicorn..."
+        exec gunicorn -c gunicorn.conf.py app:app
+    fi
 else
     echo "❌ Ошибка авторизации. Приложение остановлено."
     echo ""
@@ -13,7 +13,6 @@ from message_processing.message_transform import (
     process_message_for_api,
     get_channel_folder,
 )
-from utils.gallery_layout import generate_gallery_layout
 from utils.entity_validation import get_entity_by_username_or_id
 
 # Настройка логирования
@@ -514,77 +513,16 @@ def generate_gallery_layouts_for_channel(channel_username):
         # Работаем напрямую с базой
         from app import app
         with app.app_context():
-            from models import Post, Layout, db, Layout
-            
-            # Получаем все посты канала
-            posts = Post.query.filter_by(channel_id=channel_username).all()
-            logging.info(f"Found {len(posts)} posts in channel {channel_username}")
-            
-            # Группируем посты по grouped_id
-            galleries = {}
-            for post in posts:
-                grouped_id = post.grouped_id
-                if grouped_id and post.media_type == 'MessageMediaPhoto':
-                    if grouped_id not in galleries:
-                        galleries[grouped_id] = []
-                    galleries[grouped_id].append(post)
-
-            logging.info(f"Found galleries: {list(galleries.keys())}")
-            
-            for grouped_id, gallery_posts in galleries.items():
-                logging.info(f"Processing gallery {grouped_id} with {len(gallery_posts)} posts")
-                if len(gallery_posts) < 2:
-                    logging.info(f"Skipping gallery {grouped_id} - only {len(gallery_posts)} images")
-                    continue  # Пропускаем галереи с одним изображением
-
-                # Сохраняем пользовательские правки: если layout уже есть, не пересоздаём его
-                existing_layout = Layout.query.filter_by(grouped_id=grouped_id, channel_id=channel_username).first()
-                if existing_layout:
-                    logging.info(
-                        "Layout for gallery %s already exists for channel %s, skipping auto generation",
-                        grouped_id,
-                        channel_username,
-                    )
-                    continue
+            from utils.channel_layouts import generate_channel_layouts
 
-                # Сортируем посты по telegram_id для консистентного порядка
-                gallery_posts.sort(key=lambda p: p.telegram_id)
-
-                # Собираем пути к превью
-                image_paths = []
-                for post in gallery_posts:
-                    # Используем thumb_url из базы данных, если он есть
-                    thumb_url = post.thumb_url
-                    if thumb_url:
-                        thumb_path = os.path.join(DOWNLOADS_DIR, thumb_url.lstrip('/'))
-                        if os.path.exists(thumb_path):
-                            image_paths.append(thumb_path)
-                    else:
-                        # Fallback: старый способ для совместимости
-                        media_url = post.media_url
-                        if media_url:
-                            media_relative = media_url.lstrip('/')
-                            thumb_path = os.path.join(
-                                DOWNLOADS_DIR,
-                                media_relative.replace('/media/', '/thumbs/')
-                            )
-                            if os.path.exists(thumb_path):
-                                image_paths.append(thumb_path)
-
-                logging.info(f"Gallery {grouped_id}: collected {len(image_paths)} image paths from {len(gallery_posts)} posts")
-
-                if len(image_paths) >= 2:
-                    # Генерируем layout
-                    from utils.gallery_layout import generate_gallery_layout
-                    layout_data = generate_gallery_layout(image_paths)
-                    
-                    if layout_data:
-                        logging.info(f"Generated layout for gallery {grouped_id}: {len(layout_data.get('cells', []))} cells")
-                        # Сохраняем в базу данных
-                        new_layout = Layout(grouped_id=grouped_id, channel_id=channel_username, json_data=layout_data)
-                        db.session.add(new_layout)
-                        db.session.commit()
-                        print(f"Generated and saved layout for gallery {grouped_id}")
+            # Существующие layouts (с пользовательскими правками) не пересоздаются
+            result = generate_channel_layouts(channel_username, DOWNLOADS_DIR)
+            logging.info(
+                "Generated %s layouts for %s galleries in channel %s",
+                result['created'],
+                result['albums'],
+                channel_username,
+            )
 
     except Exception as e:
         print(f"Error generating gallery layouts: {e}")
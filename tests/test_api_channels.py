@@ -0,0 +1,179 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api import channels as channels_module
+from api.channels import channels_bp
+from api.jobs import jobs_bp
+from models import db, Channel, DownloadStatus, Edit, Job, Layout, Page, Post
+from utils.jobs import wait_job
+
+
+class DeleteChannelAPITests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        for name, value in (('DOWNLOADS_DIR', self.temp_dir), ('TRASH_DIR', os.path.join(self.temp_dir, '.trash'))):
+            patcher = mock.patch.object(channels_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.db_path = os.path.join(self.temp_dir, 'test.db')
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        # Файловая БД: фоновая задача работает в другом потоке со своим соединением
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.db_path}'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+        db.init_app(self.app)
+        self.app.register_blueprint(channels_bp, url_prefix='/api')
+        self.app.register_blueprint(jobs_bp, url_prefix='/api')
+
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='chan', name='Channel', discussion_group_id=777, changes={}))
+            db.session.add(Channel(id='777', name='Discussion', changes={}))
+            db.session.add(Channel(id='other', name='Other', changes={}))
+            for channel_id in ('chan', '777', 'other'):
+                db.session.add(Post(telegram_id=1, channel_id=channel_id, date='2024-01-01'))
+                db.session.add(Edit(telegram_id=1, channel_id=channel_id, date='2024-01-01', changes={}))
+                db.session.add(Page(channel_id=channel_id, json_data={'blocks': []}))
+                db.session.add(DownloadStatus(channel_id=channel_id, status='completed', details={}, timestamp=0))
+            db.session.add(Layout(grouped_id=1, channel_id='chan', json_data={'cells': []}))
+            db.session.add(Layout(grouped_id=2, channel_id='other', json_data={'cells': []}))
+            db.session.commit()
+
+        for folder in ('chan', 'channel_777', 'other'):
+            media_dir = os.path.join(self.temp_dir, folder, 'media')
+            os.makedirs(media_dir)
+            for i in range(3):
+                with open(os.path.join(media_dir, f'{i}_media.jpg'), 'wb') as f:
+                    f.write(b'data')
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+    def test_delete_channel_runs_in_background(self):
+        """Удаление канала возвращает job_id и удаляет все связанные данные"""
+        response = self.client.delete('/api/channels/chan')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        # Папки сразу убраны из downloads
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'chan')))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'channel_777')))
+
+        with self.app.app_context():
+            job = wait_job(job_id, timeout=10)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['result']['files_removed'], 6)
+        self.assertEqual(job['result']['deleted_rows']['posts'], 2)
+        self.assertEqual(job['progress']['stage'], 'done')
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, '.trash')), [])
+
+        with self.app.app_context():
+            for model in (Post, Edit, Page):
+                self.assertEqual([row.channel_id for row in model.query.all()], ['other'])
+            self.assertEqual([layout.channel_id for layout in Layout.query.all()], ['other'])
+            self.assertEqual([row.channel_id for row in DownloadStatus.query.all()], ['other'])
+            self.assertEqual([channel.id for channel in Channel.query.all()], ['other'])
+
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'other', 'media', '0_media.jpg')))
+
+        status = self.client.get(f'/api/jobs/{job_id}')
+        self.assertEqual(status.status_code, 200)
+        self.assertEqual(status.get_json()['kind'], 'delete_channel')
+
+    def test_delete_channel_sweeps_leftover_trash(self):
+        """Папки, оставшиеся в корзине после прерванного удаления, дочищает следующая задача"""
+        trash_dir = os.path.join(self.temp_dir, '.trash')
+        for name in ('old-1', 'busy-2'):
+            os.makedirs(os.path.join(trash_dir, name, 'media'))
+            with open(os.path.join(trash_dir, name, 'media', '0_media.jpg'), 'wb') as f:
+                f.write(b'data')
+        busy = os.path.join(trash_dir, 'busy-2')
+        with self.app.app_context():
+            # Папку busy-2 ещё очищает другая выполняющаяся задача
+            db.session.add(Job(id='busy', kind='delete_channel', status='running',
+                               details={'trash_paths': [busy]}, progress={}, created_at=0, updated_at=0))
+            db.session.commit()
+
+        response = self.client.delete('/api/channels/chan')
+        self.assertEqual(response.status_code, 202)
+        with self.app.app_context():
+            job = wait_job(response.get_json()['job_id'], timeout=10)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['result']['files_removed'], 7)
+        self.assertEqual(os.listdir(trash_dir), ['busy-2'])
+
+    def test_delete_channel_already_running(self):
+        """Повторное удаление канала, пока идёт первое, — 409 с job_id идущей задачи"""
+        with self.app.app_context():
+            db.session.add(Job(id='first', kind='delete_channel', key='chan', status='running',
+                               details={}, progress={}, created_at=0, updated_at=0))
+            db.session.commit()
+
+        response = self.client.delete('/api/channels/chan')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['job_id'], 'first')
+        # Папки канала не тронуты, вторая задача не запущена
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'chan')))
+        with self.app.app_context():
+            self.assertEqual(Job.query.count(), 1)
+
+    def test_delete_channel_not_found(self):
+        """Удаление несуществующего канала"""
+        response = self.client.delete('/api/channels/missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_html_renders_from_db(self):
+        """Экспорт HTML рендерится из БД без обращения к SSR"""
+        response = self.client.get('/api/channels/chan/export-html?paginate=none')
+        self.assertEqual(response.status_code, 200)
+
+        with open(os.path.join(self.temp_dir, 'chan', 'index.html'), encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn('<h1 class="text-3xl font-bold mb-4">Channel</h1>', html)
+        self.assertIn('data-post-id="1"', html)
+
+        self.assertEqual(self.client.get('/api/channels/missing/export-html').status_code, 404)
+
+    def test_export_html_paginated(self):
+        """По умолчанию экспорт разбит на страницы с оглавлением и поисковым индексом"""
+        response = self.client.get('/api/channels/chan/export-html')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['pages'], 1)
+
+        channel_dir = os.path.join(self.temp_dir, 'chan')
+        self.assertTrue(os.path.exists(os.path.join(channel_dir, 'page-0001.html')))
+        self.assertTrue(os.path.exists(os.path.join(channel_dir, 'search-index.json')))
+        with open(os.path.join(channel_dir, 'index.html'), encoding='utf-8') as f:
+            self.assertIn('href="page-0001.html"', f.read())
+
+        self.assertEqual(self.client.get('/api/channels/chan/export-html?paginate=week').status_code, 400)
+        self.assertEqual(self.client.get('/api/channels/chan/export-html?per_page=0').status_code, 400)
+
+    def test_job_not_found(self):
+        """Статус несуществующей задачи"""
+        response = self.client.get('/api/jobs/unknown')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
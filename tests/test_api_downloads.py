@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.downloads import downloads_bp
+from api.health import health_bp
+from models import db
+from utils.download_status import set_download_status, should_stop_download
+
+
+class DownloadsAPITests(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+        db.init_app(self.app)
+        self.app.register_blueprint(downloads_bp, url_prefix='/api')
+        self.app.register_blueprint(health_bp, url_prefix='/api')
+
+        with self.app.app_context():
+            db.create_all()
+            set_download_status('chan', 'downloading', {'channel_name': 'chan'})
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_get_download_statuses(self):
+        """Статусы загрузок читаются из БД"""
+        response = self.client.get('/api/download/status')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['chan']['status'], 'downloading')
+        self.assertEqual(data['chan']['details']['channel_name'], 'chan')
+
+    def test_update_progress(self):
+        """Прогресс дописывается в details"""
+        response = self.client.post('/api/download/progress/chan', json={
+            'posts_processed': 10,
+            'total_posts': 100,
+            'comments_processed': 3
+        })
+        self.assertEqual(response.status_code, 200)
+
+        status = self.client.get('/api/download/status/chan').get_json()
+        self.assertEqual(status['details']['posts_processed'], 10)
+        self.assertEqual(status['details']['total_posts'], 100)
+        self.assertEqual(status['details']['channel_name'], 'chan')
+
+    def test_stop_download(self):
+        """Остановка загрузки видна через should_stop_download"""
+        response = self.client.post('/api/download/stop/chan')
+        self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            self.assertTrue(should_stop_download('chan'))
+
+        response = self.client.post('/api/download/stop/chan')
+        self.assertEqual(response.status_code, 400)
+
+    def test_clear_download_status(self):
+        """Очистка статуса загрузки"""
+        self.assertEqual(self.client.post('/api/download/clear/chan').status_code, 200)
+        self.assertEqual(self.client.get('/api/download/status/chan').status_code, 404)
+        self.assertEqual(self.client.post('/api/download/cancel/chan').status_code, 404)
+
+    def test_liveness(self):
+        """Liveness всегда отвечает 200"""
+        response = self.client.get('/api/health/live')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], 'ok')
+
+    def test_readiness_checks_database(self):
+        """Readiness проверяет доступность БД"""
+        response = self.client.get('/api/health/ready')
+        self.assertEqual(response.get_json()['checks']['database'], 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -101,6 +101,80 @@ class TestEditsAPI(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertEqual(len(data['edits']), 0)
 
+    def test_get_all_edits_filtered_by_channel(self):
+        """Тест получения правок с фильтром channel_id"""
+        response = self.client.get('/api/edits?channel_id=test_channel_2')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(len(data['edits']), 1)
+        self.assertEqual(data['edits'][0]['telegram_id'], 200)
+
+    def test_get_all_edits_paginated(self):
+        """Тест пагинации правок через limit/offset"""
+        response = self.client.get('/api/edits?channel_id=test_channel_1&limit=1&offset=1')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(len(data['edits']), 1)
+        self.assertEqual(data['edits'][0]['telegram_id'], 101)
+
+    def test_get_all_edits_invalid_pagination(self):
+        """Тест некорректных параметров пагинации"""
+        response = self.client.get('/api/edits?limit=0')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_upsert_edits(self):
+        """Тест массового создания и обновления правок"""
+        payload = {
+            'channel_id': 'test_channel_1',
+            'edits': [
+                {'telegram_id': 100, 'changes': {'hidden': 'true'}},
+                {'telegram_id': 102, 'changes': {'hidden': 'true'}},
+                {'telegram_id': 200, 'channel_id': 'test_channel_2', 'changes': {'hidden': 'false'}},
+            ]
+        }
+        
+        response = self.client.post(
+            '/api/edits/bulk',
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['count'], 3)
+        
+        with self.app.app_context():
+            self.assertEqual(Edit.query.count(), 4)  # 3 исходных + 1 новая
+            edit = Edit.query.filter_by(telegram_id=100, channel_id='test_channel_1').one()
+            self.assertEqual(edit.changes, {'hidden': 'true'})
+            edit = Edit.query.filter_by(telegram_id=200, channel_id='test_channel_2').one()
+            self.assertEqual(edit.changes, {'hidden': 'false'})
+
+    def test_bulk_upsert_edits_missing_fields(self):
+        """Тест массовой правки без обязательных полей"""
+        response = self.client.post('/api/edits/bulk', json={'edits': [{'telegram_id': 1, 'changes': {}}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('channel_id', json.loads(response.data)['error'])
+
+        response = self.client.post('/api/edits/bulk', json={})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_upsert_edits_invalid_items(self):
+        """Элементы и тело запроса не-объекты дают 400, а не 500"""
+        for body in ({'channel_id': 'test_channel_1', 'edits': [1]},
+                     {'channel_id': 'test_channel_1', 'edits': [{'telegram_id': 1, 'changes': {}}, 'x']},
+                     [{'telegram_id': 1, 'changes': {}}]):
+            with self.subTest(body=body):
+                response = self.client.post('/api/edits/bulk', json=body)
+                self.assertEqual(response.status_code, 400)
+
     def test_delete_edits_for_channel(self):
         """Тест удаления правок для канала"""
         response = self.client.delete('/api/edits/test_channel_1')
@@ -35,8 +35,7 @@ class LayoutsAPITests(unittest.TestCase):
             db.session.remove()
             db.drop_all()
 
-    @mock.patch('api.layouts.generate_gallery_layout')
-    def test_get_layout_success(self, mock_generate):
+    def test_get_layout_success(self):
         """Тест успешного получения layout"""
         with self.app.app_context():
             # Создаем тестовый layout
@@ -68,9 +67,8 @@ class LayoutsAPITests(unittest.TestCase):
         data = response.get_json()
         self.assertIn('channel_id parameter is required', data['error'])
 
-    @mock.patch('api.layouts._resolve_image_path')
-    @mock.patch('api.layouts.generate_gallery_layout')
-    def test_reload_layout_success(self, mock_generate, mock_resolve):
+    @mock.patch('api.layouts.cached_gallery_layout')
+    def test_reload_layout_success(self, mock_generate):
         """Тест успешной перегенерации layout"""
         mock_generate.return_value = {
             'total_width': 150,
@@ -79,7 +77,6 @@ class LayoutsAPITests(unittest.TestCase):
             'cells': [{'image_index': 0, 'x': 0, 'y': 0, 'width': 50, 'height': 50}],
             'border_width': '5'
         }
-        mock_resolve.return_value = '/tmp/test_image.jpg'  # Mock path
 
         with self.app.app_context():
             # Создаем тестовые посты
@@ -89,7 +86,9 @@ class LayoutsAPITests(unittest.TestCase):
                 date='2023-01-01',
                 grouped_id='test_group_123',
                 media_type='MessageMediaPhoto',
-                media_url='/media/test1.jpg'
+                media_url='/media/test1.jpg',
+                media_width=800,
+                media_height=600
             )
             post2 = Post(
                 telegram_id=2,
@@ -97,7 +96,9 @@ class LayoutsAPITests(unittest.TestCase):
                 date='2023-01-01',
                 grouped_id='test_group_123',
                 media_type='MessageMediaPhoto',
-                media_url='/media/test2.jpg'
+                media_url='/media/test2.jpg',
+                media_width=800,
+                media_height=600
             )
             db.session.add(post1)
             db.session.add(post2)
@@ -114,16 +115,16 @@ class LayoutsAPITests(unittest.TestCase):
             data = response.get_json()
             self.assertIn('layout', data)
             self.assertEqual(data['layout']['border_width'], '5')
+            # Перегенерация не берёт раскладку из кэша
+            self.assertTrue(mock_generate.call_args.kwargs['refresh'])
 
             # Проверяем, что layout сохранен в БД
             layout = Layout.query.filter_by(grouped_id='test_group_123', channel_id='test_channel_456').first()
             self.assertIsNotNone(layout)
             self.assertEqual(layout.json_data['border_width'], '5')
 
-    @mock.patch('api.layouts._resolve_image_path')
-    def test_reload_layout_insufficient_images(self, mock_resolve):
+    def test_reload_layout_insufficient_images(self):
         """Тест перегенерации layout с недостаточным количеством изображений"""
-        mock_resolve.return_value = '/tmp/test_image.jpg'
 
         with self.app.app_context():
             # Создаем только один пост
@@ -133,7 +134,9 @@ class LayoutsAPITests(unittest.TestCase):
                 date='2023-01-01',
                 grouped_id='test_group_123',
                 media_type='MessageMediaPhoto',
-                media_url='/media/test1.jpg'
+                media_url='/media/test1.jpg',
+                media_width=800,
+                media_height=600
             )
             db.session.add(post)
             db.session.commit()
@@ -151,12 +154,10 @@ class LayoutsAPITests(unittest.TestCase):
         data = response.get_json()
         self.assertIn('channel_id parameter is required', data['error'])
 
-    @mock.patch('api.layouts._resolve_image_path')
-    @mock.patch('api.layouts.generate_gallery_layout')
-    def test_reload_layout_generation_failed(self, mock_generate, mock_resolve):
+    @mock.patch('api.layouts.cached_gallery_layout')
+    def test_reload_layout_generation_failed(self, mock_generate):
         """Тест перегенерации layout при неудачной генерации"""
         mock_generate.return_value = None
-        mock_resolve.return_value = '/tmp/test_image.jpg'
 
         with self.app.app_context():
             # Создаем тестовые посты
@@ -166,7 +167,9 @@ class LayoutsAPITests(unittest.TestCase):
                 date='2023-01-01',
                 grouped_id='test_group_123',
                 media_type='MessageMediaPhoto',
-                media_url='/media/test1.jpg'
+                media_url='/media/test1.jpg',
+                media_width=800,
+                media_height=600
             )
             post2 = Post(
                 telegram_id=2,
@@ -174,7 +177,9 @@ class LayoutsAPITests(unittest.TestCase):
                 date='2023-01-01',
                 grouped_id='test_group_123',
                 media_type='MessageMediaPhoto',
-                media_url='/media/test2.jpg'
+                media_url='/media/test2.jpg',
+                media_width=800,
+                media_height=600
             )
             db.session.add(post1)
             db.session.add(post2)
@@ -0,0 +1,143 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from urllib.parse import quote
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api import media as media_module
+from api.media import media_bp
+
+
+class MediaTestCase(unittest.TestCase):
+    """Временная папка downloads с медиафайлом и экспортированным HTML"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(media_module, 'DOWNLOADS_DIR', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        os.makedirs(os.path.join(self.temp_dir, 'chan', 'media'))
+        self.payload = bytes(range(256)) * 4
+        with open(os.path.join(self.temp_dir, 'chan', 'media', '1_media.mp4'), 'wb') as f:
+            f.write(self.payload)
+        with open(os.path.join(self.temp_dir, 'chan', 'index.html'), 'w') as f:
+            f.write('<html></html>')
+
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        self.app.register_blueprint(media_bp)
+        self.client = self.app.test_client()
+
+
+class MediaCachingTests(MediaTestCase):
+    def test_media_file_is_immutable(self):
+        """Медиа канала кешируется на год с immutable и валидаторами"""
+        response = self.client.get('/downloads/chan/media/1_media.mp4')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn(f'max-age={media_module.IMMUTABLE_MAX_AGE}', response.headers['Cache-Control'])
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        self.assertEqual(response.headers.get('Accept-Ranges'), 'bytes')
+        response.close()
+
+    def test_conditional_get_returns_not_modified(self):
+        """If-None-Match и If-Modified-Since дают 304"""
+        first = self.client.get('/downloads/chan/media/1_media.mp4')
+        etag = first.headers['ETag']
+        last_modified = first.headers['Last-Modified']
+        first.close()
+
+        response = self.client.get('/downloads/chan/media/1_media.mp4', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/downloads/chan/media/1_media.mp4', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_request_returns_partial_content(self):
+        """Range-запрос отдаёт только запрошенные байты"""
+        response = self.client.get('/downloads/chan/media/1_media.mp4', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, self.payload[100:200])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+        response.close()
+
+    def test_mutable_file_requires_revalidation(self):
+        """Перезаписываемые файлы (экспорт) не кешируются как immutable"""
+        response = self.client.get('/downloads/chan/index.html')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+        self.assertIsNotNone(response.headers.get('ETag'))
+        response.close()
+
+
+class MediaOffloadTests(MediaTestCase):
+    """Отдача файлов через фронт-прокси"""
+
+    def _offload(self, mode):
+        patcher = mock.patch.object(media_module, 'MEDIA_OFFLOAD', mode)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return {media_module.OFFLOAD_REQUEST_HEADER: '1'}
+
+    def test_x_accel_redirect(self):
+        """nginx получает internal-путь, тело ответа пустое"""
+        headers = self._offload('x-accel-redirect')
+        response = self.client.get('/downloads/chan/media/1_media.mp4', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/_protected/downloads/chan/media/1_media.mp4')
+        self.assertEqual(response.headers['Content-Type'], 'video/mp4')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.data, b'')
+
+    def test_x_accel_redirect_quotes_path(self):
+        """Кириллица и служебные символы URI в имени файла экранируются"""
+        name = 'Отчёт 100% ?#.pdf'
+        with open(os.path.join(self.temp_dir, 'chan', 'media', name), 'wb') as f:
+            f.write(b'pdf')
+        headers = self._offload('x-accel-redirect')
+        response = self.client.get('/downloads/chan/media/' + quote(name), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         '/_protected/downloads/chan/media/' + quote(name))
+        self.assertNotIn('?', response.headers['X-Accel-Redirect'])
+
+    def test_x_sendfile(self):
+        """Apache/lighttpd получают абсолютный путь к файлу"""
+        headers = self._offload('x-sendfile')
+        response = self.client.get('/downloads/chan/index.html', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Sendfile'], os.path.join(self.temp_dir, 'chan', 'index.html'))
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertEqual(response.data, b'')
+
+    def test_offload_rejects_missing_and_traversal(self):
+        """Путь проверяется до передачи прокси"""
+        headers = self._offload('x-accel-redirect')
+        self.assertEqual(self.client.get('/downloads/chan/media/missing.jpg', headers=headers).status_code, 404)
+        self.assertEqual(self.client.get('/downloads/../etc/passwd', headers=headers).status_code, 404)
+
+    def test_offload_requires_proxy_header(self):
+        """Без заголовка прокси файл отдаёт Flask (прямые запросы SSR/WeasyPrint)"""
+        self._offload('x-accel-redirect')
+        response = self.client.get('/downloads/chan/media/1_media.mp4')
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+        self.assertEqual(response.data, self.payload)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
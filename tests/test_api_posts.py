@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.posts import posts_bp
+from api.edits import edits_bp
+from models import db, Channel, Edit, Post
+
+
+class PostsAPITests(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+        db.init_app(self.app)
+        self.app.register_blueprint(posts_bp, url_prefix='/api')
+        self.app.register_blueprint(edits_bp)
+
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='chan', name='Channel', discussion_group_id=777, changes={}))
+            for telegram_id in (1, 2, 3):
+                db.session.add(Post(
+                    telegram_id=telegram_id,
+                    channel_id='chan',
+                    date='2024-01-01',
+                    message=f'original {telegram_id}',
+                    reactions={'total_count': 5, 'recent_reactions': []}
+                ))
+            db.session.add(Post(telegram_id=10, channel_id='777', date='2024-01-02', message='comment', reply_to=1))
+            db.session.add(Edit(telegram_id=1, channel_id='chan', date='2024-02-01T10:00:00',
+                                changes={'message': 'edited 1', 'reactions': {'total_count': 0, 'recent_reactions': []}}))
+            db.session.add(Edit(telegram_id=2, channel_id='chan', date='2024-02-01T11:00:00',
+                                changes={'hidden': 'true'}))
+            db.session.add(Edit(telegram_id=10, channel_id='777', date='2024-02-01T12:00:00',
+                                changes={'hidden': True}))
+            db.session.commit()
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_get_posts_without_edits_returns_raw_posts(self):
+        """Без apply_edits посты возвращаются как есть, включая комментарии"""
+        response = self.client.get('/api/posts?channel_id=chan')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([p['telegram_id'] for p in data], [1, 2, 3, 10])
+        self.assertEqual(data[0]['message'], 'original 1')
+        self.assertNotIn('hidden', data[0])
+
+    def test_get_posts_apply_edits_merges_changes(self):
+        """apply_edits накладывает message, reactions и hidden"""
+        response = self.client.get('/api/posts?channel_id=chan&apply_edits=1')
+        self.assertEqual(response.status_code, 200)
+        posts = {p['telegram_id']: p for p in response.get_json()}
+
+        self.assertEqual(posts[1]['message'], 'edited 1')
+        self.assertEqual(posts[1]['reactions']['total_count'], 0)
+        self.assertFalse(posts[1]['hidden'])
+        self.assertTrue(posts[2]['hidden'])
+        self.assertEqual(posts[3]['message'], 'original 3')
+        self.assertFalse(posts[3]['hidden'])
+        self.assertTrue(posts[10]['hidden'])
+
+    def test_get_posts_excludes_hidden_in_sql(self):
+        """include_hidden=0 отсекает скрытые посты (строка 'true' и JSON true)"""
+        response = self.client.get('/api/posts?channel_id=chan&apply_edits=1&include_hidden=0')
+        self.assertEqual(response.status_code, 200)
+        ids = [p['telegram_id'] for p in response.get_json()]
+        self.assertEqual(ids, [1, 3])
+
+    def test_get_posts_etag_not_modified(self):
+        """Повторный запрос с If-None-Match возвращает 304"""
+        first = self.client.get('/api/posts?channel_id=chan&apply_edits=1')
+        etag = first.headers.get('ETag')
+        self.assertIsNotNone(etag)
+
+        second = self.client.get('/api/posts?channel_id=chan&apply_edits=1', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+
+    def test_get_posts_etag_changes_after_edit(self):
+        """ETag меняется при правке поста канала"""
+        etag_before = self.client.get('/api/posts?channel_id=chan&apply_edits=1').headers.get('ETag')
+
+        self.client.post('/api/edits', json={
+            'telegram_id': 3,
+            'channel_id': 'chan',
+            'changes': {'message': 'edited 3'}
+        })
+
+        response = self.client.get('/api/posts?channel_id=chan&apply_edits=1', headers={'If-None-Match': etag_before})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('ETag'), etag_before)
+        posts = {p['telegram_id']: p for p in response.get_json()}
+        self.assertEqual(posts[3]['message'], 'edited 3')
+
+    def test_get_posts_etag_changes_after_edits_deleted(self):
+        """ETag меняется при удалении правок канала"""
+        etag_before = self.client.get('/api/posts?channel_id=chan&apply_edits=1').headers.get('ETag')
+        self.client.delete('/api/edits/chan')
+        etag_after = self.client.get('/api/posts?channel_id=chan&apply_edits=1').headers.get('ETag')
+        self.assertNotEqual(etag_before, etag_after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from PIL import Image
+
+from api import layouts as layouts_module
+from api.jobs import jobs_bp
+from api.layouts import layouts_bp
+from models import db, Channel, Job, Layout, Post
+from utils.channel_layouts import RELOAD_JOB_KIND, generate_channel_layouts, load_albums
+from utils.gallery_layout import generate_gallery_layout_from_sizes
+from utils.jobs import interrupt_running_jobs, wait_job
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def album_posts(channel_id, grouped_id, sizes, first_id):
+    return [{
+        'telegram_id': first_id + index, 'channel_id': channel_id, 'date': '2024-01-01', 'message': '',
+        'grouped_id': grouped_id, 'media_type': 'MessageMediaPhoto',
+        'media_url': f'{channel_id}/media/{first_id + index}.jpg',
+        'media_width': width, 'media_height': height
+    } for index, (width, height) in enumerate(sizes)]
+
+
+class ChannelLayoutsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.app = make_app(os.path.join(self.temp_dir, 'test.db'))
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+        rows = album_posts('chan', 1, [(800, 600), (600, 800)], 10)
+        rows += album_posts('chan', 2, [(1000, 500)] * 3, 20)
+        rows += album_posts('chan', 3, [(800, 600)], 30)  # Одно фото — layout не нужен
+        rows += album_posts('chan', 4, [(800, 600), (800, 600)], 40)  # Layout уже есть
+        rows += album_posts('other', 5, [(800, 600), (800, 600)], 50)  # Другой канал
+        # Пост старого импорта без размеров: размер читается из файла один раз
+        rows += album_posts('chan', 6, [(640, 480), (None, None)], 60)
+        os.makedirs(os.path.join(self.temp_dir, 'chan', 'media'))
+        Image.new('RGB', (300, 200)).save(os.path.join(self.temp_dir, 'chan', 'media', '61.jpg'))
+        db.session.bulk_insert_mappings(Post, rows)
+        db.session.add(Layout(grouped_id=4, channel_id='chan', json_data={'edited': True}))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+
+    def test_load_albums(self):
+        """Альбомы канала читаются с размерами из БД, без готовых layouts и одиночных фото"""
+        albums = load_albums('chan', self.temp_dir)
+        self.assertEqual(albums, [
+            (1, [(800, 600), (600, 800)]),
+            (2, [(1000, 500)] * 3),
+            (6, [(640, 480), (300, 200)])
+        ])
+        # Размер старого поста сохранён в БД
+        post = Post.query.filter_by(telegram_id=61).one()
+        self.assertEqual((post.media_width, post.media_height), (300, 200))
+
+    def test_generate_channel_layouts(self):
+        """Недостающие layouts создаются одной вставкой, существующие не меняются"""
+        for workers, batch_size in ((1, None), (2, 1)):
+            with self.subTest(workers=workers):
+                Layout.query.filter(Layout.grouped_id != 4).delete()
+                db.session.commit()
+
+                result = generate_channel_layouts('chan', self.temp_dir, workers=workers, batch_size=batch_size)
+
+                self.assertEqual((result['albums'], result['created'], result['failed']), (3, 3, 0))
+                self.assertEqual(set(result['timings']), {'load', 'generate', 'save'})
+                layouts = {layout.grouped_id: layout for layout in Layout.query.all()}
+                self.assertEqual(sorted(layouts), [1, 2, 4, 6])
+                self.assertEqual(layouts[4].json_data, {'edited': True})
+                self.assertEqual(layouts[2].json_data['image_count'], 3)
+                self.assertTrue(all(layouts[gid].channel_id == 'chan' for gid in layouts))
+
+        # Повторный запуск ничего не делает
+        self.assertEqual(generate_channel_layouts('chan', self.temp_dir, workers=1)['albums'], 0)
+
+
+class ReloadChannelLayoutsTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(layouts_module, 'DOWNLOADS_DIR', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Файловая БД: фоновая задача работает в другом потоке со своим соединением
+        self.app = make_app(os.path.join(self.temp_dir, 'test.db'))
+        self.app.config['TESTING'] = True
+        self.app.register_blueprint(layouts_bp, url_prefix='/api')
+        self.app.register_blueprint(jobs_bp, url_prefix='/api')
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='chan', name='Channel'))
+            rows = album_posts('chan', 1, [(800, 600), (600, 800)], 10)
+            rows += album_posts('chan', 2, [(1000, 500)] * 5, 20)
+            rows += album_posts('chan', 3, [(800, 600)] * 3, 30)
+            db.session.bulk_insert_mappings(Post, rows)
+            db.session.add(Layout(grouped_id=1, channel_id='chan', json_data={'edited': True, 'border_width': '4'}))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def reload(self, **payload):
+        response = self.client.post('/api/layouts/reload?channel_id=chan', json=payload)
+        self.assertEqual(response.status_code, 202, response.get_json())
+        with self.app.app_context():
+            job = wait_job(response.get_json()['job_id'], timeout=30)
+        self.assertEqual(job['status'], 'completed', job['error'])
+        return job
+
+    def layouts(self):
+        with self.app.app_context():
+            return {layout.grouped_id: layout.json_data for layout in Layout.query.all()}
+
+    def test_reload_all_albums(self):
+        """Все альбомы канала перегенерируются с новыми параметрами, рамка прежнего layout сохраняется"""
+        job = self.reload(columns=1)
+        self.assertEqual(job['result'], {'albums': 3, 'updated': 3, 'failed': 0, 'cached': 0})
+        self.assertEqual(job['progress']['stage'], 'done')
+        self.assertEqual(job['progress']['shapes_total'], 3)
+
+        layouts = self.layouts()
+        self.assertEqual(sorted(layouts), [1, 2, 3])
+        self.assertNotIn('edited', layouts[1])
+        self.assertEqual(layouts[1]['border_width'], '4')
+        self.assertNotIn('border_width', layouts[2])
+        self.assertTrue(all(cell['x'] == 0 for cell in layouts[2]['cells']))
+
+    def test_reload_filters(self):
+        """Фильтры ограничивают набор альбомов; border_width задаёт рамку всем"""
+        job = self.reload(min_images=3, border_width=2)
+        self.assertEqual((job['result']['albums'], job['result']['updated']), (2, 2))
+        layouts = self.layouts()
+        self.assertEqual(layouts[1], {'edited': True, 'border_width': '4'})
+        self.assertEqual((layouts[2]['border_width'], layouts[3]['border_width']), ('2', '2'))
+
+        job = self.reload(grouped_ids=['3'], columns=1)
+        self.assertEqual(job['result']['albums'], 1)
+
+        job = self.reload(only_missing=True)
+        self.assertEqual(job['result']['albums'], 0)
+
+    def test_validation(self):
+        self.assertEqual(self.client.post('/api/layouts/reload', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/layouts/reload?channel_id=chan',
+                                          json={'engine': 'unknown'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/layouts/reload?channel_id=chan',
+                                          json={'grouped_ids': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/layouts/reload?channel_id=missing').status_code, 404)
+
+    def test_running_job(self):
+        """Вторая перегенерация канала не запускается, пока идёт первая; после перезапуска — запускается"""
+        with self.app.app_context():
+            now = time.time()
+            db.session.add(Job(id='job1', kind=RELOAD_JOB_KIND, key='chan', status='running',
+                               details={'channel_id': 'chan'}, progress={}, created_at=now, updated_at=now))
+            db.session.commit()
+        response = self.client.post('/api/layouts/reload?channel_id=chan')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['job_id'], 'job1')
+
+        # Поток job1 не пережил перезапуск: init_db помечает её прерванной
+        with self.app.app_context():
+            interrupt_running_jobs()
+        self.reload()
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'RUN_BENCHMARKS=1 для запуска бенчмарков')
+class ChannelLayoutsBenchmark(unittest.TestCase):
+    """
+    Layouts для BENCHMARK_ALBUMS альбомов (по умолчанию 10k) пакетной генерацией
+    против прежней схемы — проверка существования layout и commit на каждый
+    альбом. Прежняя схема слишком медленная для 10k, поэтому она замеряется на
+    BENCHMARK_SERIAL_ALBUMS альбомах (по умолчанию 500) и сравнивается по
+    времени на альбом.
+    """
+
+    def test_generate_large_channel(self):
+        count = int(os.environ.get('BENCHMARK_ALBUMS', '10000'))
+        serial_count = min(count, int(os.environ.get('BENCHMARK_SERIAL_ALBUMS', '500')))
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        app = make_app(os.path.join(temp_dir, 'bench.db'))
+        rng = random.Random(1)
+        with app.app_context():
+            db.create_all()
+            rows = []
+            for channel_id, albums, first in (('batched', count, 0), ('serial', serial_count, count)):
+                for album in range(first, first + albums):
+                    sizes = [(rng.choice((800, 1280, 600)), rng.choice((600, 960, 800)))
+                             for _ in range(rng.randint(2, 10))]
+                    rows += album_posts(channel_id, album, sizes, album * 10)
+            db.session.bulk_insert_mappings(Post, rows)
+            db.session.commit()
+
+            started = time.perf_counter()
+            result = generate_channel_layouts('batched', temp_dir)
+            batched = time.perf_counter() - started
+
+            started = time.perf_counter()
+            posts = Post.query.filter_by(channel_id='serial').all()
+            galleries = {}
+            for post in posts:
+                galleries.setdefault(post.grouped_id, []).append(post)
+            for grouped_id, gallery_posts in galleries.items():
+                if Layout.query.filter_by(grouped_id=grouped_id, channel_id='serial').first():
+                    continue
+                gallery_posts.sort(key=lambda p: p.telegram_id)
+                layout = generate_gallery_layout_from_sizes([(p.media_width, p.media_height) for p in gallery_posts])
+                if layout:
+                    db.session.add(Layout(grouped_id=grouped_id, channel_id='serial', json_data=layout))
+                    db.session.commit()
+            serial = time.perf_counter() - started
+            db.session.remove()
+            db.engine.dispose()
+
+        print(f"\n{count} альбомов пакетно: {batched:.2f}s {result['timings']}; "
+              f"по одному: {serial:.2f}s на {serial_count} альбомов "
+              f"(~{serial / serial_count * count:.0f}s на {count})")
+        # photocollage изредка не раскладывает альбом — такие считаются в failed
+        self.assertEqual(result['created'] + result['failed'], count)
+        self.assertGreater(result['created'], count * 0.95)
+        self.assertLess(batched / count, serial / serial_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
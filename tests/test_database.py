@@ -0,0 +1,26 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from database import DEFAULT_DATABASE_URI, create_app
+
+
+class CreateAppTests(unittest.TestCase):
+    def test_database_uri_from_env(self):
+        with mock.patch.dict(os.environ, {'SQLALCHEMY_DATABASE_URI': 'sqlite:////tmp/other.db'}):
+            self.assertEqual(create_app().config['SQLALCHEMY_DATABASE_URI'], 'sqlite:////tmp/other.db')
+
+    def test_blank_database_uri_uses_default(self):
+        """Пустая переменная из .env не ломает create_app, а даёт базу по умолчанию"""
+        with mock.patch.dict(os.environ, {'SQLALCHEMY_DATABASE_URI': ''}):
+            self.assertEqual(create_app().config['SQLALCHEMY_DATABASE_URI'], DEFAULT_DATABASE_URI)
+        with mock.patch.dict(os.environ):
+            os.environ.pop('SQLALCHEMY_DATABASE_URI', None)
+            self.assertEqual(create_app().config['SQLALCHEMY_DATABASE_URI'], DEFAULT_DATABASE_URI)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import copy
 import os
+import random
 import tempfile
+import time
 import unittest
 from unittest import mock
 from PIL import Image
@@ -7,7 +10,12 @@ import sys
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from utils.gallery_layout import generate_gallery_layout
+from types import SimpleNamespace
+
+from utils.gallery_layout import (
+    _normalize_layout, generate_gallery_layout, generate_gallery_layout_from_sizes, post_image_sizes
+)
+from utils.justified_layout import justified_layout
 
 
 class GalleryLayoutTests(unittest.TestCase):
@@ -24,9 +32,8 @@ class GalleryLayoutTests(unittest.TestCase):
 
     def tearDown(self):
         # Удаляем тестовые файлы
-        for path in self.image_paths:
-            if os.path.exists(path):
-                os.remove(path)
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
         # Удаляем директорию
         if os.path.exists(self.temp_dir):
             os.rmdir(self.temp_dir)
@@ -86,6 +93,137 @@ class GalleryLayoutTests(unittest.TestCase):
         result = generate_gallery_layout(self.image_paths, columns=None)
         self.assertIsNotNone(result)
 
+    def test_generate_layout_reads_sizes_from_files(self):
+        """Layout по файлам строится по размерам из их заголовков"""
+        Image.new('RGB', (300, 150)).save(self.image_paths[1])
+        with mock.patch('utils.gallery_layout.generate_gallery_layout_from_sizes', return_value={}) as from_sizes:
+            generate_gallery_layout(self.image_paths, columns=2, no_crop=True)
+        from_sizes.assert_called_once_with([(100, 100), (300, 150), (100, 100)], 100, 10, 2, True, None)
+
+        result = generate_gallery_layout_from_sizes([(100, 100), (300, 150), (100, 100)], columns=1)
+        self.assertEqual([cell['height'] for cell in result['cells']], [100.0, 50.0, 100.0])
+
+    def test_generate_layout_from_sizes_unknown_size(self):
+        """Нулевой или неизвестный размер не даёт layout"""
+        self.assertIsNone(generate_gallery_layout_from_sizes([(100, 100), (0, 50)]))
+        self.assertIsNone(generate_gallery_layout_from_sizes([(100, 100), (None, None)]))
+
+    def test_generate_layout_engine(self):
+        """Движок выбирается на вызов: по умолчанию photocollage, auto берёт justified для небольших альбомов"""
+        sizes = [(100, 100), (300, 150), (100, 100)]
+        # photocollage выбирает колонки через random: сравниваем раскладки при одном зерне
+        random.seed(43)
+        with mock.patch('utils.justified_layout.justified_layout', wraps=justified_layout) as justified:
+            default = generate_gallery_layout_from_sizes(sizes)
+            auto = generate_gallery_layout_from_sizes(sizes, engine='auto')
+        justified.assert_called_once_with(sizes, 100, None)
+        random.seed(43)
+        self.assertEqual(default, generate_gallery_layout_from_sizes(sizes, engine='photocollage'))
+        self.assertEqual(auto, generate_gallery_layout_from_sizes(sizes, engine='justified'))
+        with self.assertRaises(ValueError):
+            generate_gallery_layout_from_sizes(sizes, engine='unknown')
+
+    def test_post_image_sizes(self):
+        """Размеры берутся из поста; старые посты дозаполняются по оригиналу, превью в БД не пишется"""
+        Image.new('RGB', (40, 20)).save(os.path.join(self.temp_dir, 'thumb.jpg'))
+        stored = SimpleNamespace(media_width=1280, media_height=960, media_url='missing.jpg', thumb_url=None)
+        legacy = SimpleNamespace(media_width=None, media_height=None, media_url='test_image_0.jpg', thumb_url=None)
+        thumb_only = SimpleNamespace(media_width=None, media_height=None, media_url='gone.jpg', thumb_url='thumb.jpg')
+        no_file = SimpleNamespace(media_width=None, media_height=None, media_url='gone.jpg', thumb_url=None)
+
+        with mock.patch('PIL.Image.open', wraps=Image.open) as open_mock:
+            result = post_image_sizes([stored, legacy, thumb_only, no_file], self.temp_dir)
+
+        self.assertEqual(result, [(stored, (1280, 960)), (legacy, (100, 100)), (thumb_only, (40, 20))])
+        self.assertEqual(open_mock.call_count, 2)  # У stored файл не открывается
+        self.assertEqual((legacy.media_width, legacy.media_height), (100, 100))
+        self.assertIsNone(thumb_only.media_width)
+
+
+
+def linear_normalize_layout(layout_data, precision=6):
+    """Прежняя нормализация с линейным поиском ближайшей границы — эталон для сравнения"""
+    scale = 10 ** precision
+    cells = layout_data['cells']
+    for start_key, size_key, total_key in (('x', 'width', 'total_width'), ('y', 'height', 'total_height')):
+        edges = {0, int(round(layout_data[total_key] * scale))}
+        for cell in cells:
+            edges.add(int(round(cell[start_key] * scale)))
+            edges.add(int(round((cell[start_key] + cell[size_key]) * scale)))
+        sorted_edges = sorted(edges)
+
+        def snap_int(value):
+            raw = int(round(value * scale))
+            return min(sorted_edges, key=lambda edge: abs(edge - raw))
+
+        for cell in cells:
+            start_int = snap_int(cell[start_key])
+            end_int = snap_int(cell[start_key] + cell[size_key])
+            if end_int < start_int:
+                start_int, end_int = end_int, start_int
+            cell[start_key] = round(start_int / scale, precision)
+            cell[size_key] = round(max((end_int - start_int) / scale, 0.0), precision)
+    for key in ('total_width', 'total_height'):
+        layout_data[key] = round(int(round(layout_data[key] * scale)) / scale, precision)
+
+
+def random_layout(rng, count):
+    """Сетка с шумом в координатах, чтобы границы ячеек не совпадали точно"""
+    columns = max(1, int(count ** 0.5))
+    size = 100 / columns
+    cells = [{
+        'image_index': index,
+        'x': (index % columns) * size + rng.uniform(-1e-7, 1e-7),
+        'y': (index // columns) * size + rng.uniform(-1e-7, 1e-7),
+        'width': size + rng.uniform(-1e-7, 1e-7),
+        'height': size + rng.uniform(-1e-7, 1e-7)
+    } for index in range(count)]
+    return {'total_width': 100, 'total_height': -(-count // columns) * size, 'image_count': count, 'cells': cells}
+
+
+class NormalizeLayoutTests(unittest.TestCase):
+    def test_matches_linear_snapping(self):
+        """Бинарный поиск границ даёт тот же результат, что и линейный"""
+        rng = random.Random(7)
+        for count in (2, 3, 10, 57, 300):
+            for precision in (0, 2, 6):
+                layout = random_layout(rng, count)
+                expected = copy.deepcopy(layout)
+                linear_normalize_layout(expected, precision)
+                _normalize_layout(layout, precision)
+                self.assertEqual(layout, expected)
+
+    def test_neighbours_touch(self):
+        """После нормализации соседние ячейки стыкуются без зазоров"""
+        layout = random_layout(random.Random(1), 9)
+        _normalize_layout(layout)
+        xs = sorted({cell['x'] for cell in layout['cells']})
+        self.assertEqual(xs, [0.0, 33.333333, 66.666667])
+        for cell in layout['cells']:
+            self.assertIn(round(cell['x'] + cell['width'], 6), xs + [100.0])
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'RUN_BENCHMARKS=1 для запуска бенчмарков')
+class NormalizeLayoutBenchmark(unittest.TestCase):
+    def measure(self, normalize, layouts):
+        layouts = copy.deepcopy(layouts)
+        started = time.perf_counter()
+        for layout in layouts:
+            normalize(layout)
+        return time.perf_counter() - started
+
+    def test_large_album_and_bulk(self):
+        rng = random.Random(1)
+        cases = {
+            'альбом из 1000 ячеек': [random_layout(rng, 1000)],
+            '5000 альбомов по 2-10 фото': [random_layout(rng, rng.randint(2, 10)) for _ in range(5000)]
+        }
+        for name, layouts in cases.items():
+            linear = self.measure(linear_normalize_layout, layouts)
+            snapped = self.measure(_normalize_layout, layouts)
+            print(f"\n{name}: линейно {linear:.3f}s, bisect {snapped:.3f}s")
+            self.assertLess(snapped, linear)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,328 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from models import db, Channel, Edit, Layout, Post
+from utils import html_export
+from utils.html_export import export_channel_pages, iter_wall_items, render_channel_html
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+class HtmlExportTests(unittest.TestCase):
+    def setUp(self):
+        self.app = make_app()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        db.session.add(Channel(id='chan', name='My Channel', discussion_group_id=777,
+                               subscribers='12500', changes={'sortOrder': 'asc'}))
+        posts = [
+            Post(telegram_id=1, channel_id='chan', date='2024-01-01T10:00:00', message='<b>Первый</b>',
+                 author_name='Автор', author_avatar='chan/avatars/a.jpg',
+                 reactions={'recent_reactions': [{'reaction': "ReactionEmoji(emoticon='👍')", 'count': 3}]}),
+            Post(telegram_id=2, channel_id='chan', date='2024-01-02T10:00:00', message='Скрытый', author_name='Автор'),
+            Post(telegram_id=4, channel_id='chan', date='2024-01-03T10:00:00', message='', author_name='Автор',
+                 grouped_id=99, media_url='chan/media/4.jpg', thumb_url='chan/thumbs/4.jpg',
+                 media_type='MessageMediaPhoto'),
+            Post(telegram_id=3, channel_id='chan', date='2024-01-03T10:00:00', message='Альбом', author_name='Автор',
+                 grouped_id=99, media_url='chan/media/3.jpg', thumb_url='chan/thumbs/3.jpg',
+                 media_type='MessageMediaPhoto'),
+            Post(telegram_id=5, channel_id='chan', date='2024-01-04T10:00:00', message='Ответ <i>x</i>',
+                 author_name='Автор', reply_to=1),
+            Post(telegram_id=50, channel_id='777', date='2024-01-01T11:00:00', message='Комментарий',
+                 author_name='Читатель', reply_to=1),
+            Post(telegram_id=51, channel_id='777', date='2024-01-03T11:00:00', message='К альбому',
+                 author_name='Читатель', reply_to=3),
+        ]
+        db.session.add_all(posts)
+        db.session.add(Edit(telegram_id=2, channel_id='chan', date='2024-02-01', changes={'hidden': 'true'}))
+        db.session.add(Edit(telegram_id=5, channel_id='chan', date='2024-02-01', changes={'message': 'Исправлено'}))
+        db.session.add(Layout(grouped_id=99, channel_id='chan', json_data={
+            'total_width': 100, 'total_height': 50, 'border_width': '2',
+            'cells': [
+                {'x': 0, 'y': 0, 'width': 50, 'height': 50, 'image_index': 0},
+                {'x': 50, 'y': 0, 'width': 50, 'height': 50, 'image_index': 1}
+            ]
+        }))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def render(self, mode='html'):
+        output = io.StringIO()
+        render_channel_html(db.session.get(Channel, 'chan'), output, mode=mode)
+        return output.getvalue()
+
+    def test_wall_items_order_grouping_and_comments(self):
+        """Лента собирает альбомы, комментарии и цитаты как Wall.vue"""
+        items = list(iter_wall_items(db.session.get(Channel, 'chan')))
+
+        self.assertEqual([item['type'] for item in items], ['post', 'post', 'group', 'post'])
+        self.assertTrue(items[1]['hidden'])
+
+        album = items[2]
+        self.assertEqual([view['telegram_id'] for view in album['posts']], [3, 4])
+        self.assertEqual(album['first']['message'], 'Альбом')
+        self.assertEqual(album['layout']['border_width'], '2')
+        self.assertEqual([c['post']['telegram_id'] for c in album['comments']], [51])
+
+        self.assertEqual([c['post']['telegram_id'] for c in items[0]['comments']], [50])
+        self.assertEqual(items[3]['post']['message'], 'Исправлено')
+        self.assertEqual(items[3]['original']['telegram_id'], 1)
+
+    def test_render_html(self):
+        """HTML содержит обложку, посты с правками и относительные пути к медиа"""
+        html = self.render()
+
+        self.assertIn('<link rel="stylesheet" href="./styles.css" />', html)
+        self.assertIn('name="viewport"', html)
+        self.assertIn('<h1 class="text-3xl font-bold mb-4">My Channel</h1>', html)
+        self.assertIn('12.5K', html)
+        self.assertIn('<span class="font-mono text-secondary">3</span> <span class="font-semibold">поста</span>', html)
+        self.assertIn('<span class="font-semibold">комментария</span>', html)
+
+        self.assertIn('<b>Первый</b>', html)
+        self.assertIn('1 января 2024 10:00', html)
+        self.assertIn('<span>👍</span> <span>3</span>', html)
+        self.assertNotIn('Скрытый', html)
+        self.assertIn('Исправлено', html)
+        self.assertIn('src="../chan/thumbs/3.jpg"', html)
+        self.assertIn('href="../chan/media/3.jpg"', html)
+        self.assertIn('border-2', html)
+        self.assertIn('src="../chan/avatars/a.jpg"', html)
+        self.assertNotIn('<script', html)
+
+        # Комментарии идут сразу за своим постом
+        self.assertLess(html.index('<b>Первый</b>'), html.index('Комментарий'))
+        self.assertLess(html.index('Комментарий'), html.index('Альбом'))
+
+    def test_render_pdf(self):
+        """Режим PDF подключает styles-pdf.css"""
+        html = self.render(mode='pdf')
+        self.assertIn('href="./styles-pdf.css"', html)
+        self.assertNotIn('name="viewport"', html)
+
+    def test_escapes_untrusted_fields(self):
+        """Имена и ссылки экранируются, HTML сообщения выводится как есть"""
+        db.session.add(Post(telegram_id=6, channel_id='chan', date='2024-01-05T10:00:00',
+                            message='<i>ok</i>', author_name='<script>alert(1)</script>'))
+        db.session.commit()
+        html = self.render()
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt;', html)
+        self.assertIn('<i>ok</i>', html)
+
+    def test_batches_do_not_split_comments(self):
+        """Порции запросов не влияют на результат"""
+        full = self.render()
+        original = html_export.BATCH_SIZE
+        html_export.BATCH_SIZE = 1
+        try:
+            self.assertEqual(self.render(), full)
+        finally:
+            html_export.BATCH_SIZE = original
+
+    def export_pages(self, **kwargs):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        pages = export_channel_pages(db.session.get(Channel, 'chan'), output_dir, **kwargs)
+        return output_dir, pages
+
+    def read(self, *path):
+        with open(os.path.join(*path), encoding='utf-8') as f:
+            return f.read()
+
+    def test_paginated_by_count(self):
+        """Постраничный экспорт: страницы по N элементов, навигация и оглавление"""
+        output_dir, pages = self.export_pages(per_page=2)
+
+        # Скрытый пост не занимает место на странице: 3 видимых элемента -> 2 страницы
+        self.assertEqual([page['file'] for page in pages], ['page-0001.html', 'page-0002.html'])
+        self.assertEqual([page['count'] for page in pages], [2, 1])
+
+        first = self.read(output_dir, 'page-0001.html')
+        second = self.read(output_dir, 'page-0002.html')
+        self.assertIn('<b>Первый</b>', first)
+        self.assertIn('Комментарий', first)
+        self.assertIn('Альбом', first)
+        self.assertIn('Исправлено', second)
+        self.assertIn('href="page-0002.html" class="link" rel="next"', first)
+        self.assertNotIn('rel="prev"', first)
+        self.assertIn('href="page-0001.html" class="link" rel="prev"', second)
+        self.assertNotIn('rel="next"', second)
+        self.assertIn('href="./styles.css"', second)
+        self.assertIn('src="../chan/thumbs/3.jpg"', first)
+
+        index = self.read(output_dir, 'index.html')
+        self.assertIn('href="page-0001.html"', index)
+        self.assertIn('href="page-0002.html"', index)
+        self.assertNotIn('<b>Первый</b>', index)
+
+    def test_paginated_by_month(self):
+        """Разбиение по месяцам и удаление страниц прошлого экспорта"""
+        output_dir, _ = self.export_pages(per_page=1)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, 'page-0003.html')))
+
+        post = db.session.query(Post).filter_by(telegram_id=5).one()
+        post.date = '2024-02-01T10:00:00'
+        db.session.commit()
+        pages = export_channel_pages(db.session.get(Channel, 'chan'), output_dir, paginate='month')
+
+        self.assertEqual([(page['month'], page['count']) for page in pages], [('2024-01', 2), ('2024-02', 1)])
+        self.assertFalse(os.path.exists(os.path.join(output_dir, 'page-0003.html')))
+
+    def test_search_index(self):
+        """Поисковый индекс: текст без разметки, страница и якорь поста"""
+        output_dir, _ = self.export_pages(per_page=2)
+        entries = json.loads(self.read(output_dir, 'search-index.json'))
+
+        by_id = {(entry['channel_id'], entry['telegram_id']): entry for entry in entries}
+        self.assertEqual(by_id[('chan', 1)]['text'], 'Первый')
+        self.assertEqual(by_id[('chan', 1)]['page'], 'page-0001.html')
+        self.assertEqual(by_id[('777', 50)]['anchor'], 'post-777-50')
+        self.assertEqual(by_id[('chan', 5)]['text'], 'Исправлено')
+        self.assertEqual(by_id[('chan', 5)]['page'], 'page-0002.html')
+        self.assertNotIn(('chan', 2), by_id)
+        self.assertIn('id="post-777-50"', self.read(output_dir, 'page-0001.html'))
+
+    def test_incremental_reexport(self):
+        """Повторный экспорт перерисовывает только страницы с изменёнными входными данными"""
+        output_dir, pages = self.export_pages(per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [True, True, True])
+
+        channel = db.session.get(Channel, 'chan')
+        pages = export_channel_pages(channel, output_dir, per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [False, False, False])
+
+        # Правка поста затрагивает только его страницу
+        db.session.query(Edit).filter_by(telegram_id=5).one().changes = {'message': 'Ещё раз'}
+        db.session.commit()
+        pages = export_channel_pages(channel, output_dir, per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [False, False, True])
+        self.assertIn('Ещё раз', self.read(output_dir, 'page-0003.html'))
+
+        # Layout альбома и комментарии тоже входят в хэш страницы
+        db.session.query(Layout).one().json_data = {'total_width': 100, 'total_height': 50, 'border_width': '4',
+                                                     'cells': []}
+        db.session.commit()
+        pages = export_channel_pages(channel, output_dir, per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [False, True, False])
+
+        # Удалённый файл и force перерисовываются
+        os.remove(os.path.join(output_dir, 'page-0001.html'))
+        pages = export_channel_pages(channel, output_dir, per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [True, False, False])
+        pages = export_channel_pages(channel, output_dir, per_page=1, force=True)
+        self.assertEqual([page['rendered'] for page in pages], [True, True, True])
+
+    def test_incremental_updates_navigation(self):
+        """Появление новой последней страницы перерисовывает прежнюю (ссылка "вперёд")"""
+        output_dir, _ = self.export_pages(per_page=1)
+        db.session.add(Post(telegram_id=6, channel_id='chan', date='2024-01-05T10:00:00', message='Новый'))
+        db.session.commit()
+
+        pages = export_channel_pages(db.session.get(Channel, 'chan'), output_dir, per_page=1)
+        self.assertEqual([page['rendered'] for page in pages], [False, False, True, True])
+        self.assertIn('href="page-0004.html" class="link" rel="next"', self.read(output_dir, 'page-0003.html'))
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'RUN_BENCHMARKS=1 для запуска бенчмарков')
+class HtmlExportBenchmark(unittest.TestCase):
+    """
+    Нативный рендер канала на BENCHMARK_POSTS постов (по умолчанию 50k).
+
+    SSR-сервер в тестах недоступен, поэтому для сравнения замеряется только
+    последняя стадия старого пути — разбор готового документа BeautifulSoup
+    и его сериализация; сам SSR-рендер добавляется к ней сверху.
+    """
+
+    def test_render_large_channel(self):
+        from bs4 import BeautifulSoup
+
+        count = int(os.environ.get('BENCHMARK_POSTS', '50000'))
+        app = make_app()
+        with app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='big', name='Big', discussion_group_id=888, changes={}))
+            db.session.bulk_insert_mappings(Post, [{
+                'telegram_id': i, 'channel_id': 'big', 'date': f'2024-01-01T00:00:{i % 60:02d}',
+                'message': f'Пост <b>{i}</b>', 'author_name': 'Автор',
+                'media_url': f'big/media/{i}.jpg', 'media_type': 'MessageMediaPhoto'
+            } for i in range(count)])
+            db.session.bulk_insert_mappings(Post, [{
+                'telegram_id': count + i, 'channel_id': '888', 'date': '2024-01-02T00:00:00',
+                'message': 'Комментарий', 'author_name': 'Читатель', 'reply_to': i
+            } for i in range(0, count, 10)])
+            db.session.commit()
+
+            output = io.StringIO()
+            started = time.perf_counter()
+            render_channel_html(db.session.get(Channel, 'big'), output)
+            native = time.perf_counter() - started
+
+            started = time.perf_counter()
+            str(BeautifulSoup(output.getvalue(), 'html.parser'))
+            reparse = time.perf_counter() - started
+
+            print(f"\n{count} постов: нативный рендер {native:.2f}s, "
+                  f"только разбор BeautifulSoup старого пути {reparse:.2f}s")
+            self.assertLess(native, reparse)
+
+    def test_incremental_reexport_large_channel(self):
+        """Повторный экспорт BENCHMARK_PAGES страниц после правки одного поста"""
+        pages_count = int(os.environ.get('BENCHMARK_PAGES', '2000'))
+        per_page = 5
+        app = make_app()
+        with app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='big', name='Big', changes={'sortOrder': 'asc'}))
+            db.session.bulk_insert_mappings(Post, [{
+                'telegram_id': i, 'channel_id': 'big', 'date': f'2024-01-01T00:00:{i % 60:02d}',
+                'message': f'Пост <b>{i}</b>', 'author_name': 'Автор'
+            } for i in range(pages_count * per_page)])
+            db.session.commit()
+            channel = db.session.get(Channel, 'big')
+
+            output_dir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+            started = time.perf_counter()
+            export_channel_pages(channel, output_dir, per_page=per_page)
+            full = time.perf_counter() - started
+
+            db.session.add(Edit(telegram_id=7, channel_id='big', date='2024-02-01', changes={'message': 'Правка'}))
+            db.session.commit()
+            started = time.perf_counter()
+            pages = export_channel_pages(channel, output_dir, per_page=per_page)
+            incremental = time.perf_counter() - started
+
+            print(f"\n{pages_count} страниц: полный экспорт {full:.2f}s, после правки одного поста {incremental:.2f}s")
+            self.assertEqual(sum(page['rendered'] for page in pages), 1)
+            self.assertLess(incremental, full)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from PIL import Image
+
+from api import channels as channels_module
+from api.channels import channels_bp
+from api.jobs import jobs_bp
+from api.posts import posts_bp
+from models import db, Channel, Job, MediaVariant, Post
+from utils import image_variants
+from utils.image_variants import available_formats, make_variants, variant_path
+from utils.jobs import interrupt_running_jobs, list_jobs, wait_job
+
+
+class MakeVariantsTests(unittest.TestCase):
+    def setUp(self):
+        self.downloads = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.downloads, ignore_errors=True)
+        os.makedirs(os.path.join(self.downloads, 'chan', 'media'))
+
+    def test_variant_path(self):
+        """Копии лежат в папке variants канала с шириной в имени"""
+        self.assertEqual(variant_path('chan/media/10.jpg', 640, 'webp'), 'chan/variants/10_640.webp')
+        self.assertEqual(variant_path('chan/media/10.png', 320, 'jpeg'), 'chan/variants/10_320.jpg')
+
+    def test_widths_capped_by_original(self):
+        """Ширины больше оригинала сводятся к ширине оригинала, копии не увеличиваются"""
+        source = os.path.join(self.downloads, 'chan', 'media', '1.png')
+        Image.new('RGBA', (800, 400), 'red').save(source)
+        formats = available_formats(('avif', 'webp', 'jpeg'))
+
+        variants = make_variants(source, 'chan/media/1.png', self.downloads, (320, 640, 1280), formats)
+
+        self.assertEqual(sorted({v['width'] for v in variants}), [320, 640, 800])
+        self.assertEqual(len(variants), 3 * len(formats))
+        for variant in variants:
+            path = os.path.join(self.downloads, variant['path'])
+            self.assertEqual(os.path.getsize(path), variant['size'])
+            with Image.open(path) as img:
+                self.assertEqual(img.size, (variant['width'], variant['height']))
+        self.assertIn({'width': 320, 'height': 160, 'format': 'jpeg', 'path': 'chan/variants/1_320.jpg',
+                       'size': os.path.getsize(os.path.join(self.downloads, 'chan/variants/1_320.jpg'))}, variants)
+
+    def test_broken_image(self):
+        """Нечитаемый файл не создаёт копий и не падает"""
+        source = os.path.join(self.downloads, 'chan', 'media', 'broken.jpg')
+        with open(source, 'wb') as f:
+            f.write(b'not an image')
+        self.assertEqual(make_variants(source, 'chan/media/broken.jpg', self.downloads, (320,), ('jpeg',)), [])
+
+
+class VariantsJobTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(channels_module, 'DOWNLOADS_DIR', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, value in (('IMAGE_VARIANT_WIDTHS', (100, 200)), ('IMAGE_VARIANT_FORMATS', ('webp', 'jpeg'))):
+            patcher = mock.patch.object(image_variants, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(image_variants, 'available_formats', lambda: ('webp', 'jpeg'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        os.makedirs(os.path.join(self.temp_dir, 'chan', 'media'))
+        for name in ('1.jpg', '2.jpg'):
+            Image.new('RGB', (300, 150), 'blue').save(os.path.join(self.temp_dir, 'chan', 'media', name))
+
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        # Файловая БД: фоновая задача работает в другом потоке со своим соединением
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.temp_dir, 'test.db')}"
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app.register_blueprint(channels_bp, url_prefix='/api')
+        self.app.register_blueprint(posts_bp, url_prefix='/api')
+        self.app.register_blueprint(jobs_bp, url_prefix='/api')
+
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='chan', name='My Channel'))
+            db.session.add_all([
+                Post(telegram_id=1, channel_id='chan', date='2024-01-01', message='',
+                     media_url='chan/media/1.jpg', media_type='MessageMediaPhoto'),
+                Post(telegram_id=2, channel_id='chan', date='2024-01-02', message='',
+                     media_url='chan/media/2.jpg', media_type='MessageMediaDocument', mime_type='image/jpeg'),
+                # Файла нет на диске
+                Post(telegram_id=3, channel_id='chan', date='2024-01-03', message='',
+                     media_url='chan/media/3.jpg', media_type='MessageMediaPhoto'),
+                Post(telegram_id=4, channel_id='chan', date='2024-01-04', message='',
+                     media_url='chan/media/4.pdf', media_type='MessageMediaDocument', mime_type='application/pdf'),
+            ])
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    def start_and_wait(self):
+        response = self.client.post('/api/channels/chan/variants')
+        self.assertEqual(response.status_code, 202)
+        with self.app.app_context():
+            job = wait_job(response.get_json()['job_id'], timeout=30)
+        self.assertEqual(job['status'], 'completed', job['error'])
+        return job
+
+    def test_job_creates_variants(self):
+        """Задача создаёт копии фото и изображений-документов и записывает их в БД"""
+        job = self.start_and_wait()
+        self.assertEqual(job['result']['photos'], 2)
+        self.assertEqual(job['result']['variants'], 8)
+        self.assertEqual(job['result']['missing'], 1)
+        with self.app.app_context():
+            rows = MediaVariant.query.order_by(MediaVariant.telegram_id, MediaVariant.width, MediaVariant.format).all()
+            self.assertEqual(
+                [(row.telegram_id, row.width, row.height, row.format) for row in rows[:4]],
+                [(1, 100, 50, 'jpeg'), (1, 100, 50, 'webp'), (1, 200, 100, 'jpeg'), (1, 200, 100, 'webp')]
+            )
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, 'chan', 'variants', '2_200.webp')))
+
+        # Повторный запуск вручную снова пробует фото без файла, готовые не трогает
+        job = self.start_and_wait()
+        self.assertEqual((job['result']['photos'], job['result']['missing']), (0, 1))
+
+        # Все фото обработаны — задача не запускается
+        with self.app.app_context():
+            Post.query.filter_by(telegram_id=3).delete()
+            db.session.commit()
+        response = self.client.post('/api/channels/chan/variants')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.get_json()['job_id'])
+
+    def test_posts_api_returns_variants(self):
+        """Посты отдают копии для srcset; ETag меняется, когда копии появились"""
+        response = self.client.get('/api/posts?channel_id=chan')
+        before = response.headers['ETag']
+        self.assertEqual([post['variants'] for post in response.get_json()], [[], [], [], []])
+        # Выдача постов задачу не запускает: её запускает импорт или POST /variants
+        with self.app.app_context():
+            self.assertEqual(list_jobs(image_variants.JOB_KIND), [])
+        self.start_and_wait()
+
+        response = self.client.get('/api/posts?channel_id=chan', headers={'If-None-Match': before})
+        self.assertEqual(response.status_code, 200)
+        posts = {post['telegram_id']: post for post in response.get_json()}
+        self.assertEqual(posts[1]['variants'][0], {
+            'width': 100, 'height': 50, 'format': 'jpeg', 'type': 'image/jpeg', 'url': 'chan/variants/1_100.jpg'
+        })
+        self.assertEqual(len(posts[2]['variants']), 4)
+        self.assertEqual(posts[3]['variants'], [])
+
+    def test_started_once_per_channel(self):
+        """Вторая задача канала не запускается, пока идёт первая, и не повторяется для тех же фото"""
+        with self.app.app_context():
+            now = time.time()
+            db.session.add(Job(id='job1', kind=image_variants.JOB_KIND, key='chan', status='running',
+                               details={'channel_id': 'chan', 'pending': 3}, progress={},
+                               created_at=now, updated_at=now))
+            db.session.commit()
+            self.assertIsNone(image_variants.start_variants_job('chan', self.temp_dir, app=self.app))
+
+            interrupt_running_jobs()
+            job_id = image_variants.start_variants_job('chan', self.temp_dir, app=self.app)
+            self.assertEqual(wait_job(job_id, timeout=30)['status'], 'completed')
+            # Осталось только фото без файла, которое задача уже не смогла обработать
+            self.assertIsNone(image_variants.start_variants_job('chan', self.temp_dir, app=self.app))
+
+    def test_unknown_channel(self):
+        self.assertEqual(self.client.post('/api/channels/missing/variants').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
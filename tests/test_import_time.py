@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Тяжёлые подсистемы, которые не должны загружаться при старте API
+HEAVY_MODULES = ('weasyprint', 'bs4', 'telethon', 'photocollage', 'PIL', 'requests')
+
+# Бюджет времени импорта app (секунды); на медленных CI можно поднять через окружение
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', '3.0'))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in %r if name in sys.modules],
+    "database": app.app.config['SQLALCHEMY_DATABASE_URI']
+}))
+""" % (HEAVY_MODULES,)
+
+
+class ImportTimeTests(unittest.TestCase):
+    """Бенчмарк старта: импорт app в чистом интерпретаторе"""
+
+    @classmethod
+    def setUpClass(cls):
+        env = dict(os.environ)
+        env.setdefault('API_ID', '123456')
+        env.setdefault('API_HASH', 'testhash')
+        env.setdefault('PHONE', '+10000000000')
+        env['PYTHONPATH'] = ROOT_DIR + os.pathsep + env.get('PYTHONPATH', '')
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Лог server.log создаётся в рабочей директории процесса, а база — во временной
+            # директории, а не в instance/ репозитория (init_db создаёт и мигрирует её)
+            env['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(work_dir, 'posts.db')}"
+            cls.work_dir = work_dir
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE],
+                cwd=work_dir, env=env, capture_output=True, text=True, timeout=60
+            )
+        if result.returncode != 0:
+            raise AssertionError(f"Импорт app завершился с ошибкой:\n{result.stderr}")
+        cls.probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_heavy_modules_are_lazy(self):
+        """WeasyPrint, BeautifulSoup, Telethon и photocollage не загружаются при импорте"""
+        self.assertEqual(self.probe['loaded'], [])
+
+    def test_probe_uses_temp_database(self):
+        """Импорт в тесте не создаёт и не мигрирует базу разработчика"""
+        self.assertTrue(self.probe['database'].startswith(f"sqlite:///{self.work_dir}"), self.probe['database'])
+
+    def test_import_time_budget(self):
+        """Импорт app укладывается в бюджет времени"""
+        self.assertLess(
+            self.probe['elapsed'], IMPORT_TIME_BUDGET,
+            f"Импорт app занял {self.probe['elapsed']:.2f}s (бюджет {IMPORT_TIME_BUDGET}s)"
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from utils.gallery_layout import generate_gallery_layout_from_sizes
+from utils.justified_layout import justified_layout
+
+ALBUMS = [
+    [(1600, 1200), (1600, 1200)],
+    [(1200, 1600), (1200, 1600)],
+    [(1600, 900), (900, 1600), (1200, 1200)],
+    [(1600, 1200)] * 4,
+    [(1280, 960), (960, 1280), (1280, 720), (800, 800), (720, 1280), (1280, 960)],
+    [(1600, 1200)] * 10,
+]
+
+
+class JustifiedLayoutTests(unittest.TestCase):
+    def assertTiles(self, layout):
+        """Ячейки покрывают прямоугольник layout целиком и не перекрываются"""
+        cells = layout['cells']
+        area = sum(cell['width'] * cell['height'] for cell in cells)
+        self.assertAlmostEqual(area, layout['total_width'] * layout['total_height'], places=3)
+        for cell in cells:
+            self.assertGreaterEqual(cell['x'], 0)
+            self.assertLessEqual(cell['x'] + cell['width'], layout['total_width'] + 1e-6)
+            self.assertLessEqual(cell['y'] + cell['height'], layout['total_height'] + 1e-6)
+        for i, a in enumerate(cells):
+            for b in cells[i + 1:]:
+                overlap_x = min(a['x'] + a['width'], b['x'] + b['width']) - max(a['x'], b['x'])
+                overlap_y = min(a['y'] + a['height'], b['y'] + b['height']) - max(a['y'], b['y'])
+                self.assertFalse(overlap_x > 1e-6 and overlap_y > 1e-6, (a, b))
+
+    def test_same_schema_as_photocollage(self):
+        """Схема layout та же, что у photocollage: каждое фото ровно в одной ячейке"""
+        for sizes in ALBUMS:
+            with self.subTest(count=len(sizes)):
+                justified = generate_gallery_layout_from_sizes(sizes, engine='justified')
+                collage = generate_gallery_layout_from_sizes(sizes, engine='photocollage')
+                self.assertEqual(set(justified), {'total_width', 'total_height', 'image_count', 'cells'})
+                if collage:  # photocollage изредка не раскладывает альбом
+                    self.assertEqual(set(justified), set(collage))
+                    self.assertEqual(set(justified['cells'][0]), set(collage['cells'][0]))
+                    self.assertEqual(justified['total_width'], collage['total_width'])
+                self.assertEqual(justified['image_count'], len(sizes))
+                self.assertEqual(sorted(cell['image_index'] for cell in justified['cells']), list(range(len(sizes))))
+                self.assertTiles(justified)
+
+    def test_keeps_aspect_ratio(self):
+        """Фото не кадрируются: пропорции ячеек совпадают с пропорциями фото"""
+        for sizes in ALBUMS:
+            layout = justified_layout(sizes)
+            for cell in layout['cells']:
+                w, h = sizes[cell['image_index']]
+                self.assertAlmostEqual(cell['width'] / cell['height'], w / h, places=6)
+
+    def test_deterministic_rows(self):
+        """Результат детерминирован; два горизонтальных фото — друг под другом, вертикальных — рядом"""
+        sizes = ALBUMS[4]
+        self.assertEqual(justified_layout(sizes), justified_layout(sizes))
+
+        landscape = justified_layout(ALBUMS[0])
+        self.assertEqual([(c['x'], c['y']) for c in landscape['cells']], [(0.0, 0.0), (0.0, 75.0)])
+        portrait = justified_layout(ALBUMS[1])
+        self.assertEqual([(c['x'], c['y']) for c in portrait['cells']], [(0.0, 0.0), (50.0, 0.0)])
+
+    def test_max_per_row(self):
+        """columns ограничивает число фото в ряду"""
+        layout = generate_gallery_layout_from_sizes([(1200, 1600)] * 6, columns=2, engine='justified')
+        rows = {}
+        for cell in layout['cells']:
+            rows[cell['y']] = rows.get(cell['y'], 0) + 1
+        self.assertLessEqual(max(rows.values()), 2)
+
+    def test_unsupported_count(self):
+        with self.assertRaises(ValueError):
+            justified_layout([(100, 100)] * 11)
+        # Явный justified для большого альбома не даёт layout, auto переходит на photocollage
+        self.assertIsNone(generate_gallery_layout_from_sizes([(100, 100)] * 11, engine='justified'))
+
+
+@unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'RUN_BENCHMARKS=1 для запуска бенчмарков')
+class JustifiedLayoutBenchmark(unittest.TestCase):
+    def test_faster_than_photocollage(self):
+        rng = random.Random(1)
+        albums = [[(rng.choice((800, 1280, 600)), rng.choice((600, 960, 800))) for _ in range(rng.randint(2, 10))]
+                  for _ in range(int(os.environ.get('BENCHMARK_ALBUMS', '2000')))]
+        timings = {}
+        for engine in ('justified', 'photocollage'):
+            started = time.perf_counter()
+            for sizes in albums:
+                generate_gallery_layout_from_sizes(sizes, engine=engine)
+            timings[engine] = time.perf_counter() - started
+        print(f"\n{len(albums)} альбомов: " + ", ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
+        self.assertLess(timings['justified'], timings['photocollage'])
+
+
+if __name__ == '__main__':
+    unittest.main()
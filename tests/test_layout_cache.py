@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from models import db, Layout, LayoutCache, Post
+from utils import channel_layouts, layout_cache
+from utils.channel_layouts import generate_channel_layouts
+from utils.gallery_layout import generate_gallery_layout_from_sizes
+from utils.layout_cache import cached_gallery_layout, layout_cache_key, store_layouts
+
+
+class LayoutCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_key(self):
+        """Ключ зависит от пропорций (не от абсолютных размеров) и параметров генерации"""
+        key = layout_cache_key([(1600, 1200), (1200, 1600)])
+        self.assertEqual(key, layout_cache_key([(1280, 960), (960, 1280)]))
+        self.assertEqual(key, layout_cache_key([(1280, 960), (960, 1280)], engine='photocollage'))
+        self.assertNotEqual(key, layout_cache_key([(1200, 1600), (1600, 1200)]))
+        self.assertNotEqual(key, layout_cache_key([(1600, 1200), (1200, 1600)], columns=2))
+        self.assertNotEqual(key, layout_cache_key([(1600, 1200), (1200, 1600)], no_crop=True))
+        self.assertNotEqual(key, layout_cache_key([(1600, 1200), (1200, 1600)], engine='auto'))
+
+    def test_cached_layout(self):
+        """Альбом той же формы берётся из кэша без генерации; результат можно менять"""
+        with mock.patch.object(layout_cache, 'generate_gallery_layout_from_sizes',
+                               wraps=generate_gallery_layout_from_sizes) as generate:
+            first = cached_gallery_layout([(1600, 1200), (1200, 1600), (1000, 1000)], columns=2)
+            first['border_width'] = '5'
+            second = cached_gallery_layout([(800, 600), (600, 800), (500, 500)], columns=2)
+            cached_gallery_layout([(800, 600), (600, 800), (500, 500)], columns=3)
+
+        self.assertEqual(generate.call_count, 2)
+        self.assertNotIn('border_width', second)
+        self.assertEqual(second['image_count'], 3)
+        self.assertEqual(LayoutCache.query.count(), 2)
+
+    def test_refresh_replaces_cached_layout(self):
+        """refresh генерирует layout заново и заменяет им запись кэша"""
+        sizes = [(1600, 1200), (1200, 1600), (1000, 1000)]
+        cached_gallery_layout(sizes, columns=2)
+        fresh = {'image_count': 3, 'cells': [], 'fresh': True}
+        with mock.patch.object(layout_cache, 'generate_gallery_layout_from_sizes', return_value=fresh) as generate:
+            self.assertTrue(cached_gallery_layout(sizes, columns=2, refresh=True)['fresh'])
+            self.assertTrue(cached_gallery_layout(sizes, columns=2)['fresh'])
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(LayoutCache.query.count(), 1)
+
+    def test_failed_layout_not_cached(self):
+        with mock.patch.object(layout_cache, 'generate_gallery_layout_from_sizes', return_value=None):
+            self.assertIsNone(cached_gallery_layout([(100, 100), (200, 100)]))
+        self.assertEqual(LayoutCache.query.count(), 0)
+
+    def test_lru_eviction(self):
+        """Сверх лимита удаляются записи, к которым дольше всего не обращались"""
+        with mock.patch.object(layout_cache, 'LAYOUT_CACHE_SIZE', 2), \
+                mock.patch.object(layout_cache.time, 'time', side_effect=[1.0, 2.0, 3.0, 4.0]):
+            store_layouts({'a': {'cells': []}})
+            store_layouts({'b': {'cells': []}})
+            layout_cache.get_cached_layouts(['a'])  # a использован позже b
+            store_layouts({'c': {'cells': []}})
+        self.assertEqual(sorted(row.key for row in LayoutCache.query), ['a', 'c'])
+
+    def test_channel_generates_each_shape_once(self):
+        """Пакетная генерация считает каждую форму альбома один раз и использует кэш"""
+        rows = []
+        for grouped_id in range(1, 6):
+            for index, size in enumerate([(1600, 1200), (1200, 1600)]):
+                rows.append({'telegram_id': grouped_id * 10 + index, 'channel_id': 'chan', 'date': '2024-01-01',
+                             'message': '', 'grouped_id': grouped_id, 'media_type': 'MessageMediaPhoto',
+                             'media_width': size[0], 'media_height': size[1]})
+        db.session.bulk_insert_mappings(Post, rows)
+        db.session.commit()
+
+        with mock.patch.object(channel_layouts, 'generate_gallery_layout_from_sizes',
+                               wraps=generate_gallery_layout_from_sizes) as generate:
+            result = generate_channel_layouts('chan', '/nonexistent', workers=1)
+            self.assertEqual((result['created'], result['cached']), (5, 0))
+            self.assertEqual(generate.call_count, 1)
+
+            Layout.query.delete()
+            db.session.commit()
+            result = generate_channel_layouts('chan', '/nonexistent', workers=1)
+            self.assertEqual((result['created'], result['cached']), (5, 5))
+            self.assertEqual(generate.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
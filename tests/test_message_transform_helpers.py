@@ -63,6 +63,35 @@ class MessageTransformHelperTests(unittest.TestCase):
 		thumb_path = os.path.join(self.temp_dir, info.thumb_url)
 		self.assertTrue(os.path.exists(thumb_path))
 
+	def test_extract_media_size_uses_largest_photo_size(self):
+		from telethon.tl.types import (
+			DocumentAttributeFilename,
+			DocumentAttributeImageSize,
+			MessageMediaDocument,
+			MessageMediaPhoto,
+			Photo,
+			PhotoSize,
+			PhotoStrippedSize,
+		)
+		from telethon.tl.types import Document
+
+		photo = Photo(
+			id=1, access_hash=0, file_reference=b"", date=None, dc_id=1,
+			sizes=[
+				PhotoStrippedSize(type="i", bytes=b""),
+				PhotoSize(type="m", w=320, h=240, size=100),
+				PhotoSize(type="y", w=1280, h=960, size=1000),
+			],
+		)
+		self.assertEqual(message_transform.extract_media_size(MessageMediaPhoto(photo=photo)), (1280, 960))
+
+		document = Document(
+			id=2, access_hash=0, file_reference=b"", date=None, mime_type="image/png", size=10, dc_id=1,
+			attributes=[DocumentAttributeFilename(file_name="a.png"), DocumentAttributeImageSize(w=640, h=480)],
+		)
+		self.assertEqual(message_transform.extract_media_size(MessageMediaDocument(document=document)), (640, 480))
+		self.assertIsNone(message_transform.extract_media_size(MessageMediaPhoto(photo=None)))
+
 	def test_download_media_with_thumbnail_skips_for_sticker(self):
 		class FakeAttr:
 			def __init__(self, alt):
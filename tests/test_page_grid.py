@@ -0,0 +1,307 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api.jobs import jobs_bp
+from database import PAGE_BLOCKS_VERSION, init_db, schema_version
+from api.pages import pages_bp
+from api.posts import posts_bp
+from models import db, Job, Page, PageBlock, PageGridState, Post
+from utils import page_grid
+from utils.jobs import JobAlreadyRunning, interrupt_running_jobs, list_jobs, start_job, wait_job
+from utils.page_grid import append_pages, rebuild_page_blocks, seed_page_grid_state
+
+
+def add_posts(telegram_ids):
+    db.session.bulk_insert_mappings(Post, [
+        {'telegram_id': telegram_id, 'channel_id': 'chan', 'date': '2024-01-01', 'message': ''}
+        for telegram_id in telegram_ids
+    ])
+    db.session.commit()
+
+
+def page_posts():
+    return [[block['content']['telegram_id'] for block in page.json_data['blocks']]
+            for page in Page.query.filter_by(channel_id='chan').order_by(Page.id)]
+
+
+class PageGridTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        # Файловая БД: фоновая задача работает в другом потоке со своим соединением
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.temp_dir, 'test.db')}"
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app.register_blueprint(pages_bp, url_prefix='/api')
+        self.app.register_blueprint(jobs_bp, url_prefix='/api')
+        self.app.register_blueprint(posts_bp, url_prefix='/api')
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.engine.dispose()
+        self.context.pop()
+
+    def test_get_pages_generates_in_background(self):
+        """GET не строит страницы сам: их окнами создаёт фоновая задача"""
+        add_posts(range(1, 19))
+
+        with mock.patch.object(page_grid, 'PAGE_GRID_WINDOW', 2):
+            response = self.client.get('/api/pages?channel_id=chan')
+            self.assertEqual(response.get_json(), [])
+            jobs = list_jobs(page_grid.JOB_KIND)
+            self.assertEqual(len(jobs), 1)
+            self.assertEqual(response.headers['X-Pages-Job'], jobs[0]['id'])
+            job = wait_job(jobs[0]['id'], timeout=30)
+
+        self.assertEqual(job['status'], 'completed', job['error'])
+        self.assertEqual(job['result'], {'posts': 18, 'pages': 5})
+        self.assertEqual(job['progress']['posts_done'], 18)
+
+        pages = self.client.get('/api/pages?channel_id=chan').get_json()
+        self.assertEqual(len(pages), 5)
+        first = pages[0]['json_data']['blocks']
+        self.assertEqual([block['content']['telegram_id'] for block in first], [1, 2, 3, 4])
+        self.assertEqual([(block['x'], block['y']) for block in first], [(0, 0), (6, 0), (0, 6), (6, 6)])
+        self.assertEqual(first[0]['id'], 'block-1')
+        # Всё размещено — новая задача не запускается
+        self.assertEqual(len(list_jobs(page_grid.JOB_KIND)), 1)
+        self.assertNotIn('X-Pages-Job', self.client.get('/api/pages?channel_id=chan').headers)
+
+    def test_new_posts_appended(self):
+        """Новые посты дописываются в последнюю страницу и новые, готовые страницы не перестраиваются"""
+        add_posts(range(1, 7))
+        self.assertEqual(append_pages('chan'), (6, 2))
+        first_page = Page.query.order_by(Page.id).first()
+        first_page.json_data = dict(first_page.json_data, edited=True)
+        db.session.commit()
+
+        add_posts(range(7, 12))
+        self.assertEqual(append_pages('chan'), (5, 1))
+        self.assertEqual(page_posts(), [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]])
+        self.assertTrue(Page.query.order_by(Page.id).first().json_data['edited'])
+        self.assertEqual(append_pages('chan'), (0, 0))
+
+    def test_edited_trailing_page_kept(self):
+        """Последняя страница с изменённой сеткой не дозаполняется"""
+        add_posts(range(1, 3))
+        append_pages('chan')
+        page = Page.query.one()
+        blocks = list(page.json_data['blocks'])
+        blocks[0] = dict(blocks[0], w=12)
+        page.json_data = dict(page.json_data, blocks=blocks)
+        db.session.commit()
+
+        add_posts([3])
+        self.assertEqual(append_pages('chan'), (1, 1))
+        self.assertEqual(page_posts(), [[1, 2], [3]])
+
+    def test_deleted_trailing_page_not_regenerated(self):
+        """Удалённая последняя страница не создаётся заново при следующем открытии"""
+        add_posts(range(1, 10))
+        append_pages('chan')
+        trailing = Page.query.order_by(Page.id.desc()).first()
+        self.assertEqual(self.client.delete(f'/api/pages/{trailing.id}').status_code, 200)
+
+        self.assertNotIn('X-Pages-Job', self.client.get('/api/pages?channel_id=chan').headers)
+        self.assertEqual(append_pages('chan'), (0, 0))
+        self.assertEqual(page_posts(), [[1, 2, 3, 4], [5, 6, 7, 8]])
+
+        add_posts([10])
+        self.assertEqual(append_pages('chan'), (1, 1))
+        self.assertEqual(page_posts(), [[1, 2, 3, 4], [5, 6, 7, 8], [10]])
+
+    def test_moved_post_not_duplicated(self):
+        """Пост, перенесённый с последней страницы на другую, не размещается второй раз"""
+        add_posts(range(1, 11))
+        append_pages('chan')
+        first, _, last = Page.query.order_by(Page.id).all()
+        moved = last.json_data['blocks'][1]
+        self.client.put(f'/api/pages/{last.id}', json={'json_data': dict(last.json_data, blocks=last.json_data['blocks'][:1])})
+        self.client.put(f'/api/pages/{first.id}', json={'json_data': dict(first.json_data, blocks=first.json_data['blocks'] + [moved])})
+
+        self.assertNotIn('X-Pages-Job', self.client.get('/api/pages?channel_id=chan').headers)
+        self.assertEqual(append_pages('chan'), (0, 0))
+        self.assertEqual(page_posts(), [[1, 2, 3, 4, 10], [5, 6, 7, 8], [9]])
+
+    def test_all_pages_deleted_regenerated(self):
+        """Канал без страниц раскладывается заново с начала"""
+        add_posts(range(1, 6))
+        append_pages('chan')
+        for page in Page.query.all():
+            self.client.delete(f'/api/pages/{page.id}')
+        self.assertEqual(append_pages('chan'), (5, 2))
+        self.assertEqual(page_posts(), [[1, 2, 3, 4], [5]])
+
+    def test_seed_page_grid_state(self):
+        """Для страниц, созданных до page_grid_state, граница берётся из page_blocks"""
+        add_posts(range(1, 10))
+        append_pages('chan')
+        PageGridState.query.delete()
+        db.session.commit()
+        self.client.delete(f'/api/pages/{Page.query.order_by(Page.id.desc()).first().id}')
+
+        self.assertEqual(seed_page_grid_state(), 1)
+        self.assertEqual(db.session.get(PageGridState, 'chan').placed_until, 8)
+
+    def test_page_blocks_index(self):
+        """page_blocks повторяет посты страниц после генерации, создания, правки и удаления страниц"""
+        add_posts(range(1, 7))
+        append_pages('chan')
+        index = lambda: sorted((row.page_id, row.position, row.telegram_id) for row in PageBlock.query)
+        first_id, second_id = [page.id for page in Page.query.order_by(Page.id)]
+        self.assertEqual(index(), [(first_id, 0, 1), (first_id, 1, 2), (first_id, 2, 3), (first_id, 3, 4),
+                                   (second_id, 0, 5), (second_id, 1, 6)])
+
+        blocks = [{'id': 'b', 'x': 0, 'y': 0, 'w': 12, 'h': 6, 'content': {'channel_id': 'chan', 'telegram_id': '6'}},
+                  {'id': 't', 'x': 0, 'y': 6, 'w': 12, 'h': 2, 'content': {'text': 'note'}}]
+        response = self.client.put(f'/api/pages/{second_id}', json={'json_data': {'blocks': blocks}})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/pages', json={'channel_id': 'chan', 'json_data': {'blocks': blocks[:1]}})
+        new_id = response.get_json()['id']
+        self.assertEqual(index()[4:], [(second_id, 0, 6), (new_id, 0, 6)])
+
+        response = self.client.get('/api/pages/by-post?channel_id=chan&telegram_id=6')
+        self.assertEqual(response.get_json(), {'page_id': second_id, 'position': 0})
+        self.assertEqual(self.client.get('/api/pages/by-post?channel_id=chan&telegram_id=5').status_code, 404)
+        self.assertEqual(self.client.get('/api/pages/by-post?channel_id=chan').status_code, 400)
+
+        self.client.delete(f'/api/pages/{new_id}')
+        self.assertEqual(PageBlock.query.filter_by(page_id=new_id).count(), 0)
+
+    def test_delete_post_updates_pages(self):
+        """Удаление поста убирает его блоки со страниц, найденных по индексу"""
+        add_posts(range(1, 5))
+        append_pages('chan')
+        response = self.client.delete('/api/posts?channel_id=chan&telegram_id=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(page_posts(), [[1, 3, 4]])
+        self.assertEqual([row.position for row in PageBlock.query.order_by(PageBlock.position)], [0, 1, 2])
+
+    def test_rebuild_page_blocks(self):
+        """Для старой базы индекс строится по json_data всех страниц один раз"""
+        add_posts(range(1, 6))
+        append_pages('chan')
+        PageBlock.query.delete()
+        db.session.commit()
+
+        self.assertEqual(rebuild_page_blocks(batch_size=1), 2)
+        self.assertEqual(PageBlock.query.count(), 5)
+
+    def test_init_db_rebuilds_page_blocks_once(self):
+        """init_db строит индекс по версии базы, а не по пустоте page_blocks"""
+        add_posts(range(1, 6))
+        append_pages('chan')
+        PageBlock.query.delete()
+        db.session.commit()
+
+        self.assertEqual(schema_version(), 0)
+        init_db(self.app)
+        self.assertEqual(PageBlock.query.count(), 5)
+        self.assertGreaterEqual(schema_version(), PAGE_BLOCKS_VERSION)
+
+        # Пустой индекс (например, страницы без постов) не перестраивается при каждом запуске
+        PageBlock.query.delete()
+        db.session.commit()
+        with mock.patch.object(page_grid, 'rebuild_page_blocks') as rebuild:
+            init_db(self.app)
+        rebuild.assert_not_called()
+        self.assertEqual(PageBlock.query.count(), 0)
+
+    def test_pages_summary(self):
+        """Лёгкий список страниц с пагинацией, без json_data"""
+        add_posts(range(1, 11))
+        append_pages('chan')
+        ids = [page.id for page in Page.query.order_by(Page.id)]
+
+        data = self.client.get('/api/pages/summary?channel_id=chan&limit=2&offset=1').get_json()
+        self.assertEqual((data['total'], data['limit'], data['offset']), (3, 2, 1))
+        self.assertEqual([(page['id'], page['index'], page['blocks']) for page in data['pages']],
+                         [(ids[1], 1, 4), (ids[2], 2, 2)])
+        self.assertEqual(data['pages'][0]['updated_at'], db.session.get(Page, ids[1]).json_data['updated_at'])
+        self.assertNotIn('json_data', data['pages'][0])
+
+        pages = self.client.get('/api/pages?channel_id=chan&limit=1&offset=2').get_json()
+        self.assertEqual([page['id'] for page in pages], [ids[2]])
+        self.assertEqual(self.client.get('/api/pages/summary?limit=0').status_code, 400)
+
+    def test_page_etag(self):
+        """Неизменённая страница отдаётся как 304, после сохранения — заново"""
+        add_posts(range(1, 3))
+        append_pages('chan')
+        page_id = Page.query.one().id
+
+        response = self.client.get(f'/api/pages/{page_id}')
+        etag = response.headers['ETag']
+        self.assertTrue(response.cache_control.no_cache)
+        response = self.client.get(f'/api/pages/{page_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.put(f'/api/pages/{page_id}', json={'json_data': {'blocks': []}})
+        self.assertNotEqual(response.headers['ETag'], etag)
+        response = self.client.get(f'/api/pages/{page_id}', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['json_data']['blocks'], [])
+
+    def test_stale_running_job_interrupted(self):
+        """running-запись задачи, чей поток умер при перезапуске, не блокирует раскладку канала"""
+        add_posts(range(1, 10))
+        now = time.time()
+        db.session.add(Job(id='dead', kind=page_grid.JOB_KIND, key='chan', status='running',
+                           details={'channel_id': 'chan'}, progress={}, created_at=now, updated_at=now))
+        db.session.commit()
+        self.assertEqual(page_grid.start_pages_job('chan', app=self.app), 'dead')
+
+        self.assertEqual(interrupt_running_jobs(), 1)
+        job_id = page_grid.start_pages_job('chan', app=self.app)
+        self.assertNotEqual(job_id, 'dead')
+        self.assertEqual(wait_job(job_id, timeout=30)['status'], 'completed')
+        self.assertEqual(len(page_posts()), 3)
+        self.assertEqual(db.session.get(Job, 'dead').status, 'error')
+
+    def test_one_running_job_per_key(self):
+        """Вторая задача с тем же ключом не запускается, даже минуя проверку running_pages_job"""
+        release = threading.Event()
+        first = start_job(page_grid.JOB_KIND, lambda job_id: release.wait(30), app=self.app, key='chan')
+        try:
+            with self.assertRaises(JobAlreadyRunning) as raised:
+                start_job(page_grid.JOB_KIND, lambda job_id: None, app=self.app, key='chan')
+            self.assertEqual(raised.exception.job_id, first)
+            # Ключ ограничивает только свой канал
+            other = start_job(page_grid.JOB_KIND, lambda job_id: None, app=self.app, key='other')
+            self.assertEqual(wait_job(other, timeout=30)['status'], 'completed')
+
+            add_posts([1])
+            with mock.patch.object(page_grid, 'running_pages_job', return_value=None):
+                self.assertEqual(page_grid.start_pages_job('chan', app=self.app), first)
+        finally:
+            release.set()
+        wait_job(first, timeout=30)
+        self.assertEqual(len(list_jobs(page_grid.JOB_KIND)), 2)
+
+    def test_no_posts(self):
+        self.assertEqual(self.client.get('/api/pages?channel_id=chan').get_json(), [])
+        self.assertEqual(list_jobs(page_grid.JOB_KIND), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+import importlib.util
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from flask import Flask
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+from api import channels as channels_module
+from api.channels import channels_bp
+from api.jobs import jobs_bp
+from models import db, Channel, Edit, Job, Post
+from utils import pdf_export
+from utils.pdf_export import render_pdf_chunk
+from utils.html_export import write_pdf_chunks
+from utils.jobs import get_job, wait_job
+
+
+def fake_render_pdf_chunk(html_path, pdf_path, css_path=None):
+    """Вместо WeasyPrint: по одной пустой странице на пост куска плюс страница заголовка."""
+    with open(html_path, encoding='utf-8') as f:
+        html = f.read()
+    if css_path:
+        # Стили передаются рендереру, а не ссылкой из куска
+        assert '<link rel="stylesheet"' not in html
+        assert pdf_export.cleaned_pdf_css(css_path).startswith('.post { color: black; }')
+    pages = 1 + html.count('id="post-')
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    writer.add_outline_item(os.path.basename(html_path), 0)
+    with open(pdf_path, 'wb') as f:
+        writer.write(f)
+    return {'pages': pages, 'timings': {'css': 0.0, 'layout': 0.01, 'write': 0.01}}
+
+
+class PdfExportTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        patcher = mock.patch.object(channels_module, 'DOWNLOADS_DIR', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name, value in (('render_pdf_chunk', fake_render_pdf_chunk), ('PDF_CHUNK_ITEMS', 2)):
+            patcher = mock.patch.object(pdf_export, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # styles-pdf.css собирается фронтендом и в репозитории отсутствует
+        self.css_path = os.path.join(self.temp_dir, 'styles-pdf.css')
+        with open(self.css_path, 'w', encoding='utf-8') as f:
+            f.write('.post {--tw-empty: ; color: black; }')
+        patcher = mock.patch.object(channels_module, 'PDF_CSS_SOURCE', self.css_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.app = Flask(__name__)
+        self.app.config['TESTING'] = True
+        # Файловая БД: фоновая задача работает в другом потоке со своим соединением
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.temp_dir, 'test.db')}"
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.app.register_blueprint(channels_bp, url_prefix='/api')
+        self.app.register_blueprint(jobs_bp, url_prefix='/api')
+
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Channel(id='chan', name='My Channel', changes={'sortOrder': 'asc'}))
+            for i in range(1, 6):
+                db.session.add(Post(telegram_id=i, channel_id='chan', date=f'2024-01-0{i}T10:00:00',
+                                    message=f'Пост {i}', author_name='Автор'))
+            db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+    def test_write_pdf_chunks(self):
+        """Лента режется на куски по N элементов, обложка только в первом"""
+        with self.app.app_context():
+            chunks = write_pdf_chunks(db.session.get(Channel, 'chan'), self.temp_dir, 2)
+
+        self.assertEqual([chunk['file'] for chunk in chunks],
+                         ['pdf-chunk-0001.html', 'pdf-chunk-0002.html', 'pdf-chunk-0003.html'])
+        self.assertEqual([chunk['count'] for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[1]['first_date'], '2024-01-03T10:00:00')
+
+        first, second = (open(os.path.join(self.temp_dir, chunk['file']), encoding='utf-8').read()
+                         for chunk in chunks[:2])
+        self.assertIn('My Channel</h1>', first)
+        self.assertNotIn('My Channel</h1>', second)
+        self.assertIn('href="./styles-pdf.css"', second)
+        self.assertIn('Пост 3', second)
+        self.assertNotIn('Пост 2', second)
+
+    def test_merge_keeps_order_and_bookmarks(self):
+        """Склейка: страницы подряд, закладка на кусок с вложенными закладками куска"""
+        chunks = []
+        for number, posts in ((1, 2), (2, 1)):
+            html_path = os.path.join(self.temp_dir, f'part-{number}.html')
+            with open(html_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(f'<div id="post-c-{i}"></div>' for i in range(posts)))
+            pdf_path = os.path.join(self.temp_dir, f'part-{number}.pdf')
+            fake_render_pdf_chunk(html_path, pdf_path)
+            chunks.append({'number': number, 'pdf': pdf_path,
+                           'first_date': f'2024-0{number}-01T00:00:00', 'last_date': f'2024-0{number}-02T00:00:00'})
+
+        target = os.path.join(self.temp_dir, 'merged.pdf')
+        self.assertEqual(pdf_export.merge_pdf_chunks(chunks, target), 5)
+
+        reader = PdfReader(target)
+        self.assertEqual(len(reader.pages), 5)
+        titles = [item.title for item in reader.outline if not isinstance(item, list)]
+        self.assertEqual(titles, ['2024-01-01 — 2024-01-02', '2024-02-01 — 2024-02-02'])
+        self.assertEqual(reader.get_destination_page_number(reader.outline[2]), 3)
+        self.assertEqual([item.title for item in reader.outline[1]], ['part-1.html'])
+
+    def run_print(self):
+        response = self.client.get('/api/channels/chan/print')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        with self.app.app_context():
+            job = wait_job(job_id, timeout=30)
+            self.assertEqual(job['status'], 'completed', job.get('error'))
+            return get_job(job_id)
+
+    def test_print_runs_in_background(self):
+        """PDF собирается фоновой задачей из кусков, промежуточные файлы удаляются"""
+        with mock.patch.object(pdf_export, 'PDF_WORKERS', 1):
+            job = self.run_print()
+
+        pdf_path = os.path.join(self.temp_dir, 'chan', 'chan.pdf')
+        self.assertEqual({key: job['result'][key] for key in ('path', 'pages', 'chunks')},
+                         {'path': pdf_path, 'pages': 8, 'chunks': 3})
+        self.assertEqual(set(job['result']['timings']),
+                         {'html', 'images', 'css', 'layout', 'write', 'render', 'merge', 'total'})
+        self.assertAlmostEqual(job['result']['timings']['layout'], 0.03)
+        self.assertEqual(job['progress']['timings'], job['result']['timings'])
+        self.assertEqual(job['progress']['stage'], 'done')
+        self.assertEqual(job['progress']['chunks_done'], 3)
+        self.assertEqual(job['progress']['chunks_total'], 3)
+        self.assertEqual(len(PdfReader(pdf_path).pages), 8)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.temp_dir, 'chan'))), ['.pdf-chunks', 'chan.pdf'])
+        # В кэше остаются только PDF кусков и манифест
+        self.assertEqual(sorted(os.listdir(os.path.join(self.temp_dir, 'chan', '.pdf-chunks'))), [
+            'export-manifest.json', 'pdf-chunk-0001.pdf', 'pdf-chunk-0002.pdf', 'pdf-chunk-0003.pdf'])
+
+    def test_reexport_renders_only_changed_chunks(self):
+        """Повторный экспорт перерисовывает только куски с изменёнными постами"""
+        rendered = []
+
+        def counting_render(html_path, pdf_path, css_path):
+            rendered.append(os.path.basename(html_path))
+            return fake_render_pdf_chunk(html_path, pdf_path, css_path)
+
+        with mock.patch.object(pdf_export, 'PDF_WORKERS', 1), \
+                mock.patch.object(pdf_export, 'render_pdf_chunk', counting_render):
+            self.assertEqual(self.run_print()['result']['rendered'], 3)
+            self.assertEqual(self.run_print()['result']['rendered'], 0)
+
+            with self.app.app_context():
+                db.session.add(Edit(telegram_id=4, channel_id='chan', date='2024-02-01', changes={'message': 'Правка'}))
+                db.session.commit()
+            rendered.clear()
+            job = self.run_print()
+            self.assertEqual(rendered, ['pdf-chunk-0002.html'])
+            self.assertEqual(job['result']['pages'], 8)
+
+            # Изменение CSS инвалидирует все куски
+            with open(self.css_path, 'a', encoding='utf-8') as f:
+                f.write(' .x { color: red; }')
+            os.utime(self.css_path, (0, os.path.getmtime(self.css_path) + 10))
+            self.assertEqual(self.run_print()['result']['rendered'], 3)
+
+    def test_print_uses_downscaled_images(self):
+        """Фото в PDF подставляются печатными копиями, созданными до рендера"""
+        media_dir = os.path.join(self.temp_dir, 'chan', 'media')
+        os.makedirs(media_dir)
+        Image.new('RGB', (4000, 3000), 'red').save(os.path.join(media_dir, '6.jpg'))
+        with self.app.app_context():
+            db.session.add(Post(telegram_id=6, channel_id='chan', date='2024-01-06T10:00:00', message='Фото',
+                                media_url='chan/media/6.jpg', media_type='MessageMediaPhoto'))
+            db.session.commit()
+
+        sources = []
+
+        def checking_render(html_path, pdf_path, css_path):
+            with open(html_path, encoding='utf-8') as f:
+                html = f.read()
+            sources.extend(re.findall(r'<img src="([^"]+)"', html))
+            return fake_render_pdf_chunk(html_path, pdf_path, css_path)
+
+        with mock.patch.object(pdf_export, 'PDF_WORKERS', 1), \
+                mock.patch.object(pdf_export, 'render_pdf_chunk', checking_render):
+            job = self.run_print()
+            self.assertEqual(job['result']['images'], 1)
+            self.assertEqual(self.run_print()['result']['images'], 0)
+
+        self.assertEqual(sources, ['../../chan/print/6_1157x0.jpg'])
+        with Image.open(os.path.join(self.temp_dir, 'chan', 'print', '6_1157x0.jpg')) as img:
+            self.assertEqual(img.size, (1157, 868))
+
+    def test_print_in_process_pool(self):
+        """Куски рендерятся в пуле процессов и склеиваются в исходном порядке"""
+        with mock.patch.object(pdf_export, 'PDF_WORKERS', 2):
+            job = self.run_print()
+
+        reader = PdfReader(job['result']['path'])
+        self.assertEqual(len(reader.pages), 8)
+        self.assertEqual([item.title for item in reader.outline if not isinstance(item, list)],
+                         ['2024-01-01 — 2024-01-02', '2024-01-03 — 2024-01-04', '2024-01-05'])
+
+    def test_print_missing_channel(self):
+        self.assertEqual(self.client.get('/api/channels/missing/print').status_code, 404)
+
+    def test_print_already_running(self):
+        """Второй экспорт PDF канала не запускается, пока идёт первый: они пишут в одни файлы"""
+        with self.app.app_context():
+            now = time.time()
+            db.session.add(Job(id='job1', kind='export_pdf', key='chan', status='running',
+                               details={'channel_id': 'chan'}, progress={}, created_at=now, updated_at=now))
+            db.session.commit()
+        response = self.client.get('/api/channels/chan/print')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['job_id'], 'job1')
+
+    def test_cleaned_css_is_cached_until_file_changes(self):
+        """CSS очищается один раз и пересчитывается только после изменения файла"""
+        with mock.patch.object(pdf_export, 'clean_css_for_pdf', wraps=pdf_export.clean_css_for_pdf) as clean:
+            for _ in range(3):
+                self.assertEqual(pdf_export.cleaned_pdf_css(self.css_path), '.post { color: black; }')
+            self.assertEqual(clean.call_count, 1)
+
+            with open(self.css_path, 'w', encoding='utf-8') as f:
+                f.write('.post { color: red; }')
+            os.utime(self.css_path, (0, os.path.getmtime(self.css_path) + 10))
+            self.assertEqual(pdf_export.cleaned_pdf_css(self.css_path), '.post { color: red; }')
+            self.assertEqual(clean.call_count, 2)
+
+    @unittest.skipUnless(importlib.util.find_spec('weasyprint'), 'нужен WeasyPrint')
+    def test_render_reuses_parsed_stylesheet(self):
+        """Разобранный CSS и FontConfiguration переиспользуются между рендерами"""
+        try:
+            import weasyprint  # noqa: F401  (нужны системные библиотеки Pango)
+        except OSError as e:
+            self.skipTest(f'WeasyPrint недоступен: {e}')
+
+        self.assertIs(pdf_export.get_stylesheet(self.css_path), pdf_export.get_stylesheet(self.css_path))
+        self.assertIs(pdf_export.get_font_config(), pdf_export.get_font_config())
+
+        html_path = os.path.join(self.temp_dir, 'chunk.html')
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write('<html><body><div class="post">Пост</div></body></html>')
+        rendered = render_pdf_chunk(html_path, os.path.join(self.temp_dir, 'chunk.pdf'), self.css_path)
+        self.assertEqual(rendered['pages'], 1)
+        self.assertEqual(set(rendered['timings']), {'css', 'layout', 'write'})
+
+
+if __name__ == '__main__':
+    unittest.main()
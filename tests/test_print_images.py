@@ -0,0 +1,112 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# Ensure required environment variables exist before importing project modules
+os.environ.setdefault("API_ID", "123456")
+os.environ.setdefault("API_HASH", "testhash")
+os.environ.setdefault("PHONE", "+10000000000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from PIL import Image
+
+from utils.print_images import assign_print_images, box_px, make_print_image
+
+
+def photo(telegram_id, media_url, media_type='MessageMediaPhoto', mime_type=None):
+    return {'telegram_id': telegram_id, 'media_url': media_url, 'media_type': media_type, 'mime_type': mime_type}
+
+
+class PrintImagesTests(unittest.TestCase):
+    def setUp(self):
+        self.downloads = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.downloads, ignore_errors=True)
+        os.makedirs(os.path.join(self.downloads, 'chan', 'media'))
+
+    def make_image(self, name, size, mode='RGB'):
+        path = os.path.join(self.downloads, 'chan', 'media', name)
+        Image.new(mode, size, 'red').save(path)
+        return path
+
+    def test_box_px(self):
+        """Размер ячейки в процентах ширины колонки переводится в пиксели при заданном DPI"""
+        self.assertEqual(box_px(100, dpi=72), (555, 0))
+        self.assertEqual(box_px(50, 25, dpi=144), (555, 278))
+
+    def test_assign_uses_layout_cells(self):
+        """Фото альбома получают копии размером своих ячеек, одиночный пост — на всю колонку"""
+        for name in ('1.jpg', '2.jpg', '3.jpg'):
+            self.make_image(name, (10, 10))
+        album = {
+            'type': 'group',
+            'media': [photo(1, 'chan/media/1.jpg'), photo(2, 'chan/media/2.jpg')],
+            'layout': {'total_width': 100, 'total_height': 50, 'cells': [
+                {'x': 0, 'y': 0, 'width': 60, 'height': 50, 'image_index': 1},
+                {'x': 60, 'y': 0, 'width': 40, 'height': 50, 'image_index': 0}
+            ]},
+            'comments': [{'type': 'post', 'post': photo(9, 'chan/media/missing.jpg'), 'comments': []}]
+        }
+        single = {'type': 'post', 'post': photo(3, 'chan/media/3.jpg'), 'comments': []}
+        document = {'type': 'post', 'post': photo(4, 'chan/media/4.pdf', 'MessageMediaDocument', 'application/pdf'),
+                    'comments': []}
+        tasks = {}
+        assign_print_images([album, single, document], self.downloads, tasks, dpi=72)
+
+        self.assertEqual(album['media'][0]['print_url'], 'chan/print/1_222x278.jpg')
+        self.assertEqual(album['media'][1]['print_url'], 'chan/print/2_333x278.jpg')
+        self.assertEqual(single['post']['print_url'], 'chan/print/3_555x0.jpg')
+        # Нет исходника или не изображение — копия не нужна
+        self.assertNotIn('print_url', album['comments'][0]['post'])
+        self.assertNotIn('print_url', document['post'])
+        self.assertEqual(sorted(tasks), ['chan/print/1_222x278.jpg', 'chan/print/2_333x278.jpg', 'chan/print/3_555x0.jpg'])
+        self.assertEqual(tasks['chan/print/1_222x278.jpg']['width'], 222)
+
+    def test_make_print_image_covers_box(self):
+        """Копия уменьшается так, чтобы покрыть ячейку, и не увеличивается"""
+        source = self.make_image('big.jpg', (4000, 3000))
+        target = os.path.join(self.downloads, 'chan', 'print', 'big_400x400.jpg')
+        self.assertTrue(make_print_image(source, target, 400, 400))
+        with Image.open(target) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (533, 400)))
+
+        small = self.make_image('small.png', (100, 50), mode='RGBA')
+        target = os.path.join(self.downloads, 'chan', 'print', 'small_400x0.jpg')
+        self.assertTrue(make_print_image(small, target, 400, 0))
+        with Image.open(target) as img:
+            self.assertEqual((img.format, img.mode, img.size), ('JPEG', 'RGB', (100, 50)))
+
+    def test_make_print_image_is_cached(self):
+        """Актуальная копия не пересоздаётся; изменённый исходник — пересоздаётся"""
+        source = self.make_image('1.jpg', (800, 600))
+        target = os.path.join(self.downloads, 'chan', 'print', '1_200x0.jpg')
+        self.assertTrue(make_print_image(source, target, 200, 0))
+        self.assertFalse(make_print_image(source, target, 200, 0))
+
+        later = time.time() + 10
+        os.utime(source, (later, later))
+        self.assertTrue(make_print_image(source, target, 200, 0))
+
+    def test_broken_image_falls_back_to_original(self):
+        """Нечитаемое изображение не роняет экспорт: вместо копии берётся оригинал"""
+        source = os.path.join(self.downloads, 'chan', 'media', 'broken.jpg')
+        with open(source, 'wb') as f:
+            f.write(b'not an image')
+        target = os.path.join(self.downloads, 'chan', 'print', 'broken_200x0.jpg')
+        with self.assertLogs(level='WARNING'):
+            self.assertFalse(make_print_image(source, target, 200, 0))
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), b'not an image')
+        self.assertFalse(os.path.exists(f"{target}.tmp"))
+
+        # Исходника нет (удалён до рендера) — копия просто не создаётся
+        missing = os.path.join(self.downloads, 'chan', 'media', 'missing.jpg')
+        with self.assertLogs(level='WARNING'):
+            self.assertFalse(make_print_image(missing, target + '2', 200, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
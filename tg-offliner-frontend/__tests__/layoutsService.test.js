@@ -109,4 +109,26 @@ describe('layoutsService', () => {
       );
     });
   });
+
+  describe('reloadChannelLayouts', () => {
+    test('should start channel regeneration with options', async () => {
+      api.post.mockResolvedValue({ data: { job_id: 'job1' } });
+
+      const result = await layoutsService.reloadChannelLayouts('channel456', { columns: 3, border_width: '5' });
+
+      expect(api.post).toHaveBeenCalledWith('/api/layouts/reload', {
+        channel_id: 'channel456',
+        columns: 3,
+        border_width: '5',
+      });
+      expect(result).toEqual({ job_id: 'job1' });
+    });
+
+    test('should throw error when channelId is missing', async () => {
+      await expect(layoutsService.reloadChannelLayouts(null)).rejects.toThrow(
+        'channelId is required to reload layouts'
+      );
+      expect(api.post).not.toHaveBeenCalled();
+    });
+  });
 });
\ No newline at end of file
@@ -48,20 +48,71 @@ export const usePages = () => {
   }
 
   /**
-   * Загружает все страницы канала
+   * Загружает страницы канала (все или окно limit/offset в порядке id)
    * @param {string} channelId - ID канала
-   * @returns {Promise<Array>} - Массив страниц
+   * @param {Object} options - { limit, offset }
+   * @returns {Promise<Object>} - { pages, jobId }: jobId — идущая раскладка новых постов или null
    */
-  const loadChannelPages = async (channelId) => {
+  const loadChannelPages = async (channelId, { limit, offset = 0 } = {}) => {
     try {
-      const response = await api.get(`/api/pages?channel_id=${channelId}`)
-      return response.data
+      let url = `/api/pages?channel_id=${channelId}&offset=${offset}`
+      if (limit) url += `&limit=${limit}`
+      const response = await api.get(url)
+      return { pages: response.data, jobId: response.headers['x-pages-job'] || null }
     } catch (error) {
       console.error('Error loading channel pages:', error)
       throw error
     }
   }
 
+  /**
+   * Загружает лёгкий список страниц канала без содержимого
+   * @param {string} channelId - ID канала
+   * @param {Object} options - { limit, offset }
+   * @returns {Promise<Object>} - { pages: [{ id, index, blocks, updated_at }], total, limit, offset }
+   */
+  const loadPagesSummary = async (channelId, { limit = 100, offset = 0 } = {}) => {
+    try {
+      const response = await api.get(`/api/pages/summary?channel_id=${channelId}&limit=${limit}&offset=${offset}`)
+      return response.data
+    } catch (error) {
+      console.error('Error loading pages summary:', error)
+      throw error
+    }
+  }
+
+  /**
+   * Находит страницу, на которой стоит пост
+   * @param {string} channelId - ID канала
+   * @param {number} telegramId - ID поста
+   * @returns {Promise<Object|null>} - { page_id, position } или null, если пост не размещён
+   */
+  const findPostPage = async (channelId, telegramId) => {
+    try {
+      const response = await api.get(`/api/pages/by-post?channel_id=${channelId}&telegram_id=${telegramId}`)
+      return response.data
+    } catch (error) {
+      if (error.response?.status === 404) return null
+      console.error('Error finding post page:', error)
+      throw error
+    }
+  }
+
+  /**
+   * Загружает статус фоновой раскладки постов по страницам
+   * @param {string} jobId - ID задачи из loadChannelPages
+   * @returns {Promise<Object|null>} - Статус задачи или null при ошибке
+   */
+  const loadPagesJob = async (jobId) => {
+    try {
+      const response = await api.get(`/api/jobs/${jobId}`)
+      return response.data
+    } catch (error) {
+      console.error('Error checking pages generation:', error)
+      return null
+    }
+  }
+
   /**
    * Сохраняет layout страницы (позиции блоков)
    * @param {number} pageId - ID страницы
@@ -149,6 +200,9 @@ export const usePages = () => {
     createPage,
     loadPage,
     loadChannelPages,
+    loadPagesSummary,
+    loadPagesJob,
+    findPostPage,
     saveLayout,
     deletePage,
     blocksToLayout,
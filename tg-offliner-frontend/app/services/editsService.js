@@ -15,6 +15,19 @@ export const editsService = {
     }
   },
 
+  async bulkUpsertEdits(channelId, edits) {
+    try {
+      const response = await api.post('/api/edits/bulk', {
+        channel_id: channelId,
+        edits: edits
+      })
+      return response.data
+    } catch (error) {
+      console.error('Error bulk saving edits:', error)
+      throw error
+    }
+  },
+
   async getEditForPost(telegramId, channelId) {
     try {
       const response = await api.get(`/api/edits/${telegramId}/${channelId}`)
@@ -41,6 +54,13 @@ export const editsService = {
     })
   },
 
+  async setPostsHidden(telegramIds, channelId, hidden) {
+    return this.bulkUpsertEdits(channelId, telegramIds.map(telegramId => ({
+      telegram_id: telegramId,
+      changes: { hidden: hidden.toString() }
+    })))
+  },
+
   async getPostHiddenState(telegramId, channelId) {
     try {
       const edit = await this.getEditForPost(telegramId, channelId)
@@ -44,6 +44,19 @@ export const layoutsService = {
 
     const response = await api.patch(`/api/layouts/${groupedId}/border`, payload)
 
+    return response.data
+  },
+
+  // Перегенерация layouts всех альбомов канала фоновой задачей: возвращает { job_id },
+  // прогресс — GET /api/jobs/<job_id>. options: columns, no_crop, engine, border_width;
+  // фильтры: grouped_ids, min_images, max_images, only_missing
+  async reloadChannelLayouts(channelId, options = {}) {
+    if (!channelId) {
+      throw new Error('channelId is required to reload layouts')
+    }
+
+    const response = await api.post('/api/layouts/reload', { ...options, channel_id: channelId })
+
     return response.data
   }
 }
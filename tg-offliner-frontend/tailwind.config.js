@@ -6,7 +6,9 @@ module.exports = {
     "./app/pages/**/*.vue",
     "./app/plugins/**/*.{js,ts}",
     "./app/app.vue",
-    "./app/error.vue"
+    "./app/error.vue",
+    // Шаблоны серверного экспорта (HTML/PDF) используют те же классы
+    "../templates/export/**/*.html"
   ],
   theme: {
     extend: {
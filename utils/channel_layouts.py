@@ -0,0 +1,238 @@
+"""
+Пакетная генерация layouts альбомов канала.
+
+Фото-посты всех альбомов канала читаются одним запросом (размеры — из
+media_width/media_height), существующие layouts — вторым; альбомы, у которых
+layout уже есть, не трогаются, чтобы не затереть пользовательские правки.
+Layouts остальных альбомов берутся из кэша по пропорциям фото
+(utils/layout_cache.py); каждая новая форма альбома считается один раз —
+пачками в пуле процессов, — после чего layouts записываются одной пакетной
+вставкой.
+
+Перегенерация всех layouts канала с новыми параметрами (POST /api/layouts/reload)
+выполняется фоновой задачей regenerate_layouts_job тем же путём.
+"""
+import copy
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from types import SimpleNamespace
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+
+from config import LAYOUT_BATCH_ALBUMS, LAYOUT_WORKERS
+from models import db, Layout, Post
+from utils.gallery_layout import generate_gallery_layout_from_sizes, post_image_sizes
+from utils.jobs import update_job_progress
+from utils.layout_cache import get_cached_layouts, layout_cache_key, store_layouts
+
+RELOAD_JOB_KIND = 'layouts_reload'
+
+
+def load_albums(channel_id, downloads_dir, skip_existing=True):
+    """
+    Альбомы канала с размерами фото: [(grouped_id, [(ширина, высота), ...])].
+
+    Фото берутся по telegram_id (порядок ячеек layout). Альбомы меньше чем из
+    двух фото с известным размером пропускаются. Размеры постов старого
+    импорта дозаполняются по файлам и сохраняются одним UPDATE.
+
+    :param skip_existing: Пропустить альбомы, для которых layout уже есть
+    """
+    rows = db.session.query(
+        Post.id, Post.grouped_id, Post.media_width, Post.media_height, Post.media_url, Post.thumb_url
+    ).filter(
+        Post.channel_id == channel_id,
+        Post.grouped_id.isnot(None),
+        Post.media_type == 'MessageMediaPhoto'
+    ).order_by(Post.grouped_id, Post.telegram_id)
+
+    existing = set()
+    if skip_existing:
+        existing = {grouped_id for (grouped_id,) in
+                    db.session.query(Layout.grouped_id).filter(Layout.channel_id == channel_id)}
+
+    albums = []
+    backfilled = []
+    for grouped_id, group in groupby(rows, key=lambda row: row.grouped_id):
+        if grouped_id in existing:
+            continue
+        posts = [SimpleNamespace(**row._mapping) for row in group]
+        if len(posts) < 2:
+            continue
+        missing = [post for post in posts if not (post.media_width and post.media_height)]
+        sizes = [size for _, size in post_image_sizes(posts, downloads_dir)]
+        backfilled.extend(post for post in missing if post.media_width and post.media_height)
+        if len(sizes) >= 2:
+            albums.append((grouped_id, sizes))
+
+    if backfilled:
+        db.session.execute(update(Post), [
+            {'id': post.id, 'media_width': post.media_width, 'media_height': post.media_height}
+            for post in backfilled
+        ])
+        db.session.commit()
+    return albums
+
+
+def generate_layouts_batch(albums, options=None):
+    """
+    Считает layouts пачки альбомов (выполняется в процессе пула): [(id альбома, layout или None)].
+
+    :param options: Параметры generate_gallery_layout_from_sizes (columns, no_crop, engine)
+    """
+    options = options or {}
+    return [(album_id, generate_gallery_layout_from_sizes(sizes, **options)) for album_id, sizes in albums]
+
+
+def _batches(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _generate_layouts(albums, options, workers, batch_size, on_progress=None):
+    """
+    Layouts альбомов с кэшем по форме: каждая форма, которой нет в кэше,
+    считается один раз, пачками в пуле процессов, и сохраняется в кэш.
+
+    :param on_progress: Вызывается после каждой пачки с (посчитано форм, всего форм)
+    :return: ({grouped_id: layout}, сколько альбомов взято из кэша); альбомов,
+        которые не удалось разложить, в словаре нет
+    """
+    keys = [layout_cache_key(sizes, **options) for _, sizes in albums]
+    layouts = get_cached_layouts(keys)
+    cached = sum(1 for key in keys if key in layouts)
+    shapes = list({key: sizes for key, (_, sizes) in zip(keys, albums) if key not in layouts}.items())
+    batches = _batches(shapes, batch_size)
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(batches))) if workers > 1 and len(batches) > 1 else None
+    args = (batches, [options] * len(batches))
+    results = pool.map(generate_layouts_batch, *args) if pool else map(generate_layouts_batch, *args)
+    generated = {}
+    done = 0
+    try:
+        for batch in results:
+            generated.update((key, layout) for key, layout in batch if layout)
+            done += len(batch)
+            if on_progress:
+                on_progress(done, len(shapes))
+    finally:
+        if pool:
+            pool.shutdown()
+
+    store_layouts(generated)
+    layouts.update(generated)
+    return {
+        grouped_id: copy.deepcopy(layouts[key])
+        for (grouped_id, _), key in zip(albums, keys) if key in layouts
+    }, cached
+
+
+def generate_channel_layouts(channel_id, downloads_dir, workers=None, batch_size=None):
+    """
+    Генерирует недостающие layouts альбомов канала.
+
+    :return: {'albums', 'created', 'failed', 'cached', 'timings'}; albums — альбомов без layout,
+        cached — сколько из них получили layout из кэша, timings — секунды стадий load, generate, save
+    """
+    workers = workers or LAYOUT_WORKERS
+    batch_size = batch_size or LAYOUT_BATCH_ALBUMS
+    timings = {}
+
+    started = time.perf_counter()
+    albums = load_albums(channel_id, downloads_dir)
+    timings['load'] = time.perf_counter() - started
+
+    stage_started = time.perf_counter()
+    layouts, cached = _generate_layouts(albums, {}, workers, batch_size)
+    timings['generate'] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    rows = [
+        {'grouped_id': grouped_id, 'channel_id': channel_id, 'json_data': layout}
+        for grouped_id, layout in layouts.items()
+    ]
+    if rows:
+        # grouped_id уникален: layout, созданный параллельно, не перезаписывается
+        db.session.execute(insert(Layout).on_conflict_do_nothing(index_elements=['grouped_id']), rows)
+        db.session.commit()
+    timings['save'] = time.perf_counter() - stage_started
+
+    timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    logging.info(f"Layouts канала {channel_id}: {len(rows)} из {len(albums)} альбомов, тайминги {timings}")
+    return {
+        "albums": len(albums),
+        "created": len(rows),
+        "failed": len(albums) - len(rows),
+        "cached": cached,
+        "timings": timings
+    }
+
+
+def regenerate_layouts_job(job_id, channel_id, downloads_dir, options=None, border_width=None, grouped_ids=None,
+                           min_images=None, max_images=None, only_missing=False, workers=None, batch_size=None):
+    """
+    Фоновая задача: перегенерирует layouts альбомов канала с новыми параметрами.
+
+    Существующие layouts перезаписываются одной пакетной вставкой (включая
+    пользовательские правки — это явный запрос на перегенерацию).
+
+    :param options: Параметры генерации: columns, no_crop, engine
+    :param border_width: Новая ширина рамки; None — сохранить рамку из прежнего layout
+    :param grouped_ids: Только эти альбомы
+    :param min_images: Только альбомы не меньше чем из min_images фото
+    :param max_images: Только альбомы не больше чем из max_images фото
+    :param only_missing: Только альбомы без layout
+    :return: {'albums', 'updated', 'failed', 'cached'}
+    """
+    options = options or {}
+    workers = workers or LAYOUT_WORKERS
+    batch_size = batch_size or LAYOUT_BATCH_ALBUMS
+
+    update_job_progress(job_id, stage='load')
+    albums = load_albums(channel_id, downloads_dir, skip_existing=only_missing)
+    if grouped_ids is not None:
+        wanted = {int(grouped_id) for grouped_id in grouped_ids}
+        albums = [album for album in albums if album[0] in wanted]
+    if min_images is not None:
+        albums = [album for album in albums if len(album[1]) >= min_images]
+    if max_images is not None:
+        albums = [album for album in albums if len(album[1]) <= max_images]
+
+    update_job_progress(job_id, stage='generate', albums_total=len(albums), shapes_done=0)
+    layouts, cached = _generate_layouts(
+        albums, options, workers, batch_size,
+        on_progress=lambda done, total: update_job_progress(job_id, shapes_done=done, shapes_total=total)
+    )
+
+    update_job_progress(job_id, stage='save')
+    if border_width is None:
+        borders = {
+            grouped_id: json_data.get('border_width')
+            for grouped_id, json_data in db.session.query(Layout.grouped_id, Layout.json_data).filter(
+                Layout.channel_id == channel_id
+            ) if grouped_id in layouts and json_data
+        }
+    for grouped_id, layout in layouts.items():
+        border = str(border_width) if border_width is not None else borders.get(grouped_id)
+        if border is not None:
+            layout['border_width'] = border
+
+    rows = [
+        {'grouped_id': grouped_id, 'channel_id': channel_id, 'json_data': layout}
+        for grouped_id, layout in layouts.items()
+    ]
+    if rows:
+        stmt = insert(Layout)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['grouped_id'],
+            set_={'channel_id': stmt.excluded.channel_id, 'json_data': stmt.excluded.json_data}
+        )
+        db.session.execute(stmt, rows)
+        db.session.commit()
+
+    update_job_progress(job_id, stage='done', albums_done=len(rows))
+    logging.info(f"Перегенерация layouts канала {channel_id}: {len(rows)} из {len(albums)} альбомов, "
+                 f"из кэша {cached}, параметры {options}")
+    return {"albums": len(albums), "updated": len(rows), "failed": len(albums) - len(rows), "cached": cached}
@@ -0,0 +1,68 @@
+"""
+Статусы загрузки (импорта) каналов.
+
+Хранятся в таблице download_statuses, а не в памяти процесса, чтобы статус и
+команда остановки были видны всем воркерам gunicorn.
+"""
+import time
+
+from models import db, DownloadStatus
+
+
+def _to_dict(row):
+    return {
+        'status': row.status,
+        'details': dict(row.details or {}),
+        'timestamp': row.timestamp
+    }
+
+
+def set_download_status(channel_id, status, details=None):
+    """Устанавливает статус загрузки канала"""
+    row = db.session.get(DownloadStatus, channel_id)
+    if row is None:
+        row = DownloadStatus(channel_id=channel_id)
+        db.session.add(row)
+    row.status = status  # 'downloading', 'stopped', 'completed', 'error'
+    row.details = details or {}
+    row.timestamp = time.time()
+    db.session.commit()
+
+
+def update_download_progress(channel_id, posts_processed=0, total_posts=0, comments_processed=0):
+    """Обновляет прогресс загрузки канала"""
+    row = db.session.get(DownloadStatus, channel_id)
+    if row is None:
+        return
+    details = dict(row.details or {})
+    details.update({
+        'posts_processed': posts_processed,
+        'total_posts': total_posts,
+        'comments_processed': comments_processed
+    })
+    row.details = details
+    db.session.commit()
+
+
+def get_download_status(channel_id):
+    """Получает статус загрузки канала"""
+    row = db.session.get(DownloadStatus, channel_id)
+    return _to_dict(row) if row else None
+
+
+def get_all_download_statuses():
+    """Возвращает статусы всех загрузок в виде {channel_id: status}"""
+    return {row.channel_id: _to_dict(row) for row in DownloadStatus.query.all()}
+
+
+def clear_download_status(channel_id):
+    """Удаляет статус загрузки канала. Возвращает True, если он был."""
+    deleted = DownloadStatus.query.filter_by(channel_id=channel_id).delete()
+    db.session.commit()
+    return deleted > 0
+
+
+def should_stop_download(channel_id):
+    """Проверяет, нужно ли остановить загрузку"""
+    status = get_download_status(channel_id)
+    return bool(status) and status.get('status') == 'stopped'
@@ -1,38 +1,80 @@
 import json
 import os
-from photocollage import collage
-from PIL import Image
+from bisect import bisect_left
 
-def generate_gallery_layout(image_paths, width=100, border=10, columns=None, no_crop=False):
+# Движки раскладки: justified — детерминированная раскладка по рядам на NumPy
+# (utils/justified_layout.py), photocollage — колоночный коллаж, auto — justified
+# для альбомов до JUSTIFIED_MAX_IMAGES фото, photocollage для больших.
+# По умолчанию — photocollage: у justified columns означает максимум фото в ряду,
+# а no_crop не нужен, поэтому он включается только явным engine
+LAYOUT_ENGINES = ('auto', 'justified', 'photocollage')
+DEFAULT_LAYOUT_ENGINE = 'photocollage'
+JUSTIFIED_MAX_IMAGES = 10
+
+
+def generate_gallery_layout(image_paths, width=100, border=10, columns=None, no_crop=False, engine=None):
     """
-    Генерирует layout для галереи изображений.
+    Генерирует layout для галереи изображений по файлам.
+
+    Размеры читаются из заголовков файлов; если размеры уже известны
+    (media_width/media_height поста), используйте generate_gallery_layout_from_sizes.
 
     :param image_paths: Список путей к изображениям
     :param width: Ширина контейнера (пиксели)
     :param border: Отступы между изображениями (пиксели)
     :param columns: Количество колонок (1-4) или None для авто-режима
     :param no_crop: Если True, не кропить изображения и использовать masonry-style layout
+    :param engine: Движок раскладки из LAYOUT_ENGINES (по умолчанию photocollage)
     :return: Словарь с данными layout или None при ошибке
     """
     if len(image_paths) < 2:
         return None  # Не генерируем layout для одного изображения
 
+    # Pillow нужен только при генерации: не загружаем его при импорте модуля
+    from PIL import Image
+
+    sizes = []
     try:
-        # Загружаем изображения
-        images_info = []
         for path in image_paths:
             if os.path.exists(path):
                 with Image.open(path) as img:
-                    images_info.append({
-                        'path': path,
-                        'width': img.width,
-                        'height': img.height
-                    })
+                    sizes.append((img.width, img.height))
             else:
                 print(f"Warning: Image not found: {path}")
                 return None
+    except Exception as e:
+        print(f"Error generating gallery layout: {e}")
+        return None
+
+    return generate_gallery_layout_from_sizes(sizes, width, border, columns, no_crop, engine)
+
+
+def generate_gallery_layout_from_sizes(sizes, width=100, border=10, columns=None, no_crop=False, engine=None):
+    """
+    Генерирует layout для галереи по размерам изображений, не открывая файлы.
+
+    :param sizes: Список (ширина, высота) изображений в порядке галереи
+    :param width: Ширина контейнера (пиксели)
+    :param border: Отступы между изображениями (пиксели)
+    :param columns: Количество колонок (1-4) или None для авто-режима
+    :param no_crop: Если True, не кропить изображения и использовать masonry-style layout
+    :param engine: Движок раскладки из LAYOUT_ENGINES (по умолчанию photocollage)
+    :return: Словарь с данными layout или None при ошибке
+    """
+    if len(sizes) < 2:
+        return None  # Не генерируем layout для одного изображения
 
-        if len(images_info) < 2:
+    engine = engine or DEFAULT_LAYOUT_ENGINE
+    if engine not in LAYOUT_ENGINES:
+        raise ValueError(f"Unknown layout engine: {engine}")
+
+    try:
+        images_info = [
+            {'path': str(index), 'width': img_width, 'height': img_height}
+            for index, (img_width, img_height) in enumerate(sizes)
+        ]
+        if any(not info['width'] or not info['height'] for info in images_info):
+            print("Warning: Image size is unknown")
             return None
 
         # Если выбрана 1 колонка - просто выстраиваем картинки одна под другой без кадрирования
@@ -61,10 +103,22 @@ def generate_gallery_layout(image_paths, width=100, border=10, columns=None, no_
                 current_y += scaled_height
             
             layout_data['total_height'] = current_y
-            print(f"Generated single-column layout for {len(images_info)} images without cropping")
+            return layout_data
+
+        if engine == 'justified' or (engine == 'auto' and len(sizes) <= JUSTIFIED_MAX_IMAGES):
+            # Ряды не кадрируют фото, поэтому no_crop выполняется автоматически;
+            # columns задаёт максимум фото в ряду
+            from utils.justified_layout import justified_layout
+
+            max_per_row = columns if columns is not None and 2 <= columns <= 4 else None
+            layout_data = justified_layout(sizes, width, max_per_row)
+            _normalize_layout(layout_data)
             return layout_data
 
         # Для остальных случаев используем photocollage
+        # (нужен только при генерации: не загружаем его при импорте модуля)
+        from photocollage import collage
+
         photos = []
         for img_info in images_info:
             photo = collage.Photo(img_info['path'], img_info['width'], img_info['height'])
@@ -134,8 +188,6 @@ def generate_gallery_layout(image_paths, width=100, border=10, columns=None, no_
 
         _normalize_layout(layout_data)
 
-        print(f"Generated layout with {len(layout_data['cells'])} cells")
-        print(f"Gallery layout generated for {len(photos)} images")
         return layout_data
 
     except Exception as e:
@@ -171,8 +223,15 @@ def _normalize_layout(layout_data, precision=6):
         sorted_edges = sorted(edges)
 
         def snap_int(value: float) -> int:
+            # Ближайшая граница бинарным поиском; при равенстве — меньшая
             raw = int(round(value * scale))
-            return min(sorted_edges, key=lambda edge: abs(edge - raw))
+            index = bisect_left(sorted_edges, raw)
+            if index == 0:
+                return sorted_edges[0]
+            if index == len(sorted_edges):
+                return sorted_edges[-1]
+            lower, upper = sorted_edges[index - 1], sorted_edges[index]
+            return lower if raw - lower <= upper - raw else upper
 
         for cell in cells:
             start_int = snap_int(cell[start_key])
@@ -188,3 +247,49 @@ def _normalize_layout(layout_data, precision=6):
     layout_data['total_width'] = round(int(round((layout_data.get('total_width') or 0.0) * scale)) / scale, precision)
     layout_data['total_height'] = round(int(round((layout_data.get('total_height') or 0.0) * scale)) / scale, precision)
 
+
+
+def _read_image_size(path):
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            return img.width, img.height
+    except Exception as e:
+        print(f"Warning: Cannot read image size {path}: {e}")
+        return None
+
+
+def post_image_sizes(posts, downloads_dir):
+    """
+    Размеры фото постов альбома для generate_gallery_layout_from_sizes.
+
+    Размеры берутся из media_width/media_height, которые сохраняются при импорте.
+    Посты, импортированные раньше, дозаполняются один раз по заголовку оригинала
+    (коммит сессии — на вызывающем коде); если оригинала нет, используется
+    превью — его пропорции те же, но в БД такой размер не записывается.
+
+    :param posts: Посты альбома в порядке вывода
+    :param downloads_dir: Папка downloads, от которой отсчитываются media_url и thumb_url
+    :return: Список (post, (ширина, высота)); посты без размеров и файлов пропускаются
+    """
+    result = []
+    for post in posts:
+        if post.media_width and post.media_height:
+            result.append((post, (post.media_width, post.media_height)))
+            continue
+
+        size = None
+        if post.media_url:
+            media_path = os.path.join(downloads_dir, post.media_url.lstrip('/'))
+            if os.path.exists(media_path):
+                size = _read_image_size(media_path)
+                if size:
+                    post.media_width, post.media_height = size
+        if not size and post.thumb_url:
+            thumb_path = os.path.join(downloads_dir, post.thumb_url.lstrip('/'))
+            if os.path.exists(thumb_path):
+                size = _read_image_size(thumb_path)
+        if size:
+            result.append((post, size))
+    return result
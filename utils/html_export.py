@@ -0,0 +1,584 @@
+"""
+Серверный рендер ленты канала в HTML для экспорта (HTML и PDF).
+
+Шаблоны templates/export повторяют разметку Wall.vue/Post.vue/Group.vue в режиме
+экспорта. Посты читаются из БД порциями и сразу пишутся в файл через
+Template.generate(), поэтому ни SSR-сервер, ни разбор готового документа
+через BeautifulSoup не нужны, а память не растёт с размером канала.
+"""
+import glob
+import hashlib
+import html
+import itertools
+import json
+import os
+import re
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from sqlalchemy import and_, func
+
+from models import db, Post, Channel, Edit, Layout
+from utils.date_utils import format_message_date
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'export')
+
+BATCH_SIZE = 500  # Сколько постов ленты обрабатывается за одну порцию запросов
+PAGE_SIZE = 200  # Элементов ленты на страницу постраничного экспорта
+PAGINATE_MODES = ('count', 'month')  # По числу элементов или по месяцам
+SEARCH_INDEX_FILE = 'search-index.json'
+MANIFEST_FILE = 'export-manifest.json'  # Хэши страниц прошлого экспорта
+QUOTE_LENGTH = 100  # Длина цитаты оригинального поста (как в PostQuote.vue)
+
+# Значения changes.hidden, которые считаются "скрыт" (как в api/posts.py)
+HIDDEN_VALUES = ('true', '1')
+
+SHORT_MONTHS = {
+    1: "янв.", 2: "февр.", 3: "мар.", 4: "апр.", 5: "мая", 6: "июн.",
+    7: "июл.", 8: "авг.", 9: "сент.", 10: "окт.", 11: "нояб.", 12: "дек."
+}
+LONG_MONTHS = {
+    1: "января", 2: "февраля", 3: "марта", 4: "апреля", 5: "мая", 6: "июня",
+    7: "июля", 8: "августа", 9: "сентября", 10: "октября", 11: "ноября", 12: "декабря"
+}
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_EMOTICON_RE = re.compile(r"emoticon='(.*?)'")
+
+
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def message_date(value):
+    """Дата в шапке поста: '9 апреля 2025 22:47' (formatMessageDate)."""
+    if not value:
+        return format_message_date(None)
+    parsed = _parse_date(value)
+    return format_message_date(parsed) if parsed else value
+
+
+def quote_date(value):
+    """Дата в цитате: '9 апр., 22:47'."""
+    parsed = _parse_date(value)
+    if not parsed:
+        return value or ''
+    return f"{parsed.day} {SHORT_MONTHS[parsed.month]}, {parsed.strftime('%H:%M')}"
+
+
+def cover_date(value):
+    """Дата создания канала: '9 апреля 2025 г.'."""
+    parsed = _parse_date(value)
+    if not parsed:
+        return value or ''
+    return f"{parsed.day} {LONG_MONTHS[parsed.month]} {parsed.year} г."
+
+
+def truncate_message(message):
+    """Обрезает цитату по словам до QUOTE_LENGTH символов текста."""
+    if not message:
+        return ''
+    text_only = _TAG_RE.sub('', message)
+    if len(text_only) <= QUOTE_LENGTH:
+        return message
+    truncated = text_only[:QUOTE_LENGTH]
+    last_space = truncated.rfind(' ')
+    return (truncated[:last_space] if last_space > 0 else truncated) + '...'
+
+
+def parse_reactions(reactions):
+    """Список {'reaction', 'count'} для отображения (PostReactions.vue)."""
+    if not reactions or not reactions.get('recent_reactions'):
+        return []
+    parsed = []
+    for reaction in reactions['recent_reactions']:
+        reaction_str = str(reaction.get('reaction', '')).replace('\\u200d', '+').replace('\u200d', '+')
+        emoji = _EMOTICON_RE.search(reaction_str)
+        if emoji:
+            reaction_str = emoji.group(1)
+        elif 'ReactionPaid' in reaction_str:
+            reaction_str = '⭐'
+        parsed.append({'reaction': reaction_str, 'count': reaction.get('count')})
+    return parsed
+
+
+def plural(count, one, few, many):
+    """Склонение существительного после числа: 1 пост, 2 поста, 5 постов."""
+    if count == 1:
+        return one
+    if 2 <= count <= 4:
+        return few
+    return many
+
+
+def format_subscribers(value):
+    """Количество подписчиков в виде 1.2K / 3.4M."""
+    try:
+        num = int(value)
+    except (TypeError, ValueError):
+        return value
+    if num >= 1000000:
+        return f"{num / 1000000:.1f}M"
+    if num >= 1000:
+        return f"{num / 1000:.1f}K"
+    return str(num)
+
+
+def initials(name):
+    """Инициалы канала для заглушки аватара."""
+    if not name:
+        return '?'
+    return ''.join(word[:1].upper() for word in name.split(' '))[:2]
+
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(['html']),
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+_env.filters.update({
+    'message_date': message_date,
+    'quote_date': quote_date,
+    'cover_date': cover_date,
+    'truncate_message': truncate_message,
+    'reactions': parse_reactions,
+    'subscribers': format_subscribers,
+    'initials': initials,
+})
+_env.globals['plural'] = plural
+_templates_hash = None
+
+
+def _post_view(post, changes):
+    """Словарь поста для шаблона с наложенными правками (message, reactions, hidden)."""
+    changes = changes or {}
+    return {
+        "telegram_id": post.telegram_id,
+        "channel_id": post.channel_id,
+        "date": post.date,
+        "message": changes.get('message', post.message),
+        "media_url": post.media_url,
+        "thumb_url": post.thumb_url,
+        "media_type": post.media_type,
+        "mime_type": post.mime_type,
+        "author_name": post.author_name,
+        "author_avatar": post.author_avatar,
+        "author_link": post.author_link,
+        "repost_author_name": post.repost_author_name,
+        "repost_author_avatar": post.repost_author_avatar,
+        "repost_author_link": post.repost_author_link,
+        "reactions": changes.get('reactions', post.reactions),
+        "grouped_id": post.grouped_id,
+        "reply_to": post.reply_to,
+        "hidden": str(changes.get('hidden', False)).lower() in HIDDEN_VALUES
+    }
+
+
+def _posts_query():
+    return db.session.query(Post, Edit.changes).outerjoin(Edit, and_(
+        Edit.channel_id == Post.channel_id,
+        Edit.telegram_id == Post.telegram_id
+    ))
+
+
+def _group_items(views):
+    """
+    Собирает посты в элементы ленты: одиночный пост или альбом (grouped_id).
+
+    Посты альбома идут подряд (у них одна дата), поэтому хватает одного прохода.
+    """
+    item = None
+    for view in views:
+        grouped_id = view['grouped_id']
+        if grouped_id and item and item['type'] == 'group' and item['grouped_id'] == grouped_id:
+            item['posts'].append(view)
+            continue
+        if item:
+            yield item
+        if grouped_id:
+            item = {'type': 'group', 'grouped_id': grouped_id, 'posts': [view]}
+        else:
+            item = {'type': 'post', 'post': view}
+    if item:
+        yield item
+
+
+def _finalize_item(item, layouts, originals, comments):
+    """Дополняет элемент ленты данными, которые выбираются порцией."""
+    if item['type'] == 'group':
+        posts = sorted(item['posts'], key=lambda view: view['telegram_id'])
+        item['posts'] = posts
+        item['first'] = next((view for view in posts if view['message'] and view['message'].strip()), posts[0])
+        item['media'] = [view for view in posts if view['media_url'] and view['media_type']]
+        item['layout'] = layouts.get((posts[0]['channel_id'], item['grouped_id']))
+        head = posts[0]
+    else:
+        head = item['post']
+        item['hidden'] = head['hidden']
+    item['original'] = originals.get(head['reply_to']) if head['reply_to'] else None
+    item['comments'] = comments.get(head['telegram_id'], []) if comments is not None else []
+    return item
+
+
+def _comment_items(comment_views, layouts):
+    """Комментарии одного поста: своя лента в хронологическом порядке, цитаты внутри ветки."""
+    by_id = {view['telegram_id']: view for view in comment_views}
+    return [_finalize_item(item, layouts, by_id, None) for item in _group_items(comment_views)]
+
+
+def iter_wall_items(channel, sort_order=None):
+    """
+    Отдаёт элементы ленты канала в порядке отображения.
+
+    Основные посты читаются одним курсором, а для каждой порции из BATCH_SIZE
+    элементов тремя запросами подгружаются layouts альбомов, цитируемые посты
+    и комментарии из дискуссионной группы.
+    """
+    sort_order = sort_order or (channel.changes or {}).get('sortOrder') or 'desc'
+    discussion_id = str(channel.discussion_group_id) if channel.discussion_group_id else None
+    order = (Post.date.desc(), Post.telegram_id.desc()) if sort_order == 'desc' else (Post.date.asc(), Post.telegram_id.asc())
+
+    rows = _posts_query().filter(Post.channel_id == channel.id).order_by(*order).yield_per(BATCH_SIZE)
+    items = _group_items(_post_view(post, changes) for post, changes in rows)
+
+    while True:
+        batch = list(itertools.islice(items, BATCH_SIZE))
+        if not batch:
+            break
+
+        # Комментарии и цитата альбома относятся к его первому сообщению
+        heads = [
+            min(item['posts'], key=lambda view: view['telegram_id']) if item['type'] == 'group' else item['post']
+            for item in batch
+        ]
+
+        comment_views = {}
+        if discussion_id:
+            targets = {head['telegram_id'] for head in heads}
+            comment_rows = (
+                _posts_query()
+                .filter(Post.channel_id == discussion_id, Post.reply_to.in_(targets))
+                .order_by(Post.date.asc(), Post.telegram_id.asc())
+            )
+            for post, changes in comment_rows:
+                comment_views.setdefault(post.reply_to, []).append(_post_view(post, changes))
+
+        grouped = {(view['channel_id'], view['grouped_id'])
+                   for view in itertools.chain(heads, *comment_views.values()) if view['grouped_id']}
+        layouts = {}
+        if grouped:
+            for layout in Layout.query.filter(Layout.grouped_id.in_({key[1] for key in grouped})):
+                layouts[(layout.channel_id, layout.grouped_id)] = layout.json_data
+
+        reply_ids = {head['reply_to'] for head in heads if head['reply_to']}
+        originals = {}
+        if reply_ids:
+            for post, changes in _posts_query().filter(Post.channel_id == channel.id, Post.telegram_id.in_(reply_ids)):
+                originals[post.telegram_id] = _post_view(post, changes)
+
+        comments = {target: _comment_items(views, layouts) for target, views in comment_views.items()}
+        for item in batch:
+            yield _finalize_item(item, layouts, originals, comments)
+
+
+def channel_counts(channel):
+    """Количество постов (альбом считается одним постом) и комментариев, как в обложке канала."""
+    channel_ids = [channel.id]
+    if channel.discussion_group_id:
+        channel_ids.append(str(channel.discussion_group_id))
+    scope = Post.channel_id.in_(channel_ids)
+
+    singles = db.session.query(func.count(Post.id)).filter(
+        scope, Post.grouped_id.is_(None), Post.reply_to.is_(None)).scalar()
+    albums = db.session.query(func.count(func.distinct(Post.grouped_id))).filter(
+        scope, Post.grouped_id.isnot(None), Post.reply_to.is_(None)).scalar()
+    comments = db.session.query(func.count(Post.id)).filter(scope, Post.reply_to.isnot(None)).scalar()
+    return singles + albums, comments
+
+
+def render_channel_html(channel, output, mode='html', media_prefix='../'):
+    """
+    Рендерит ленту канала и пишет HTML в открытый текстовый файл по частям.
+
+    :param channel: Объект Channel
+    :param output: Файл, открытый на запись (или любой объект с write)
+    :param mode: 'html' — автономная страница, 'pdf' — HTML для WeasyPrint
+    :param media_prefix: Путь от HTML-файла до папки downloads
+    """
+    posts_count, comments_count = channel_counts(channel)
+    template = _env.get_template('channel.html')
+    stream = template.generate(
+        channel=channel,
+        items=iter_wall_items(channel),
+        posts_count=posts_count,
+        comments_count=comments_count,
+        pdf=mode == 'pdf',
+        stylesheet='./styles-pdf.css' if mode == 'pdf' else './styles.css',
+        media_prefix=media_prefix
+    )
+    for chunk in stream:
+        output.write(chunk)
+
+
+def write_channel_html(channel_id, html_path, mode='html', media_prefix='../'):
+    """
+    Создаёт HTML-файл экспорта канала (по умолчанию файл лежит в downloads/<channel_id>/).
+
+    :return: Путь к файлу или None, если канала нет в базе
+    """
+    channel = db.session.get(Channel, channel_id)
+    if channel is None:
+        return None
+    with open(html_path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+        render_channel_html(channel, f, mode=mode, media_prefix=media_prefix)
+    return html_path
+
+
+def _search_entries(item, page_file):
+    """Записи поискового индекса для элемента ленты и его комментариев."""
+    views = item['posts'] if item['type'] == 'group' else [item['post']]
+    head = views[0]
+    text = ' '.join(html.unescape(_TAG_RE.sub('', view['message'])) for view in views if view['message'])
+    if text.strip():
+        yield {
+            'page': page_file,
+            'anchor': f"post-{head['channel_id']}-{head['telegram_id']}",
+            'channel_id': head['channel_id'],
+            'telegram_id': head['telegram_id'],
+            'date': head['date'],
+            'text': text.strip()
+        }
+    for comment in item['comments']:
+        if not comment.get('hidden'):
+            yield from _search_entries(comment, page_file)
+
+
+def _template_digest():
+    """Хэш шаблонов экспорта: правка шаблона инвалидирует все страницы."""
+    global _templates_hash
+    if _templates_hash is None:
+        digest = hashlib.sha1()
+        for path in sorted(glob.glob(os.path.join(TEMPLATES_DIR, '*.html'))):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _templates_hash = digest.hexdigest()
+    return _templates_hash
+
+
+def page_digest(items, *context):
+    """
+    Хэш входных данных страницы: элементы ленты (посты с правками, альбомы
+    с layout, комментарии, цитаты), контекст страницы и версия шаблонов.
+    """
+    digest = hashlib.sha1(_template_digest().encode())
+    digest.update(json.dumps(context, default=str, ensure_ascii=False).encode('utf-8'))
+    for item in items:
+        digest.update(json.dumps(item, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    """Манифест прошлого экспорта ({} если его нет или он повреждён)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _item_head(item):
+    return item['posts'][0] if item['type'] == 'group' else item['post']
+
+
+def _iter_pages(channel, paginate, per_page):
+    """
+    Делит видимые элементы ленты на страницы и отдаёт (month, items, has_next).
+
+    В памяти держатся две страницы: текущая и следующая, чтобы знать,
+    нужна ли ссылка "вперёд".
+    """
+    def pages():
+        items, month = [], None
+        for item in iter_wall_items(channel):
+            if item.get('hidden'):
+                continue
+            item_month = (_item_head(item)['date'] or '')[:7] if paginate == 'month' else None
+            if items and ((paginate == 'month' and item_month != month)
+                          or (paginate == 'count' and len(items) >= per_page)):
+                yield month, items
+                items = []
+            items.append(item)
+            month = item_month
+        if items:
+            yield month, items
+
+    previous = None
+    for page in pages():
+        if previous is not None:
+            yield previous + (True,)
+        previous = page
+    if previous is not None:
+        yield previous + (False,)
+
+
+def _page_info(number, file, items, month=None):
+    return {
+        'number': number,
+        'file': file,
+        'count': len(items),
+        'first_date': _item_head(items[0])['date'],
+        'last_date': _item_head(items[-1])['date'],
+        'month': month
+    }
+
+
+def remove_pages_after(output_dir, pattern, count):
+    """Удаляет страницы прошлого экспорта с номерами больше count."""
+    for path in glob.glob(os.path.join(output_dir, pattern)):
+        number = re.search(r'(\d+)\.\w+$', path)
+        if number and int(number.group(1)) > count:
+            os.remove(path)
+
+
+def export_channel_pages(channel, output_dir, paginate='count', per_page=PAGE_SIZE, media_prefix='../', force=False):
+    """
+    Постраничный автономный экспорт: page-0001.html, ..., index.html и search-index.json.
+
+    Экспорт инкрементальный: для каждой страницы считается хэш входных данных
+    (посты, правки, layouts, комментарии, соседние страницы, шаблоны) и
+    сохраняется в export-manifest.json. Страница перерисовывается, только если
+    хэш изменился или файла нет; остальные остаются от прошлого экспорта.
+    Оглавление и поисковый индекс пишутся заново (это дёшево).
+    CSS, аватары и миниатюры общие для всех страниц и подключаются по
+    относительным путям.
+
+    :param paginate: 'count' — по per_page элементов, 'month' — по месяцам
+    :param force: Перерисовать все страницы
+    :return: Список страниц [{'number', 'file', 'count', 'first_date', 'last_date', 'month', 'rendered'}]
+    """
+    if paginate not in PAGINATE_MODES:
+        raise ValueError(f"Неизвестный режим разбиения: {paginate}")
+
+    layout = _env.get_template('_layout.html').module
+    render = _env.get_template('_post.html').module
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    previous = {} if force else load_manifest(manifest_path).get('pages', {})
+    hashes = {}
+    pages = []
+
+    search_path = os.path.join(output_dir, SEARCH_INDEX_FILE)
+    with open(search_path, 'w', encoding='utf-8', buffering=1024 * 1024) as search:
+        search.write('[')
+        first_entry = True
+        for month, items, has_next in _iter_pages(channel, paginate, per_page):
+            number = len(pages) + 1
+            page = _page_info(number, f'page-{number:04d}.html', items, month)
+            prev_file = pages[-1]['file'] if pages else None
+            next_file = f"page-{number + 1:04d}.html" if has_next else None
+            page_path = os.path.join(output_dir, page['file'])
+
+            digest = page_digest(items, channel.name, media_prefix, number, prev_file, next_file)
+            page['rendered'] = force or previous.get(page['file']) != digest or not os.path.exists(page_path)
+            if page['rendered']:
+                with open(page_path, 'w', encoding='utf-8', buffering=1024 * 1024) as handle:
+                    handle.write(layout.head(f"{channel.name} — страница {number}", './styles.css'))
+                    handle.write(layout.page_nav(number, prev_file, None))
+                    handle.write('  <div class="wall">\n')
+                    for item in items:
+                        handle.write(render.wall_item(item, media_prefix))
+                    handle.write('  </div>\n')
+                    handle.write(layout.page_nav(number, prev_file, next_file))
+                    handle.write(layout.tail())
+            hashes[page['file']] = digest
+            pages.append(page)
+
+            for item in items:
+                for entry in _search_entries(item, page['file']):
+                    search.write(('' if first_entry else ',') + '\n' + json.dumps(entry, ensure_ascii=False))
+                    first_entry = False
+        search.write('\n]\n')
+
+    # Страницы прошлого экспорта могли остаться, если их было больше
+    remove_pages_after(output_dir, 'page-*.html', len(pages))
+    save_manifest(manifest_path, {'pages': hashes})
+
+    posts_count, comments_count = channel_counts(channel)
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        for chunk in _env.get_template('index.html').generate(
+            channel=channel,
+            pages=pages,
+            posts_count=posts_count,
+            comments_count=comments_count,
+            stylesheet='./styles.css',
+            search_index=SEARCH_INDEX_FILE,
+            media_prefix=media_prefix
+        ):
+            f.write(chunk)
+    return pages
+
+
+def write_pdf_chunks(channel, output_dir, per_chunk, media_prefix='../', stylesheet='./styles-pdf.css',
+                     previous=None, prepare=None):
+    """
+    Пишет ленту для PDF отдельными HTML-файлами по per_chunk элементов.
+
+    Файлы pdf-chunk-0001.html, ... рендерятся в PDF независимо друг от друга;
+    обложка канала попадает в первый. Для каждого куска считается хэш входных
+    данных; если он совпал с previous[file], файл не пишется (changed=False).
+
+    :param stylesheet: CSS для <link>; None, если стили передаются рендереру напрямую
+    :param previous: Хэши кусков прошлого экспорта {file: hash}
+    :param prepare: Функция, дополняющая элементы куска перед хэшированием и рендером
+        (например, печатными копиями изображений)
+    :return: Список кусков [{'number', 'file', 'count', 'first_date', 'last_date', 'hash', 'changed'}]
+    """
+    layout = _env.get_template('_layout.html').module
+    render = _env.get_template('_post.html').module
+    posts_count, comments_count = channel_counts(channel)
+    cover = [channel.id, channel.name, channel.avatar, channel.subscribers, channel.creation_date,
+             channel.discussion_group_id, posts_count, comments_count]
+    previous = previous or {}
+
+    chunks = []
+    for _, items, _ in _iter_pages(channel, 'count', per_chunk):
+        number = len(chunks) + 1
+        if prepare:
+            prepare(items)
+        chunk = _page_info(number, f'pdf-chunk-{number:04d}.html', items)
+        del chunk['month']
+        chunk['hash'] = page_digest(items, channel.name, media_prefix, stylesheet, cover if number == 1 else None)
+        chunk['changed'] = previous.get(chunk['file']) != chunk['hash']
+        if chunk['changed']:
+            with open(os.path.join(output_dir, chunk['file']), 'w', encoding='utf-8', buffering=1024 * 1024) as handle:
+                handle.write(layout.head(channel.name, stylesheet, pdf=True))
+                if number == 1:
+                    handle.write(layout.cover(channel, posts_count, comments_count, media_prefix))
+                handle.write('  <div class="wall">\n')
+                for item in items:
+                    handle.write(render.wall_item(item, media_prefix))
+                handle.write('  </div>\n')
+                handle.write(layout.tail())
+        chunks.append(chunk)
+
+    if not chunks:
+        # Пустой канал: одна страница с обложкой
+        chunk = {'number': 1, 'file': 'pdf-chunk-0001.html', 'count': 0, 'first_date': None, 'last_date': None,
+                 'hash': page_digest([], channel.name, media_prefix, stylesheet, cover), 'changed': True}
+        with open(os.path.join(output_dir, chunk['file']), 'w', encoding='utf-8') as handle:
+            handle.write(layout.head(channel.name, stylesheet, pdf=True))
+            handle.write(layout.cover(channel, posts_count, comments_count, media_prefix))
+            handle.write(layout.tail())
+        chunks.append(chunk)
+    return chunks
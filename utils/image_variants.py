@@ -0,0 +1,223 @@
+"""
+Адаптивные копии фотографий для srcset.
+
+Для каждого фото канала создаются копии нескольких ширин (IMAGE_VARIANT_WIDTHS,
+но не шире оригинала) в AVIF и WebP и запасной JPEG. Файлы лежат в
+downloads/<папка канала>/variants/<имя>_<ширина>.<расширение>, а строки
+media_variants описывают их для API постов, чтобы PostMedia.vue собрал srcset.
+
+Копии создаются фоновой задачей в пуле процессов: сразу после импорта
+канала (и его дискуссионной группы) или по запросу
+POST /api/channels/<id>/variants — например, для каналов, импортированных
+до появления копий. Выдача постов задачу не запускает.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.dialects.sqlite import insert
+
+from config import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS, IMAGE_VARIANT_WORKERS
+from models import db, MediaVariant, Post
+from utils.jobs import JobAlreadyRunning, last_job, start_job, update_job_progress
+
+JOB_KIND = 'image_variants'
+VARIANTS_DIR = 'variants'
+INSERT_BATCH = 500  # Строк media_variants за один INSERT
+
+# Расширение, имя формата Pillow и параметры сохранения
+FORMATS = {
+    'avif': ('avif', 'AVIF', {'quality': 55}),
+    'webp': ('webp', 'WEBP', {'quality': 78, 'method': 4}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def available_formats(formats=IMAGE_VARIANT_FORMATS):
+    """Форматы из настроек, которые умеет кодировать установленный Pillow."""
+    from PIL import features
+
+    return tuple(fmt for fmt in formats if fmt in FORMATS and (fmt == 'jpeg' or features.check(fmt)))
+
+
+def variant_path(media_url, width, fmt):
+    """Путь копии относительно downloads: <папка канала>/variants/<имя>_<ширина>.<расширение>."""
+    folder = media_url.split('/', 1)[0]
+    stem = os.path.splitext(os.path.basename(media_url))[0]
+    return f"{folder}/{VARIANTS_DIR}/{stem}_{width}.{FORMATS[fmt][0]}"
+
+
+def make_variants(source, media_url, downloads_dir, widths, formats):
+    """
+    Создаёт копии одного фото (выполняется в процессе пула).
+
+    Ширины больше оригинала заменяются шириной оригинала. Уже существующие
+    файлы не перезаписываются.
+
+    :return: Список копий [{'width', 'height', 'format', 'path', 'size'}]; пустой, если файл не читается
+    """
+    from PIL import Image, ImageOps
+
+    variants = []
+    try:
+        with Image.open(source) as original:
+            img = ImageOps.exif_transpose(original)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            for width in sorted({min(width, img.width) for width in widths}):
+                height = max(1, round(img.height * width / img.width))
+                resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+                for fmt in formats:
+                    path = variant_path(media_url, width, fmt)
+                    target = os.path.join(downloads_dir, path)
+                    if not os.path.exists(target):
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        tmp_path = f"{target}.{os.getpid()}.tmp"
+                        _, pil_format, options = FORMATS[fmt]
+                        resized.save(tmp_path, pil_format, **options)
+                        os.replace(tmp_path, target)
+                    variants.append({
+                        'width': width,
+                        'height': height,
+                        'format': fmt,
+                        'path': path,
+                        'size': os.path.getsize(target)
+                    })
+    except OSError as e:
+        # Битое изображение не должно останавливать всю задачу
+        logging.warning(f"Не удалось создать копии {media_url}: {e}")
+        return []
+    return variants
+
+
+def _is_photo():
+    return or_(
+        Post.media_type == 'MessageMediaPhoto',
+        and_(Post.media_type == 'MessageMediaDocument', Post.mime_type.like('image/%'))
+    )
+
+
+def pending_photos(channel_ids):
+    """Запрос фото каналов, у которых ещё нет копий: (channel_id, telegram_id, media_url)."""
+    has_variants = exists().where(and_(
+        MediaVariant.channel_id == Post.channel_id,
+        MediaVariant.telegram_id == Post.telegram_id
+    ))
+    return db.session.query(Post.channel_id, Post.telegram_id, Post.media_url).filter(
+        Post.channel_id.in_(channel_ids),
+        Post.media_url.isnot(None),
+        _is_photo(),
+        ~has_variants
+    )
+
+
+def variants_by_post(channel_ids):
+    """Копии фото каналов: {(channel_id, telegram_id): [{'width', 'height', 'format', 'url'}]} по возрастанию ширины."""
+    rows = db.session.query(MediaVariant).filter(MediaVariant.channel_id.in_(channel_ids)).order_by(
+        MediaVariant.channel_id, MediaVariant.telegram_id, MediaVariant.width, MediaVariant.format
+    )
+    result = {}
+    for row in rows:
+        result.setdefault((row.channel_id, row.telegram_id), []).append({
+            'width': row.width,
+            'height': row.height,
+            'format': row.format,
+            'type': MIME_TYPES[row.format],
+            'url': row.path
+        })
+    return result
+
+
+def variants_signature(channel_ids):
+    """(количество, максимальный id) копий каналов — для ETag выдачи постов."""
+    return tuple(db.session.query(func.count(MediaVariant.id), func.max(MediaVariant.id)).filter(
+        MediaVariant.channel_id.in_(channel_ids)
+    ).one())
+
+
+def _save_variants(rows):
+    if rows:
+        db.session.execute(insert(MediaVariant).values(rows).on_conflict_do_nothing())
+        db.session.commit()
+
+
+def generate_variants_job(job_id, channel_ids, downloads_dir, workers=None):
+    """
+    Фоновая задача: создаёт копии всех фото каналов, у которых их ещё нет.
+
+    :return: {'photos', 'variants', 'bytes', 'missing'}; missing — фото без файла на диске
+    """
+    workers = workers or IMAGE_VARIANT_WORKERS
+    formats = available_formats()
+    photos = []
+    missing = 0
+    for channel_id, telegram_id, media_url in pending_photos(channel_ids):
+        source = os.path.join(downloads_dir, media_url)
+        if os.path.exists(source):
+            photos.append((channel_id, telegram_id, media_url, source))
+        else:
+            missing += 1
+    update_job_progress(job_id, stage='variants', photos_done=0, photos_total=len(photos), missing=missing)
+
+    args = (
+        [photo[3] for photo in photos],
+        [photo[2] for photo in photos],
+        [downloads_dir] * len(photos),
+        [IMAGE_VARIANT_WIDTHS] * len(photos),
+        [formats] * len(photos)
+    )
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(photos))) if workers > 1 and len(photos) > 1 else None
+    results = pool.map(make_variants, *args, chunksize=8) if pool else map(make_variants, *args)
+
+    rows = []
+    created = total_bytes = done = 0
+    try:
+        for (channel_id, telegram_id, _, _), variants in zip(photos, results):
+            done += 1
+            for variant in variants:
+                rows.append(dict(variant, channel_id=channel_id, telegram_id=telegram_id))
+                created += 1
+                total_bytes += variant['size']
+            if len(rows) >= INSERT_BATCH:
+                _save_variants(rows)
+                rows = []
+                update_job_progress(job_id, photos_done=done)
+        _save_variants(rows)
+    finally:
+        if pool:
+            pool.shutdown()
+    update_job_progress(job_id, stage='done', photos_done=done)
+    logging.info(f"Копии фото для {channel_ids}: {created} файлов, {total_bytes} байт")
+    return {"photos": done, "variants": created, "bytes": total_bytes, "missing": missing}
+
+
+def start_variants_job(channel_id, downloads_dir, app=None, retry=False):
+    """
+    Запускает генерацию копий для канала, если есть фото без копий.
+
+    Не запускает вторую задачу, пока первая выполняется, и не повторяет
+    задачу, если с прошлого запуска число ожидающих фото не изменилось
+    (например, их файлов нет на диске).
+
+    :param retry: Запустить повторно, даже если ожидающих фото столько же
+    :return: job_id или None
+    """
+    last = last_job(JOB_KIND, channel_id)
+    if last and last['status'] == 'running':
+        return None
+    pending = pending_photos([channel_id]).count()
+    if not pending:
+        return None
+    if last and last['status'] == 'completed':
+        # Ожидают только фото, которые прошлая задача уже не смогла обработать;
+        # прерванная или упавшая задача повторяется
+        unchanged = last['details'].get('pending') == pending or (last['result'] or {}).get('missing') == pending
+        if unchanged and not retry:
+            return None
+    try:
+        return start_job(JOB_KIND, generate_variants_job, [channel_id], downloads_dir, app=app,
+                         details={'channel_id': channel_id, 'pending': pending}, key=channel_id)
+    except JobAlreadyRunning:
+        return None
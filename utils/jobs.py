@@ -0,0 +1,188 @@
+"""
+Фоновые задачи: удаление каналов, тяжёлые генерации и т.п.
+
+Задача выполняется в отдельном потоке внутри app_context. Статус и прогресс
+хранятся в таблице jobs, поэтому /api/jobs/<job_id> отвечает одинаково из
+любого воркера gunicorn. Запись идёт через отдельное соединение (engine.begin),
+чтобы не коммитить незавершённую транзакцию самой задачи.
+
+Задача с ключом (key, например id канала) захватывается атомарно: частичный
+уникальный индекс ux_jobs_running_key не даёт записать вторую running-задачу
+того же типа с тем же ключом, даже если два запроса пришли одновременно.
+Потоки задач — демоны и не переживают перезапуск сервера, поэтому init_db
+помечает оставшиеся running-задачи прерванными (interrupt_running_jobs).
+"""
+import logging
+import threading
+import time
+import uuid
+
+from flask import current_app
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, Job
+
+_threads = {}  # Потоки задач этого процесса (для ожидания завершения)
+_threads_lock = threading.Lock()
+_jobs = Job.__table__
+# Условие частичного индекса ux_jobs_running_key литералом: с параметром SQLite индекс не выберет
+_running = text("jobs.status = 'running'")
+INTERRUPTED_ERROR = 'Задача прервана перезапуском сервера'
+
+
+class JobAlreadyRunning(Exception):
+    """Задача того же типа с тем же ключом уже выполняется."""
+
+    def __init__(self, job_id):
+        super().__init__(f"Задача {job_id} уже выполняется")
+        self.job_id = job_id
+
+
+def start_job(kind, target, *args, app=None, details=None, key=None, **kwargs):
+    """
+    Запускает target(job_id, *args, **kwargs) в фоновом потоке.
+
+    :param kind: Тип задачи ('delete_channel', ...)
+    :param target: Функция задачи; первым аргументом получает job_id
+    :param app: Flask-приложение для контекста задачи (по умолчанию current_app)
+    :param details: Произвольные данные задачи для отображения в статусе
+    :param key: Ключ исключительности (например, id канала): пока задача kind с этим
+        ключом выполняется, вторая не запускается
+    :return: job_id
+    :raises JobAlreadyRunning: Задача kind с ключом key уже выполняется
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(_jobs).values(
+                id=job_id,
+                kind=kind,
+                key=key,
+                status='running',  # 'running', 'completed', 'error'
+                details=details or {},
+                progress={},
+                result=None,
+                error=None,
+                created_at=now,
+                updated_at=now
+            ))
+    except IntegrityError:
+        running = running_job(kind, key)
+        raise JobAlreadyRunning(running['id'] if running else None)
+
+    app = app or current_app._get_current_object()
+
+    def runner():
+        with app.app_context():
+            try:
+                result = target(job_id, *args, **kwargs)
+                _finish_job(job_id, 'completed', result=result)
+            except Exception as e:
+                logging.exception(f"Фоновая задача {kind} ({job_id}) завершилась с ошибкой")
+                _finish_job(job_id, 'error', error=str(e))
+            finally:
+                with _threads_lock:
+                    _threads.pop(job_id, None)
+
+    thread = threading.Thread(target=runner, name=f"job-{kind}-{job_id[:8]}", daemon=True)
+    with _threads_lock:
+        _threads[job_id] = thread
+    thread.start()
+    return job_id
+
+
+def _finish_job(job_id, status, result=None, error=None):
+    """Фиксирует итоговый статус задачи."""
+    with db.engine.begin() as connection:
+        connection.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+            status=status,
+            result=result,
+            error=error,
+            updated_at=time.time()
+        ))
+
+
+def update_job_progress(job_id, **progress):
+    """Обновляет прогресс задачи (произвольные счётчики и текущая стадия)."""
+    try:
+        with db.engine.begin() as connection:
+            current = connection.execute(select(_jobs.c.progress).where(_jobs.c.id == job_id)).scalar()
+            if current is None:
+                return
+            merged = dict(current)
+            merged.update(progress)
+            connection.execute(update(_jobs).where(_jobs.c.id == job_id).values(
+                progress=merged,
+                updated_at=time.time()
+            ))
+    except OperationalError as e:
+        # Прогресс необязателен: при занятой базе пропускаем обновление
+        logging.warning(f"Не удалось обновить прогресс задачи {job_id}: {e}")
+
+
+def get_job(job_id):
+    """Возвращает статус задачи или None."""
+    with db.engine.connect() as connection:
+        row = connection.execute(select(_jobs).where(_jobs.c.id == job_id)).mappings().first()
+    return _to_dict(row) if row else None
+
+
+def running_job(kind, key):
+    """Выполняющаяся задача kind с ключом key или None (запрос по индексу, без истории задач)."""
+    query = select(_jobs).where(_jobs.c.kind == kind, _jobs.c.key == key, _running)
+    with db.engine.connect() as connection:
+        row = connection.execute(query).mappings().first()
+    return _to_dict(row) if row else None
+
+
+def last_job(kind, key):
+    """Последняя по времени создания задача kind с ключом key или None."""
+    query = select(_jobs).where(_jobs.c.kind == kind, _jobs.c.key == key)
+    with db.engine.connect() as connection:
+        row = connection.execute(query.order_by(_jobs.c.created_at.desc()).limit(1)).mappings().first()
+    return _to_dict(row) if row else None
+
+
+def interrupt_running_jobs():
+    """
+    Помечает ошибкой задачи, оставшиеся running после остановки сервера: их потоки
+    уже не существуют. Вызывается из init_db до запуска воркеров.
+
+    :return: Число прерванных задач
+    """
+    with db.engine.begin() as connection:
+        result = connection.execute(update(_jobs).where(_running).values(
+            status='error',
+            error=INTERRUPTED_ERROR,
+            updated_at=time.time()
+        ))
+    if result.rowcount:
+        logging.warning(f"Помечено прерванными фоновых задач: {result.rowcount}")
+    return result.rowcount
+
+
+def list_jobs(kind=None):
+    """Возвращает статусы всех задач (опционально только заданного типа)."""
+    query = select(_jobs).order_by(_jobs.c.created_at.asc())
+    if kind is not None:
+        query = query.where(_jobs.c.kind == kind)
+    with db.engine.connect() as connection:
+        return [_to_dict(row) for row in connection.execute(query).mappings()]
+
+
+def wait_job(job_id, timeout=None):
+    """Ожидает завершения задачи, запущенной в этом процессе, и возвращает её статус."""
+    with _threads_lock:
+        thread = _threads.get(job_id)
+    if thread is not None:
+        thread.join(timeout)
+    return get_job(job_id)
+
+
+def _to_dict(row):
+    job = dict(row)
+    job['details'] = dict(job['details'] or {})
+    job['progress'] = dict(job['progress'] or {})
+    return job
@@ -0,0 +1,95 @@
+"""
+Justified-раскладка альбома по рядам на NumPy.
+
+Фото идут по порядку и делятся на ряды; внутри ряда все фото одной высоты и
+вместе занимают всю ширину, поэтому пропорции сохраняются и ничего не
+кадрируется. Для n фото все 2^(n-1) разбиений на ряды оцениваются разом
+матричными операциями, лучшее выбирается по стоимости:
+
+    ln(H / H*)^2 + EVENNESS * дисперсия ln(высот рядов)
+
+где H — итоговая высота, H* = TARGET_HEIGHT_RATIO * ширина. Первое слагаемое
+держит альбом близким к квадрату, второе не даёт одному ряду быть намного выше
+остальных. Результат детерминирован (в отличие от photocollage) и имеет ту же
+схему cells.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+MAX_IMAGES = 10  # Больше фото — 2^(n-1) разбиений становится слишком много
+MAX_PER_ROW = 4  # Фото в ряду по умолчанию
+TARGET_HEIGHT_RATIO = 0.9  # Желаемая высота альбома относительно ширины
+EVENNESS = 0.5  # Вес разброса высот рядов
+
+
+@lru_cache(maxsize=None)
+def _partitions(count):
+    """
+    Все разбиения count фото по порядку на ряды.
+
+    :return: (membership, per_row): membership[m, i, k] — фото i в ряду k
+        в разбиении m; per_row[m, k] — число фото в ряду k
+    """
+    breaks = (np.arange(2 ** (count - 1))[:, None] >> np.arange(count - 1)) & 1
+    rows = np.zeros((len(breaks), count), dtype=np.intp)
+    rows[:, 1:] = np.cumsum(breaks, axis=1)
+    membership = (rows[:, :, None] == np.arange(count)).astype(float)
+    return membership, membership.sum(axis=1)
+
+
+def justified_layout(sizes, width=100, max_per_row=None):
+    """
+    Раскладывает фото по рядам.
+
+    :param sizes: Список (ширина, высота) фото в порядке альбома (2..MAX_IMAGES)
+    :param width: Ширина контейнера
+    :param max_per_row: Максимум фото в ряду (по умолчанию MAX_PER_ROW)
+    :return: {'total_width', 'total_height', 'image_count', 'cells'}
+    """
+    count = len(sizes)
+    if not 2 <= count <= MAX_IMAGES:
+        raise ValueError(f"justified layout поддерживает от 2 до {MAX_IMAGES} фото, передано {count}")
+    ratios = np.array([w / h for w, h in sizes], dtype=float)
+    membership, per_row = _partitions(count)
+
+    used = per_row > 0
+    ratio_sums = np.einsum('mik,i->mk', membership, ratios)
+    heights = np.where(used, width / np.where(used, ratio_sums, 1.0), 0.0)
+    total = heights.sum(axis=1)
+
+    log_heights = np.log(np.where(used, heights, 1.0))
+    rows_count = used.sum(axis=1)
+    mean = log_heights.sum(axis=1) / rows_count
+    spread = np.where(used, (log_heights - mean[:, None]) ** 2, 0.0).sum(axis=1) / rows_count
+
+    cost = np.log(total / (TARGET_HEIGHT_RATIO * width)) ** 2 + EVENNESS * spread
+    cost[per_row.max(axis=1) > (max_per_row or MAX_PER_ROW)] = np.inf
+    best = int(np.argmin(cost))
+
+    cells = []
+    y = 0.0
+    index = 0
+    for row_height, row_size in zip(heights[best].tolist(), per_row[best].astype(int).tolist()):
+        if not row_size:
+            break
+        x = 0.0
+        for _ in range(row_size):
+            cell_width = float(ratios[index]) * row_height
+            cells.append({
+                'image_index': index,
+                'x': x,
+                'y': y,
+                'width': cell_width,
+                'height': row_height
+            })
+            x += cell_width
+            index += 1
+        y += row_height
+
+    return {
+        'total_width': width,
+        'total_height': float(total[best]),
+        'image_count': count,
+        'cells': cells
+    }
@@ -0,0 +1,105 @@
+"""
+Кэш layouts альбомов по сигнатуре пропорций фото.
+
+Layout зависит только от пропорций фото и параметров генерации, поэтому
+альбомы одинаковой формы (например, четыре горизонтальных кадра с одной
+камеры) получают один и тот же layout. Ключ — sha1 от пропорций, округлённых
+до LAYOUT_CACHE_RATIO_PRECISION знаков, и параметров (engine, width, border,
+columns, no_crop). Записи хранятся в таблице layout_cache; при превышении
+LAYOUT_CACHE_SIZE удаляются давно не использованные.
+
+Явная перегенерация одного альбома (refresh=True) кэш не читает: photocollage
+случаен, и кнопка «Reload Layout» должна давать новую раскладку. Новый layout
+заменяет запись кэша, и альбомы той же формы дальше получают его.
+"""
+import copy
+import hashlib
+import time
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+
+from config import LAYOUT_CACHE_RATIO_PRECISION, LAYOUT_CACHE_SIZE
+from models import db, LayoutCache
+from utils.gallery_layout import DEFAULT_LAYOUT_ENGINE, generate_gallery_layout_from_sizes
+
+INSERT_BATCH = 500  # Записей за один INSERT
+
+
+def layout_cache_key(sizes, width=100, border=10, columns=None, no_crop=False, engine=None):
+    """Ключ кэша для альбома с размерами sizes и параметрами generate_gallery_layout_from_sizes."""
+    ratios = ','.join(f"{w / h:.{LAYOUT_CACHE_RATIO_PRECISION}f}" for w, h in sizes)
+    signature = f"{engine or DEFAULT_LAYOUT_ENGINE}|{width}|{border}|{columns}|{int(bool(no_crop))}|{ratios}"
+    return hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+
+def get_cached_layouts(keys):
+    """
+    Layouts из кэша по ключам; найденные записи помечаются использованными.
+
+    :return: {key: layout}; копии, их можно менять
+    """
+    keys = list(set(keys))
+    found = {}
+    for start in range(0, len(keys), INSERT_BATCH):
+        rows = db.session.query(LayoutCache.key, LayoutCache.json_data).filter(
+            LayoutCache.key.in_(keys[start:start + INSERT_BATCH])
+        )
+        found.update((key, json_data) for key, json_data in rows)
+    if found:
+        now = time.time()
+        db.session.execute(update(LayoutCache), [{'key': key, 'last_used': now} for key in found])
+        db.session.commit()
+    return {key: copy.deepcopy(layout) for key, layout in found.items()}
+
+
+def store_layouts(layouts, replace=False):
+    """
+    Сохраняет {key: layout} в кэш и вытесняет давно не использованные записи сверх LAYOUT_CACHE_SIZE.
+
+    :param replace: Заменять уже сохранённые записи (по умолчанию остаются прежние)
+    """
+    if not layouts:
+        return
+    now = time.time()
+    rows = [{'key': key, 'json_data': layout, 'last_used': now} for key, layout in layouts.items()]
+    for start in range(0, len(rows), INSERT_BATCH):
+        stmt = insert(LayoutCache).values(rows[start:start + INSERT_BATCH])
+        if replace:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['key'],
+                set_={'json_data': stmt.excluded.json_data, 'last_used': stmt.excluded.last_used}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing()
+        db.session.execute(stmt)
+
+    excess = db.session.query(LayoutCache).count() - LAYOUT_CACHE_SIZE
+    if excess > 0:
+        stale = db.session.query(LayoutCache.key).order_by(LayoutCache.last_used).limit(excess)
+        LayoutCache.query.filter(LayoutCache.key.in_(stale.scalar_subquery())).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def cached_gallery_layout(sizes, width=100, border=10, columns=None, no_crop=False, engine=None,
+                          refresh=False):
+    """
+    generate_gallery_layout_from_sizes с кэшем; нужен контекст приложения.
+
+    :param refresh: Сгенерировать заново, не читая кэш, и заменить запись
+    :return: Словарь с данными layout (копия, её можно менять) или None при ошибке
+    """
+    if len(sizes) < 2 or any(not w or not h for w, h in sizes):
+        return generate_gallery_layout_from_sizes(sizes, width, border, columns, no_crop, engine)
+
+    key = layout_cache_key(sizes, width, border, columns, no_crop, engine)
+    if not refresh:
+        cached = get_cached_layouts([key])
+        if key in cached:
+            return cached[key]
+
+    layout = generate_gallery_layout_from_sizes(sizes, width, border, columns, no_crop, engine)
+    if layout:
+        store_layouts({key: layout}, replace=refresh)
+        layout = copy.deepcopy(layout)
+    return layout
@@ -0,0 +1,309 @@
+"""
+Автогенерация страниц редактора (pages) для постов канала.
+
+Посты раскладываются по POSTS_PER_PAGE на страницу в сетке 2×2 (блоки 6×6)
+в порядке telegram_id. Генерация инкрементальная: фоновая задача берёт посты
+с telegram_id выше границы канала в page_grid_state, дозаполняет последнюю
+страницу с постами, если её сетку не меняли, и создаёт новые страницы окнами
+по PAGE_GRID_WINDOW, сохраняя каждое окно вместе с новой границей отдельным
+коммитом. Уже созданные страницы не перестраиваются, поэтому новые посты после
+синхронизации просто дописываются в конец. Граница не зависит от содержимого
+страниц: удалённая последняя страница не создаётся заново, а перенесённый
+с неё пост не размещается второй раз. Канал без страниц раскладывается
+с начала, как при первом открытии.
+
+Задача запускается лениво из GET /api/pages, сам запрос только читает
+сохранённые страницы. На канал идёт не больше одной задачи: она захватывается
+по ключу channel_id (start_job(key=...)), проверка перед запуском — пара
+индексных запросов.
+
+Таблица page_blocks дублирует посты из json_data страниц (страница, пост,
+позиция блока) и обновляется при каждом изменении страниц, чтобы страницу
+поста и последнюю страницу с постами можно было найти индексным запросом,
+не разбирая JSON всех страниц канала.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert
+
+from config import PAGE_GRID_WINDOW
+from models import db, Page, PageBlock, PageGridState, Post
+from utils.jobs import JobAlreadyRunning, running_job, start_job, update_job_progress
+
+JOB_KIND = 'page_grid'
+POSTS_PER_PAGE = 4
+
+# Позиции блоков в сетке 2x2 (каждый блок 6x6)
+POSITIONS = [
+    {"x": 0, "y": 0, "w": 6, "h": 6},  # Верхний левый
+    {"x": 6, "y": 0, "w": 6, "h": 6},  # Верхний правый
+    {"x": 0, "y": 6, "w": 6, "h": 6},  # Нижний левый
+    {"x": 6, "y": 6, "w": 6, "h": 6},  # Нижний правый
+]
+
+
+def _block(channel_id, telegram_id, position):
+    # id блока по telegram_id: не зависит от того, каким окном создана страница
+    return {
+        "id": f"block-{telegram_id}",
+        **POSITIONS[position],
+        "content": {
+            "channel_id": channel_id,
+            "telegram_id": telegram_id
+        }
+    }
+
+
+def _page_json(channel_id, telegram_ids):
+    now = datetime.utcnow().isoformat()
+    return {
+        "version": 1,
+        "created_at": now,
+        "updated_at": now,
+        "grid": {
+            "cellHeight": 100,
+            "columns": 12
+        },
+        "blocks": [_block(channel_id, telegram_id, i) for i, telegram_id in enumerate(telegram_ids)]
+    }
+
+
+def page_block_rows(page):
+    """Строки page_blocks страницы: блоки с постами и их позиция в json_data.blocks."""
+    rows = []
+    for position, block in enumerate((page.json_data or {}).get('blocks', [])):
+        content = block.get('content') or {}
+        try:
+            telegram_id = int(content['telegram_id'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if content.get('channel_id'):
+            rows.append({'page_id': page.id, 'channel_id': content['channel_id'],
+                         'telegram_id': telegram_id, 'position': position})
+    return rows
+
+
+def index_pages(pages):
+    """Перестраивает строки page_blocks страниц по их json_data (коммит — на вызывающем коде)."""
+    page_ids = [page.id for page in pages]
+    if not page_ids:
+        return
+    db.session.execute(delete(PageBlock).where(PageBlock.page_id.in_(page_ids)))
+    rows = [row for page in pages for row in page_block_rows(page)]
+    if rows:
+        db.session.execute(insert(PageBlock), rows)
+
+
+def unindex_pages(page_ids):
+    """Удаляет строки page_blocks страниц (коммит — на вызывающем коде)."""
+    if page_ids:
+        db.session.execute(delete(PageBlock).where(PageBlock.page_id.in_(page_ids)))
+
+
+def rebuild_page_blocks(batch_size=500):
+    """
+    Перестраивает page_blocks по json_data всех страниц. init_db вызывает её
+    один раз для баз, созданных до появления таблицы (см. PAGE_BLOCKS_VERSION).
+
+    :return: Число проиндексированных страниц
+    """
+    count = 0
+    page_ids = [page_id for (page_id,) in db.session.query(Page.id).order_by(Page.id)]
+    for start in range(0, len(page_ids), batch_size):
+        pages = Page.query.filter(Page.id.in_(page_ids[start:start + batch_size])).all()
+        index_pages(pages)
+        db.session.commit()
+        count += len(pages)
+    logging.info(f"page_blocks: проиндексировано {count} страниц")
+    return count
+
+
+def find_post_page(channel_id, telegram_id):
+    """Первая страница с постом: (page_id, позиция блока) или None."""
+    row = db.session.query(PageBlock.page_id, PageBlock.position).filter(
+        PageBlock.channel_id == channel_id,
+        PageBlock.telegram_id == telegram_id
+    ).order_by(PageBlock.page_id, PageBlock.position).first()
+    return tuple(row) if row else None
+
+
+def remove_post_blocks(channel_id, telegram_id):
+    """
+    Убирает блоки поста со всех страниц, где он стоит (коммит — на вызывающем коде).
+
+    :return: Число изменённых страниц
+    """
+    page_ids = [page_id for (page_id,) in db.session.query(PageBlock.page_id).filter(
+        PageBlock.channel_id == channel_id,
+        PageBlock.telegram_id == telegram_id
+    ).distinct()]
+    if not page_ids:
+        return 0
+    pages = Page.query.filter(Page.id.in_(page_ids)).all()
+    now = datetime.utcnow().isoformat()
+    for page in pages:
+        removed = {row['position'] for row in page_block_rows(page)
+                   if row['channel_id'] == channel_id and row['telegram_id'] == telegram_id}
+        blocks = [block for position, block in enumerate(page.json_data['blocks']) if position not in removed]
+        page.json_data = dict(page.json_data, blocks=blocks, updated_at=now)
+    index_pages(pages)
+    return len(pages)
+
+
+def _channel_blocks(column, channel_id):
+    """max(column) по блокам с постами канала на его страницах."""
+    return db.session.query(func.max(column)).join(Page, Page.id == PageBlock.page_id).filter(
+        Page.channel_id == channel_id,
+        PageBlock.channel_id == channel_id
+    ).scalar()
+
+
+def trailing_page(channel_id):
+    """Последняя страница канала, на которой есть посты, или None."""
+    page_id = _channel_blocks(PageBlock.page_id, channel_id)
+    return db.session.get(Page, page_id) if page_id is not None else None
+
+
+def placed_until(channel_id):
+    """
+    Наибольший telegram_id канала, уже разложенный по страницам, или None,
+    если раскладывать нужно с начала (страниц у канала нет).
+    """
+    if db.session.query(Page.id).filter(Page.channel_id == channel_id).first() is None:
+        return None
+    state = db.session.get(PageGridState, channel_id)
+    if state:
+        return state.placed_until
+    # Страницы собраны вручную, без задачи: граница — последний пост на них
+    return _channel_blocks(PageBlock.telegram_id, channel_id)
+
+
+def seed_page_grid_state():
+    """
+    Заполняет page_grid_state по page_blocks для каналов, страницы которых
+    созданы до её появления (вызывается из init_db один раз).
+
+    :return: Число каналов
+    """
+    rows = db.session.query(Page.channel_id, func.max(PageBlock.telegram_id)).join(
+        PageBlock, PageBlock.page_id == Page.id
+    ).filter(PageBlock.channel_id == Page.channel_id).group_by(Page.channel_id).all()
+    for channel_id, telegram_id in rows:
+        db.session.merge(PageGridState(channel_id=channel_id, placed_until=telegram_id))
+    db.session.commit()
+    return len(rows)
+
+
+def _new_posts(channel_id, after, limit):
+    query = db.session.query(Post.telegram_id).filter(Post.channel_id == channel_id)
+    if after is not None:
+        query = query.filter(Post.telegram_id > after)
+    return [telegram_id for (telegram_id,) in query.order_by(Post.telegram_id).limit(limit)]
+
+
+def _pending_query(channel_id):
+    after = placed_until(channel_id)
+    query = db.session.query(Post.id).filter(Post.channel_id == channel_id)
+    if after is not None:
+        query = query.filter(Post.telegram_id > after)
+    return query
+
+
+def pending_posts(channel_id):
+    """Число постов канала, ещё не размещённых на страницах."""
+    return _pending_query(channel_id).count()
+
+
+def has_pending_posts(channel_id):
+    """Есть ли у канала неразмещённые посты (без подсчёта всех)."""
+    return _pending_query(channel_id).first() is not None
+
+
+def _is_standard_grid(page):
+    """Сетка страницы не менялась пользователем: блоки стоят на первых позициях 2x2 по порядку."""
+    blocks = (page.json_data or {}).get('blocks', [])
+    if len(blocks) >= POSTS_PER_PAGE:
+        return False
+    return all(
+        {key: block.get(key) for key in ('x', 'y', 'w', 'h')} == POSITIONS[i]
+        for i, block in enumerate(blocks)
+    )
+
+
+def append_pages(channel_id, window=None):
+    """
+    Размещает следующее окно новых постов канала и сохраняет его одним коммитом.
+
+    :param window: Максимум новых страниц за вызов (по умолчанию PAGE_GRID_WINDOW)
+    :return: (размещено постов, создано страниц)
+    """
+    window = window or PAGE_GRID_WINDOW
+    after = placed_until(channel_id)
+    trailing = trailing_page(channel_id)
+    free = POSTS_PER_PAGE - len(trailing.json_data['blocks']) if trailing and _is_standard_grid(trailing) else 0
+    post_ids = _new_posts(channel_id, after, free + window * POSTS_PER_PAGE)
+    if not post_ids:
+        return 0, 0
+
+    if free:
+        blocks = list(trailing.json_data['blocks'])
+        blocks += [_block(channel_id, telegram_id, len(blocks) + i) for i, telegram_id in enumerate(post_ids[:free])]
+        trailing.json_data = dict(trailing.json_data, blocks=blocks, updated_at=datetime.utcnow().isoformat())
+
+    rest = post_ids[free:]
+    pages = [
+        Page(channel_id=channel_id, json_data=_page_json(channel_id, rest[start:start + POSTS_PER_PAGE]))
+        for start in range(0, len(rest), POSTS_PER_PAGE)
+    ]
+    db.session.add_all(pages)
+    db.session.merge(PageGridState(channel_id=channel_id, placed_until=post_ids[-1]))
+    db.session.flush()
+    index_pages(pages + ([trailing] if free else []))
+    db.session.commit()
+    return len(post_ids), len(pages)
+
+
+def generate_pages_job(job_id, channel_id, window=None):
+    """
+    Фоновая задача: размещает на страницах все новые посты канала окнами.
+
+    :return: {'posts', 'pages'} — размещено постов и создано страниц
+    """
+    total = pending_posts(channel_id)
+    update_job_progress(job_id, stage='pages', posts_done=0, posts_total=total)
+    placed = created = 0
+    while True:
+        posts, pages = append_pages(channel_id, window)
+        if not posts:
+            break
+        placed += posts
+        created += pages
+        update_job_progress(job_id, posts_done=placed, pages_created=created)
+    update_job_progress(job_id, stage='done')
+    logging.info(f"Страницы канала {channel_id}: размещено {placed} постов, создано {created} страниц")
+    return {"posts": placed, "pages": created}
+
+
+def running_pages_job(channel_id):
+    """Идущая задача генерации страниц канала или None."""
+    return running_job(JOB_KIND, channel_id)
+
+
+def start_pages_job(channel_id, app=None):
+    """
+    Запускает генерацию страниц канала, если есть неразмещённые посты и задача ещё не идёт.
+
+    :return: job_id идущей или запущенной задачи или None
+    """
+    running = running_pages_job(channel_id)
+    if running:
+        return running['id']
+    if not has_pending_posts(channel_id):
+        return None
+    try:
+        return start_job(JOB_KIND, generate_pages_job, channel_id, app=app,
+                         details={'channel_id': channel_id}, key=channel_id)
+    except JobAlreadyRunning as e:
+        # Параллельный запрос успел запустить задачу между проверкой и запуском
+        return e.job_id
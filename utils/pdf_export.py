@@ -0,0 +1,308 @@
+"""
+Генерация PDF канала кусками в пуле процессов.
+
+Лента режется на куски по PDF_CHUNK_ITEMS элементов (pdf-chunk-NNNN.html),
+каждый кусок WeasyPrint рендерит в отдельном процессе, а готовые PDF
+склеиваются pypdf в один файл: страницы идут подряд, у каждого куска есть
+закладка с диапазоном дат, внутрь неё переносятся закладки самого куска.
+
+Фотографии печатаются уменьшенными копиями нужного размера (см.
+utils/print_images.py), которые создаются в том же пуле до рендера кусков.
+
+PDF кусков хранятся в downloads/<channel_id>/.pdf-chunks вместе с манифестом
+хэшей их входных данных: при повторном экспорте перерисовываются только
+изменившиеся куски, остальные берутся готовыми и просто склеиваются заново.
+
+styles-pdf.css очищается и разбирается WeasyPrint один раз на процесс
+(до изменения файла): куски рендерятся с готовым weasyprint.CSS и общей
+FontConfiguration, а сами HTML-куски стили не подключают.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import PDF_CHUNK_ITEMS, PDF_WORKERS
+from models import db, Channel
+from utils.html_export import MANIFEST_FILE, load_manifest, remove_pages_after, save_manifest, write_pdf_chunks
+from utils.jobs import update_job_progress
+from utils.print_images import assign_print_images, is_up_to_date, make_print_image
+
+RECURSION_LIMIT = 50000  # Глубокие деревья layout в WeasyPrint на длинных лентах
+CHUNKS_DIR = '.pdf-chunks'  # Кэш PDF кусков внутри папки канала
+
+_css_cache = {}  # Путь к CSS -> (mtime, очищенный текст)
+_stylesheet_cache = {}  # Путь к CSS -> (mtime, weasyprint.CSS)
+_font_config = None
+_cache_lock = threading.Lock()
+
+
+def clean_css_for_pdf(css_content):
+    """
+    Очищает CSS от проблемных правил для WeasyPrint
+    """
+    # Удаляем пустые CSS custom properties, которые вызывают warnings
+    # Например: --tw-gradient-via-position: ;
+    css_content = re.sub(r'--tw-[^:]*:\s*;', '', css_content)
+    css_content = re.sub(r'--[^:]*:\s*;', '', css_content)
+
+    return css_content
+
+
+def cleaned_pdf_css(css_path):
+    """Очищенный текст CSS; пересчитывается, только если файл изменился."""
+    mtime = os.path.getmtime(css_path)
+    with _cache_lock:
+        cached = _css_cache.get(css_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(css_path, 'r', encoding='utf-8') as f:
+            css_content = clean_css_for_pdf(f.read())
+        _css_cache[css_path] = (mtime, css_content)
+        return css_content
+
+
+def get_font_config():
+    """FontConfiguration процесса: шрифты @font-face регистрируются один раз."""
+    global _font_config
+    with _cache_lock:
+        if _font_config is None:
+            from weasyprint.text.fonts import FontConfiguration
+            _font_config = FontConfiguration()
+        return _font_config
+
+
+def get_stylesheet(css_path):
+    """Разобранный weasyprint.CSS для css_path (кэш на процесс по mtime файла)."""
+    mtime = os.path.getmtime(css_path)
+    cached = _stylesheet_cache.get(css_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    from weasyprint import CSS
+
+    font_config = get_font_config()
+    stylesheet = CSS(string=cleaned_pdf_css(css_path), base_url=os.path.dirname(css_path),
+                     font_config=font_config)
+    with _cache_lock:
+        _stylesheet_cache[css_path] = (mtime, stylesheet)
+    return stylesheet
+
+
+def render_pdf_chunk(html_path, pdf_path, css_path):
+    """
+    Рендерит один HTML-кусок в PDF (выполняется в процессе пула).
+
+    :return: {'pages': число страниц, 'timings': {'css', 'layout', 'write'}} (секунды)
+    """
+    from weasyprint import HTML
+
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    try:
+        started = time.perf_counter()
+        stylesheet = get_stylesheet(css_path)
+        parsed = time.perf_counter()
+        document = HTML(filename=html_path).render(stylesheets=[stylesheet], font_config=get_font_config())
+        laid_out = time.perf_counter()
+        document.write_pdf(pdf_path)
+        return {
+            'pages': len(document.pages),
+            'timings': {
+                'css': parsed - started,
+                'layout': laid_out - parsed,
+                'write': time.perf_counter() - laid_out
+            }
+        }
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
+def _pdf_name(html_file):
+    return html_file[:-len('.html')] + '.pdf'
+
+
+def chunk_title(chunk):
+    """Подпись закладки куска: диапазон дат его постов."""
+    first = (chunk['first_date'] or '')[:10]
+    last = (chunk['last_date'] or '')[:10]
+    if not first:
+        return f"Часть {chunk['number']}"
+    return first if first == last else f"{first} — {last}"
+
+
+def merge_pdf_chunks(chunks, target_path):
+    """
+    Склеивает PDF-куски по порядку в target_path.
+
+    :param chunks: Куски с полями 'pdf' (путь к PDF) и 'number'
+    :return: Общее число страниц
+    """
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for chunk in chunks:
+        writer.append(chunk['pdf'], outline_item=chunk_title(chunk), import_outline=True)
+    pages = len(writer.pages)
+
+    # Пишем во временный файл, чтобы не оставить битый PDF на месте прежнего
+    tmp_path = f"{target_path}.part"
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    writer.close()
+    os.replace(tmp_path, target_path)
+    return pages
+
+
+def _render_chunks(job_id, chunks, channel_dir, css_path, workers):
+    """Рендерит куски в PDF, сообщая прогресс по мере готовности. Возвращает суммарные тайминги стадий."""
+    done = 0
+    timings = {'css': 0.0, 'layout': 0.0, 'write': 0.0}
+    update_job_progress(job_id, stage='render', chunks_done=0, chunks_total=len(chunks))
+
+    def collect(chunk, rendered):
+        nonlocal done
+        chunk['pages'] = rendered['pages']
+        for stage, seconds in rendered['timings'].items():
+            timings[stage] += seconds
+        done += 1
+        update_job_progress(job_id, chunks_done=done)
+
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            collect(chunk, render_pdf_chunk(os.path.join(channel_dir, chunk['file']), chunk['pdf'], css_path))
+        return timings
+
+    # Каждый процесс пула разбирает CSS один раз и переиспользует его для всех своих кусков
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = {
+            pool.submit(render_pdf_chunk, os.path.join(channel_dir, chunk['file']), chunk['pdf'], css_path): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            collect(futures[future], future.result())
+    return timings
+
+
+def _make_print_images(job_id, tasks, workers):
+    """Создаёт недостающие печатные копии изображений. Возвращает число созданных."""
+    tasks = [task for task in tasks if not is_up_to_date(task['source'], task['target'])]
+    update_job_progress(job_id, stage='images', images_done=0, images_total=len(tasks))
+    if not tasks:
+        return 0
+    args = ([task[key] for task in tasks] for key in ('source', 'target', 'width', 'height'))
+
+    if workers <= 1:
+        results = map(make_print_image, *args)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+        results = pool.map(make_print_image, *args, chunksize=16)
+    created = 0
+    try:
+        for done, result in enumerate(results, 1):
+            created += bool(result)
+            if done % 100 == 0 or done == len(tasks):
+                update_job_progress(job_id, images_done=done)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return created
+
+
+def export_channel_pdf_job(job_id, channel_id, channel_dir, css_path, workers=None, per_chunk=None, force=False):
+    """
+    Фоновая задача: HTML-куски -> PDF-куски в пуле процессов -> один PDF.
+
+    Перерисовываются только куски, чей хэш входных данных (или очищенный CSS)
+    изменился с прошлого экспорта или чьего PDF нет в кэше.
+
+    :param css_path: Исходный styles-pdf.css (очищается и разбирается с кэшем)
+    :param force: Перерисовать все куски
+    :return: {'path', 'pages', 'chunks', 'rendered', 'images', 'timings'}; timings — секунды по стадиям:
+        html, images, render (по часам), css/layout/write (сумма по кускам), merge, total
+    """
+    workers = workers or PDF_WORKERS
+    per_chunk = per_chunk or PDF_CHUNK_ITEMS
+
+    channel = db.session.get(Channel, channel_id)
+    if not channel:
+        raise ValueError(f"Канал {channel_id} не найден")
+
+    chunks_dir = os.path.join(channel_dir, CHUNKS_DIR)
+    os.makedirs(chunks_dir, exist_ok=True)
+    manifest_path = os.path.join(chunks_dir, MANIFEST_FILE)
+    css_hash = hashlib.sha1(cleaned_pdf_css(css_path).encode('utf-8')).hexdigest()
+
+    manifest = {} if force else load_manifest(manifest_path)
+    previous = {}
+    if manifest.get('css') == css_hash and manifest.get('per_chunk') == per_chunk:
+        previous = {
+            file: digest for file, digest in manifest.get('chunks', {}).items()
+            if os.path.exists(os.path.join(chunks_dir, _pdf_name(file)))
+        }
+
+    timings = {}
+    started = time.perf_counter()
+    update_job_progress(job_id, stage='html')
+    image_tasks = {}
+    downloads_dir = os.path.dirname(os.path.abspath(channel_dir))
+    # Стили не подключаются ссылкой: рендерер получает уже разобранный CSS.
+    # Куски лежат в .pdf-chunks, поэтому до downloads на уровень выше.
+    chunks = write_pdf_chunks(channel, chunks_dir, per_chunk, media_prefix='../../', stylesheet=None,
+                              previous=previous,
+                              prepare=lambda items: assign_print_images(items, downloads_dir, image_tasks))
+    # Дальше БД не нужна: не держим соединение, пока идёт рендер
+    db.session.remove()
+    for chunk in chunks:
+        chunk['pdf'] = os.path.join(chunks_dir, _pdf_name(chunk['file']))
+    changed = [chunk for chunk in chunks if chunk['changed']]
+    timings['html'] = time.perf_counter() - started
+    logging.info(f"PDF канала {channel_id}: {len(changed)} из {len(chunks)} кусков к рендеру, {workers} процессов")
+
+    stage_started = time.perf_counter()
+    images_created = _make_print_images(job_id, list(image_tasks.values()), workers)
+    timings['images'] = time.perf_counter() - stage_started
+
+    # Пока куски перерисовываются, старый манифест недействителен
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    stage_started = time.perf_counter()
+    try:
+        timings.update(_render_chunks(job_id, changed, chunks_dir, css_path, workers))
+    finally:
+        for chunk in changed:
+            try:
+                os.remove(os.path.join(chunks_dir, chunk['file']))
+            except OSError:
+                pass
+    timings['render'] = time.perf_counter() - stage_started
+    remove_pages_after(chunks_dir, 'pdf-chunk-*.pdf', len(chunks))
+    save_manifest(manifest_path, {
+        'css': css_hash,
+        'per_chunk': per_chunk,
+        'chunks': {chunk['file']: chunk['hash'] for chunk in chunks}
+    })
+
+    update_job_progress(job_id, stage='merge')
+    stage_started = time.perf_counter()
+    pdf_path = os.path.join(channel_dir, f"{channel_id}.pdf")
+    pages = merge_pdf_chunks(chunks, pdf_path)
+    timings['merge'] = time.perf_counter() - stage_started
+    timings['total'] = time.perf_counter() - started
+
+    timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    update_job_progress(job_id, stage='done', pages=pages, timings=timings)
+    logging.info(f"PDF канала {channel_id} создан: {pdf_path} ({pages} страниц), тайминги {timings}")
+    return {
+        "path": pdf_path,
+        "pages": pages,
+        "chunks": len(chunks),
+        "rendered": len(changed),
+        "images": images_created,
+        "timings": timings
+    }
@@ -0,0 +1,144 @@
+"""
+Печатные копии изображений для PDF.
+
+WeasyPrint встраивает картинки в PDF в исходном разрешении, поэтому перед
+рендером фотографии уменьшаются до размера, в котором они реально будут
+напечатаны: ширина колонки страницы для одиночного поста, размер ячейки
+из layout альбома (координаты ячеек заданы в процентах ширины контейнера).
+Копии лежат в downloads/<папка канала>/print/<имя>_<ширина>x<высота>.jpg и
+пересоздаются, только если исходник новее копии.
+"""
+import logging
+import math
+import os
+import shutil
+
+from config import PDF_IMAGE_DPI, PDF_IMAGE_QUALITY
+
+PRINT_DIR = 'print'
+# Ширина колонки PDF: A4 (595pt) без полей @page из tailwind.css (2 × 20pt)
+CONTENT_WIDTH_PT = 555
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+
+
+def box_px(width_percent, height_percent=None, dpi=None):
+    """Размер области печати в пикселях по её ширине/высоте в процентах ширины колонки."""
+    scale = CONTENT_WIDTH_PT / 72 * (dpi or PDF_IMAGE_DPI) / 100
+    width = max(1, math.ceil(width_percent * scale))
+    height = max(1, math.ceil(height_percent * scale)) if height_percent else 0
+    return width, height
+
+
+def print_path(media_url, box):
+    """Путь печатной копии относительно downloads: <папка канала>/print/<имя>_<w>x<h>.jpg."""
+    folder = media_url.split('/', 1)[0]
+    stem = os.path.splitext(os.path.basename(media_url))[0]
+    return f"{folder}/{PRINT_DIR}/{stem}_{box[0]}x{box[1]}.jpg"
+
+
+def _is_image(view):
+    if view['media_type'] == 'MessageMediaPhoto':
+        return True
+    return view['media_type'] == 'MessageMediaDocument' and (view['mime_type'] or '').startswith('image/')
+
+
+def assign_print_images(items, downloads_dir, tasks, dpi=None):
+    """
+    Проставляет print_url фотографиям элементов ленты (включая комментарии)
+    и собирает задания на создание копий в tasks: {путь копии: задание}.
+
+    Если исходника нет на диске, print_url не ставится и шаблон берёт
+    миниатюру или оригинал как раньше.
+    """
+    def assign(view, box):
+        media_url = view['media_url']
+        if not media_url or not _is_image(view) \
+                or not media_url.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        source = os.path.join(downloads_dir, media_url)
+        if not os.path.exists(source):
+            return
+        view['print_url'] = print_path(media_url, box)
+        tasks.setdefault(view['print_url'], {
+            'source': source,
+            'target': os.path.join(downloads_dir, view['print_url']),
+            'width': box[0],
+            'height': box[1]
+        })
+
+    for item in items:
+        if item['type'] == 'group':
+            layout = item.get('layout')
+            cells = (layout or {}).get('cells') or []
+            if cells:
+                for cell in cells:
+                    if cell and cell.get('image_index') is not None and cell['image_index'] < len(item['media']):
+                        assign(item['media'][cell['image_index']], box_px(cell['width'], cell['height'], dpi))
+            else:
+                # Без layout альбом выводится сеткой в две колонки
+                for view in item['media']:
+                    assign(view, box_px(50, dpi=dpi))
+        else:
+            assign(item['post'], box_px(100, dpi=dpi))
+        assign_print_images(item.get('comments') or [], downloads_dir, tasks, dpi)
+
+
+def is_up_to_date(source, target):
+    """Копия есть и не старше исходника."""
+    return os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source)
+
+
+def make_print_image(source, target, width, height, quality=None):
+    """
+    Создаёт печатную копию: уменьшает изображение так, чтобы оно покрывало
+    область width × height (height=0 — только по ширине), и сохраняет в JPEG.
+    Выполняется в процессе пула.
+
+    Если изображение не читается (битый или неподдерживаемый файл), на место
+    копии кладётся оригинал: HTML кусков уже ссылается на копию, а PDF
+    получает исходное изображение, как без печатных копий.
+
+    :return: True, если копия создана; False, если актуальная копия уже есть или взят оригинал
+    """
+    if is_up_to_date(source, target):
+        return False
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.tmp"
+    try:
+        _save_print_image(source, tmp_path, width, height, quality or PDF_IMAGE_QUALITY)
+    except OSError as e:
+        # UnidentifiedImageError — тоже OSError; одно изображение не должно останавливать экспорт
+        logging.warning(f"Не удалось создать печатную копию {source}, используется оригинал: {e}")
+        try:
+            shutil.copyfile(source, tmp_path)
+        except OSError:
+            return False
+        os.replace(tmp_path, target)
+        return False
+    os.replace(tmp_path, target)
+    return True
+
+
+def _save_print_image(source, path, width, height, quality):
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        # draft: JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8);
+        # квадрат со стороной max(width, height) не даёт недобрать разрешение после поворота по EXIF
+        side = max(width, height)
+        img.draft('RGB', (side, side))
+        img = ImageOps.exif_transpose(img)
+        scale = max(width / img.width, height / img.height if height else 0)
+        if scale < 1:
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                             Image.LANCZOS)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # Прозрачность кладём на белый фон страницы
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, 'white')
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(path, 'JPEG', quality=quality, optimize=True)
@@ -1,3 +1,4 @@
+import re
 from collections import deque
 from html import escape, unescape
 from html.parser import HTMLParser
@@ -204,6 +205,95 @@ from typing import List
 from telethon.types import TypeMessageEntity
 from .text_format import CustomHtmlParser
 
+# Теги сущностей, не зависящие от текста и параметров сущности
+_STATIC_TAGS = {
+    MessageEntityBold: ('<strong>', '</strong>'),
+    MessageEntityItalic: ('<em>', '</em>'),
+    MessageEntityCode: ('<code>', '</code>'),
+    MessageEntityUnderline: ('<u>', '</u>'),
+    MessageEntityStrike: ('<del>', '</del>'),
+    MessageEntityBlockquote: ('<blockquote>', '</blockquote>'),
+    MessageEntitySpoiler: ('<tg-spoiler>', '</tg-spoiler>'),
+}
+
+# Символы вне BMP, которые в UTF-16 занимают суррогатную пару
+_ASTRAL = re.compile('[\U00010000-\U0010FFFF]')
+
+
+def _surrogate_pair(match: re.Match) -> str:
+    code = ord(match.group()) - 0x10000
+    return chr(0xD800 + (code >> 10)) + chr(0xDC00 + (code & 0x3FF))
+
+
+def _add_surrogate(text: str) -> str:
+    """add_surrogate без перебора каждого символа в Python: заменяются только символы вне BMP."""
+    return _ASTRAL.sub(_surrogate_pair, text)
+
+
+def _entity_tags(entity: TypeMessageEntity, text: str) -> tuple[str, str] | None:
+    """Теги сущности (как CustomHtmlParser._get_formatter); None для неизвестных типов."""
+    tags = _STATIC_TAGS.get(type(entity))
+    if tags:
+        return tags
+    if isinstance(entity, MessageEntityPre):
+        return f"<pre><code class='language-{entity.language}'>", "</code></pre>"
+    if isinstance(entity, MessageEntityTextUrl):
+        return f'<a href="{escape(entity.url)}">', '</a>'
+    if isinstance(entity, MessageEntityUrl):
+        return f'<a href="{text[entity.offset:entity.offset + entity.length]}">', '</a>'
+    if isinstance(entity, MessageEntityEmail):
+        return f'<a href="mailto:{text[entity.offset:entity.offset + entity.length]}">', '</a>'
+    if isinstance(entity, MessageEntityMentionName):
+        return f'<a href="tg://user?id={entity.user_id}">', '</a>'
+    if isinstance(entity, MessageEntityCustomEmoji):
+        return f'<tg-emoji emoji-id="{entity.document_id}">', '</tg-emoji>'
+    return None
+
+
+def render_entities_html(text: str, entities: Iterable[TypeMessageEntity]) -> str:
+    """
+    Вставляет теги сущностей в текст за один линейный проход.
+
+    Результат совпадает с unescape(CustomHtmlParser.unparse(text, entities)),
+    но без вставки каждого тега пересборкой всей строки: все вставки
+    собираются в список, сортируются один раз и склеиваются с кусками текста.
+
+    Порядок тегов в одной точке тот же, что у unparse: длинный тег раньше
+    короткого, при равной длине — в обратном порядке обработки unparse.
+    Точка внутри суррогатной пары сдвигается за неё, в том числе у первого
+    символа (within_surrogate его пропускает, и unparse там падал на
+    del_surrogate). Смещения за концом текста прижимаются к концу.
+    """
+    if not text:
+        return ''
+    text = _add_surrogate(text)
+    size = len(text)
+
+    # Тот же порядок сущностей, что в unparse: от него зависит порядок равных тегов
+    ordered = sorted(entities, key=lambda e: (e.offset, -e.length), reverse=True)
+    inserts = []
+    for seq, entity in enumerate(ordered):
+        tags = _entity_tags(entity, text)
+        if not tags:
+            continue
+        for index, (at, tag) in enumerate(((entity.offset, tags[0]), (entity.offset + entity.length, tags[1]))):
+            point = min(max(at, 0), size)
+            if point < size and '\udc00' <= text[point] <= '\udfff':
+                point += 1
+            inserts.append((point, at, -len(tag), -(2 * seq + index), tag))
+    inserts.sort()
+
+    parts = []
+    last = 0
+    for point, _, _, _, tag in inserts:
+        if point > last:
+            parts.append(text[last:point])
+            last = point
+        parts.append(tag)
+    parts.append(text[last:])
+    return del_surrogate(''.join(parts))
+
+
 def parse_entities_to_html(text: str, entities: List[TypeMessageEntity]) -> str:
     """
     Преобразует текст и сущности Telegram в HTML.
@@ -217,10 +307,5 @@ def parse_entities_to_html(text: str, entities: List[TypeMessageEntity]) -> str:
     if not entities:
         return text.replace("\n", "<br>")  # Заменяем \n на <br> для разбиения на строки
 
-    # Используем CustomHtmlParser.unparse для преобразования в HTML
-    html = CustomHtmlParser.unparse(text, entities)
-
-    # Декодируем экранированный HTML
-    html = unescape(html)
-
-    return html
\ No newline at end of file
+    # Теги вставляются в неэкранированный текст, как unescape(CustomHtmlParser.unparse(...))
+    return render_entities_html(text, entities)
\ No newline at end of file